@@ -1,4 +1,9 @@
+from django.core.cache import get_cache
+from django.core.exceptions import ImproperlyConfigured
 from django.utils.translation import ugettext as _
+from rest_framework.exceptions import PermissionDenied
+from drf_to_s3 import conf, routing
+from drf_to_s3.key_layout import get_key_layout
 
 
 def upload_bucket():
@@ -6,9 +11,31 @@ def upload_bucket():
     The upload bucket. Exposed here for convenience, as you
     may need to send it to the client to easily dev/prod
     configuration.
+
+    With AWS_UPLOAD_BUCKETS, users upload to different buckets.
+    Use upload_bucket_for_request() instead.
+    '''
+    return conf.get_settings().upload_bucket
+
+def upload_bucket_for_request(request):
+    '''
+    Return the bucket the user should upload to. See
+    drf_to_s3.routing. With a single upload bucket, the upload
+    prefix isn't needed, and isn't computed.
+    '''
+    buckets = routing.upload_buckets()
+    if len(buckets) == 1:
+        return buckets[0]
+    return routing.upload_bucket_for_prefix(upload_prefix_for_request(request))
+
+def storage_bucket_for_request(request):
+    '''
+    Return the bucket the user's uploads should be copied to.
     '''
-    from django.conf import settings
-    return settings.AWS_UPLOAD_BUCKET
+    buckets = routing.storage_buckets()
+    if len(buckets) == 1:
+        return buckets[0]
+    return routing.storage_bucket_for_prefix(upload_prefix_for_request(request))
 
 def upload_prefix_for_request(request):
     '''
@@ -17,14 +44,35 @@ def upload_prefix_for_request(request):
     each user, you prevent a malicious user from hijacking or
     claiming another user's uploads.
 
-    FIXME needs its own test?
+    The prefix is computed once per request object, and reused
+    by later checks on the same request. The views and
+    UploadPrefixMiddleware see different request objects, so
+    each computes it once.
 
+    If AWS_UPLOAD_PREFIX_CACHE_SECONDS is set, prefixes for
+    authenticated users are also kept in the cache named by
+    AWS_UPLOAD_PREFIX_CACHE, or 'default', for that many seconds.
+    Call invalidate_upload_prefix() when something the prefix
+    depends on changes, such as the username.
+
+    '''
+    try:
+        return request.__dict__['_drf_to_s3_upload_prefix']
+    except KeyError:
+        pass
+    prefix = _cached_upload_prefix_for_request(request)
+    request.__dict__['_drf_to_s3_upload_prefix'] = prefix
+    return prefix
+
+def compute_upload_prefix_for_request(request):
     '''
-    from django.conf import settings
-    from rest_framework.exceptions import PermissionDenied
+    Compute the upload prefix, without memoization or caching.
+    Uses settings.AWS_UPLOAD_PREFIX_FUNC if defined, and
+    otherwise the username.
 
+    '''
     # Allow the user to specify their own function
-    prefix_func = getattr(settings, 'AWS_UPLOAD_PREFIX_FUNC', None)
+    prefix_func = conf.get_settings().upload_prefix_func
     if prefix_func is not None:
         return prefix_func(request)
 
@@ -33,6 +81,39 @@ def upload_prefix_for_request(request):
 
     return request.user.get_username()
 
+def get_upload_prefix_cache():
+    return get_cache(conf.get_settings().upload_prefix_cache)
+
+def upload_prefix_cache_key(user):
+    return 'drf_to_s3.upload_prefix.%s' % user.pk
+
+def invalidate_upload_prefix(user):
+    '''
+    Discard the cached upload prefix for the given user. It's
+    safe to connect this to a signal, such as post_save for
+    the user model:
+
+        post_save.connect(
+            lambda sender, instance, **kwargs: invalidate_upload_prefix(instance),
+            sender=User, weak=False
+        )
+
+    '''
+    get_upload_prefix_cache().delete(upload_prefix_cache_key(user))
+
+def _cached_upload_prefix_for_request(request):
+    cache_seconds = conf.get_settings().upload_prefix_cache_seconds
+    user = getattr(request, 'user', None) if cache_seconds else None
+    if user is None or not user.is_authenticated():
+        return compute_upload_prefix_for_request(request)
+    cache = get_upload_prefix_cache()
+    cache_key = upload_prefix_cache_key(user)
+    prefix = cache.get(cache_key)
+    if prefix is None:
+        prefix = compute_upload_prefix_for_request(request)
+        cache.set(cache_key, prefix, cache_seconds)
+    return prefix
+
 def check_policy_permissions(request, upload_policy):
     '''
     Check permissions on the given upload policy. Raises
@@ -47,7 +128,6 @@ def check_policy_permissions(request, upload_policy):
     easily replaced by a user of this very API.
 
     '''
-    from rest_framework.exceptions import PermissionDenied
     if upload_policy['acl'].value != 'private':
         raise PermissionDenied(_("ACL should be 'private'"))
     check_upload_permissions(
@@ -56,6 +136,27 @@ def check_policy_permissions(request, upload_policy):
         key=upload_policy['key'].value
     )
 
+def check_rest_request_permissions(request, rest_request):
+    '''
+    Check permissions on a REST request to sign for a chunked
+    upload. Raises rest_framework.exceptions.PermissionDenied
+    in case of error.
+
+    As with policies, the upload must be private, so a request
+    to initiate a multipart upload must set x-amz-acl to
+    'private'.
+
+    '''
+    acl = rest_request.get_amz_header('x-amz-acl')
+    if acl is not None or rest_request.subresource_names == ['uploads']:
+        if acl != 'private':
+            raise PermissionDenied(_("ACL should be 'private'"))
+    check_upload_permissions(
+        request=request,
+        bucket=rest_request.bucket,
+        key=rest_request.key
+    )
+
 def check_upload_permissions(request, bucket, key):
     '''
     Check permissions on the given upload policy. Raises
@@ -63,14 +164,14 @@ def check_upload_permissions(request, bucket, key):
     of error.
 
     '''
-    from django.core.exceptions import ImproperlyConfigured
-    from rest_framework.exceptions import PermissionDenied
-    if bucket != upload_bucket():
-        raise PermissionDenied(_("Bucket should be '%s'" % upload_bucket()))
+    expected_bucket = upload_bucket_for_request(request)
+    if bucket != expected_bucket:
+        raise PermissionDenied(_("Bucket should be '%s'" % expected_bucket))
     upload_prefix = upload_prefix_for_request(request)
     if upload_prefix is None or len(upload_prefix) == 0:
         raise ImproperlyConfigured(
             _('Upload prefix must be non-zero-length and should be unique for each user')
         )
-    if not key.startswith(upload_prefix + '/'):
-        raise PermissionDenied(_("Key should start with '%s/'" % upload_prefix))
+    key_prefix = get_key_layout().key_prefix(upload_prefix)
+    if not key.startswith(key_prefix + '/'):
+        raise PermissionDenied(_("Key should start with '%s/'" % key_prefix))
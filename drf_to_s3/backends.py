@@ -0,0 +1,262 @@
+'''
+Storage backends, which carry out the copies s3.copy() asks for.
+
+Set AWS_S3_STORAGE_BACKEND to the dotted path of a backend class
+to choose one. The default is BotoStorageBackend, which talks to
+S3. MemoryStorageBackend and FileSystemStorageBackend stand in for
+S3 when testing or load testing the completion views offline.
+
+'''
+import errno, hashlib, os, tempfile, threading
+from rest_framework import status
+from drf_to_s3 import conf, s3
+from drf_to_s3.s3 import ObjectNotFoundException
+
+
+class BaseStorageBackend(object):
+    '''
+    Subclasses implement copy().
+
+    '''
+    def copy(self, src_bucket, src_key, dst_bucket, dst_key, src_etag=None, validate_src_etag=False):
+        '''
+        Copy a key from one bucket to another, accepting the same
+        arguments as s3.copy().
+
+        Raises ObjectNotFoundException if the source key does not
+        exist (S3's 404), or if validate_src_etag is True and its
+        ETag doesn't match src_etag (S3's 412).
+
+        '''
+        raise NotImplementedError()
+
+
+def etags_match(etag, other):
+    '''
+    Compare two ETags, ignoring the quotes S3 puts around them.
+    '''
+    return etag is not None and other is not None and etag.strip('"') == other.strip('"')
+
+def compute_etag(data):
+    '''
+    Return the quoted MD5 ETag S3 gives an object uploaded in a
+    single request.
+    '''
+    return '"%s"' % hashlib.md5(data).hexdigest()
+
+
+class BotoStorageBackend(BaseStorageBackend):
+    '''
+    Copies on S3 using boto, with connections checked out of
+    connection_pool, which defaults to the process-wide pool.
+
+    Large objects can be copied in parallel parts, which is
+    faster and avoids the 5 GB limit on a single copy. This is
+    opt-in, and configured by these settings:
+
+    AWS_S3_MULTIPART_COPY_THRESHOLD: Objects larger than this many
+      bytes are copied in parts. Finding the size takes a HEAD
+      request on each copy, so this is off by default (None), and
+      copies of objects over 5 GB fail. Set it, for example to
+      5 GB, if you store objects that large.
+    AWS_S3_MULTIPART_COPY_PART_SIZE: Size of each part in bytes.
+      Defaults to 64 MB.
+    AWS_S3_MULTIPART_COPY_CONCURRENCY: Number of parts to copy at
+      once. Defaults to 8.
+
+    '''
+    def __init__(self, connection_pool=None):
+        self.connection_pool = connection_pool
+
+    def copy(self, src_bucket, src_key, dst_bucket, dst_key, src_etag=None, validate_src_etag=False):
+        from boto.exception import S3ResponseError  # boto is slow to import
+        connection_pool = self.connection_pool
+        if connection_pool is None:
+            connection_pool = s3.get_connection_pool()
+        if validate_src_etag:
+            headers = {
+                'x-amz-copy-source-if-match': src_etag,
+            }
+        else:
+            headers = {}
+        config = conf.get_settings()
+        multipart_threshold = config.multipart_copy_threshold
+        try:
+            with connection_pool.bucket(dst_bucket) as bucket:
+                if multipart_threshold is not None:
+                    src = bucket.connection.get_bucket(src_bucket, validate=False).get_key(
+                        src_key,
+                        headers={'If-Match': src_etag} if validate_src_etag else None
+                    )
+                    if src is None:
+                        raise ObjectNotFoundException()
+                    if src.size > multipart_threshold:
+                        s3.multipart_copy(
+                            bucket=bucket,
+                            src=src,
+                            dst_key=dst_key,
+                            headers=headers,
+                            part_size=config.multipart_copy_part_size,
+                            concurrency=config.multipart_copy_concurrency,
+                            connection_pool=connection_pool
+                        )
+                        return
+                bucket.copy_key(
+                    new_key_name=dst_key,
+                    src_bucket_name=src_bucket,
+                    src_key_name=src_key,
+                    headers=headers
+                )
+        except S3ResponseError as e:
+            if e.status in [status.HTTP_404_NOT_FOUND, status.HTTP_412_PRECONDITION_FAILED]:
+                raise ObjectNotFoundException()
+            else:
+                raise
+
+
+class StoredObject(object):
+    '''
+    An object held by MemoryStorageBackend.
+
+    '''
+    __slots__ = ('data', 'etag', 'content_type', 'metadata')
+
+    def __init__(self, data, etag, content_type=None, metadata=None):
+        self.data = data
+        self.etag = etag
+        self.content_type = content_type
+        self.metadata = metadata or {}
+
+
+class MemoryStorageBackend(BaseStorageBackend):
+    '''
+    Keeps objects in a dictionary, for tests and offline load
+    tests. Objects are shared by every thread in the process, and
+    lost when it exits. Use put_object() to create the uploads the
+    completion views will copy.
+
+    '''
+    def __init__(self):
+        self._objects = {}
+        self._lock = threading.Lock()
+
+    def put_object(self, bucket, key, data, content_type=None, metadata=None):
+        '''
+        Store data at the given key, and return its ETag.
+        '''
+        etag = compute_etag(data)
+        with self._lock:
+            self._objects[(bucket, key)] = StoredObject(data, etag, content_type, metadata)
+        return etag
+
+    def get_object(self, bucket, key):
+        '''
+        Return the StoredObject at the given key, or None.
+        '''
+        return self._objects.get((bucket, key))
+
+    def delete_object(self, bucket, key):
+        with self._lock:
+            self._objects.pop((bucket, key), None)
+
+    def clear(self):
+        with self._lock:
+            self._objects.clear()
+
+    def copy(self, src_bucket, src_key, dst_bucket, dst_key, src_etag=None, validate_src_etag=False):
+        with self._lock:
+            src = self._objects.get((src_bucket, src_key))
+            if src is None:
+                raise ObjectNotFoundException()
+            if validate_src_etag and not etags_match(src.etag, src_etag):
+                raise ObjectNotFoundException()
+            self._objects[(dst_bucket, dst_key)] = StoredObject(
+                src.data, src.etag, src.content_type, dict(src.metadata)
+            )
+
+
+class FileSystemStorageBackend(BaseStorageBackend):
+    '''
+    Keeps each object in a file at root/bucket/key, for offline
+    load tests which need to survive a restart or share objects
+    between processes. ETags are the MD5 of the file's contents.
+
+    root: The directory to store buckets in. Defaults to
+      settings.AWS_S3_FILESYSTEM_ROOT.
+
+    '''
+    def __init__(self, root=None):
+        if root is None:
+            root = conf.get_settings().filesystem_root
+        self.root = os.path.abspath(root)
+
+    def path_for(self, bucket, key):
+        '''
+        Return the path of the file for the given key. Raises
+        ObjectNotFoundException if the key would escape the bucket's
+        directory.
+        '''
+        bucket_root = os.path.normpath(os.path.join(self.root, bucket))
+        path = os.path.normpath(os.path.join(bucket_root, key))
+        if not path.startswith(bucket_root + os.sep) or os.path.dirname(bucket_root) != self.root:
+            raise ObjectNotFoundException()
+        return path
+
+    def put_object(self, bucket, key, data):
+        '''
+        Write data to the given key, and return its ETag.
+        '''
+        self._write(self.path_for(bucket, key), [data])
+        return compute_etag(data)
+
+    def get_etag(self, bucket, key):
+        '''
+        Return the ETag of the given key, or None if it doesn't
+        exist.
+        '''
+        try:
+            with open(self.path_for(bucket, key), 'rb') as f:
+                digest = hashlib.md5()
+                for chunk in iter(lambda: f.read(64 * 1024), ''):
+                    digest.update(chunk)
+        except IOError:
+            return None
+        return '"%s"' % digest.hexdigest()
+
+    def copy(self, src_bucket, src_key, dst_bucket, dst_key, src_etag=None, validate_src_etag=False):
+        src_path = self.path_for(src_bucket, src_key)
+        dst_path = self.path_for(dst_bucket, dst_key)
+        if validate_src_etag and not etags_match(self.get_etag(src_bucket, src_key), src_etag):
+            raise ObjectNotFoundException()
+        try:
+            src = open(src_path, 'rb')
+        except IOError:
+            raise ObjectNotFoundException()
+        with src:
+            self._write(dst_path, iter(lambda: src.read(64 * 1024), ''))
+
+    def _write(self, path, chunks):
+        '''
+        Write to a temporary file and rename it into place, so
+        readers never see a partial object.
+        '''
+        directory = os.path.dirname(path)
+        try:
+            os.makedirs(directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        fd, temp_path = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+            os.rename(temp_path, path)
+        except Exception:
+            os.unlink(temp_path)
+            raise
+
+
+# The registry lives in s3, so s3.copy() doesn't need to import
+# this module, which imports s3
+get_storage_backend = s3.get_storage_backend
@@ -0,0 +1,195 @@
+'''
+Drive the sign, upload URI, and completion endpoints through the
+Django test client, with copies made by MemoryStorageBackend
+instead of S3, and report throughput, latency, and allocations.
+
+    drf_to_s3/runtests/runtests.py benchmarks [options]
+
+Options:
+
+    --requests N     Requests per endpoint (default 500)
+    --save PATH      Save the results as JSON
+    --compare PATH   Compare with results saved earlier, and exit
+                     with a nonzero status if an endpoint got more
+                     than --tolerance slower
+    --tolerance PCT  Allowed slowdown in p50 latency (default 10)
+
+Allocations are the gc-tracked objects each request leaves behind:
+cyclic garbage, which reference counting can't free, plus anything
+retained, such as caches. They're counted with the collector
+switched off, so garbage from earlier requests isn't collected
+partway through and subtracted. Python 2 has no tracemalloc, so
+bytes aren't measured.
+
+'''
+import gc, hashlib, json, timeit
+
+
+SETTINGS = dict(
+    DEBUG=False,
+    ROOT_URLCONF='drf_to_s3.benchmarks.urls',
+    APPEND_SLASH=False,
+    AWS_UPLOAD_BUCKET='my-upload-bucket',
+    AWS_STORAGE_BUCKET_NAME='my-storage-bucket',
+    AWS_UPLOAD_ACCESS_KEY_ID='12345',
+    AWS_UPLOAD_SECRET_ACCESS_KEY='67890',
+    AWS_S3_STORAGE_BACKEND='drf_to_s3.backends.MemoryStorageBackend',
+)
+
+USERNAME = 'frodo'
+UPLOAD_DATA = 'x' * 1024
+UPLOAD_ETAG = '"%s"' % hashlib.md5(UPLOAD_DATA).hexdigest()
+
+
+def sign_request(client):
+    return client.post('/sign', {
+        'expiration': '2007-12-01T12:00:00.000Z',
+        'conditions': [
+            {'acl': 'private'},
+            {'bucket': 'my-upload-bucket'},
+            {'Content-Type': 'image/jpeg'},
+            {'success_action_status': '200'},
+            {'key': USERNAME + '/foo/bar/baz.jpg'},
+            {'x-amz-meta-qqfilename': 'baz.jpg'},
+            ['content-length-range', 1024, 10240],
+        ]
+    }, format='json')
+
+def upload_uri_request(client):
+    return client.post('/upload_uri')
+
+def fine_completion_request(client):
+    return client.post('/fine/uploaded', {
+        'bucket': 'my-upload-bucket',
+        'key': USERNAME + '/foo/bar/baz.jpg',
+        'uuid': '12345',
+        'name': 'baz.jpg',
+        'etag': UPLOAD_ETAG,
+    })
+
+def api_completion_request(client):
+    return client.post('/api/uploaded', {
+        'key': USERNAME + '/foo/bar/baz.jpg',
+        'filename': 'baz.jpg',
+    }, format='json')
+
+ENDPOINTS = [
+    ('sign', sign_request),
+    ('upload_uri', upload_uri_request),
+    ('fine_completion', fine_completion_request),
+    ('api_completion', api_completion_request),
+]
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def measure_allocations(make_request, client, count):
+    '''
+    Return the mean number of gc-tracked objects each request
+    leaves behind.
+    '''
+    gc.collect()
+    gc.disable()
+    try:
+        before = len(gc.get_objects())
+        for i in range(count):
+            make_request(client)
+        after = len(gc.get_objects())
+    finally:
+        gc.enable()
+    return float(after - before) / count
+
+def run_endpoint(make_request, client, count, warmup):
+    for i in range(warmup):
+        response = make_request(client)
+        if response.status_code != 200:
+            raise AssertionError('Unexpected status %d: %s' % (response.status_code, response.content))
+    latencies = []
+    timer = timeit.default_timer
+    start = timer()
+    for i in range(count):
+        request_start = timer()
+        make_request(client)
+        latencies.append(timer() - request_start)
+    elapsed = timer() - start
+    latencies.sort()
+    allocations = measure_allocations(make_request, client, min(count, 100))
+    return {
+        'requests': count,
+        'requests_per_second': count / elapsed,
+        'p50_ms': 1000 * percentile(latencies, 0.5),
+        'p99_ms': 1000 * percentile(latencies, 0.99),
+        'objects_per_request': allocations,
+    }
+
+def run(count=500, warmup=20):
+    '''
+    Run each endpoint and return a dictionary of results. Expects
+    a test database to be set up.
+
+    '''
+    from django.test.utils import override_settings
+    from rest_framework.test import APIClient
+    from drf_to_s3.backends import get_storage_backend
+    from drf_to_s3.tests.util import get_user_model
+
+    results = {}
+    with override_settings(**SETTINGS):
+        user_model = get_user_model()
+        if not user_model.objects.filter(username=USERNAME).exists():
+            user_model.objects.create_user(username=USERNAME, password='shire1234')
+        client = APIClient()
+        client.login(username=USERNAME, password='shire1234')
+        storage = get_storage_backend()
+        storage.put_object(SETTINGS['AWS_UPLOAD_BUCKET'], USERNAME + '/foo/bar/baz.jpg', UPLOAD_DATA)
+        for name, make_request in ENDPOINTS:
+            results[name] = run_endpoint(make_request, client, count, warmup)
+        storage.clear()
+    return results
+
+def report(results, baseline=None, tolerance=10.0):
+    '''
+    Print the results, with the change from baseline if given.
+    Return the names of endpoints whose p50 latency regressed by
+    more than tolerance percent.
+
+    '''
+    regressions = []
+    print('%-18s %10s %9s %9s %12s  %s' % ('endpoint', 'req/s', 'p50 ms', 'p99 ms', 'allocations', 'vs baseline'))
+    for name, result in sorted(results.items()):
+        change = ''
+        if baseline and name in baseline:
+            delta = 100.0 * (result['p50_ms'] - baseline[name]['p50_ms']) / baseline[name]['p50_ms']
+            change = '%+.1f%% p50' % delta
+            if delta > tolerance:
+                change += '  REGRESSION'
+                regressions.append(name)
+        print('%-18s %10.1f %9.3f %9.3f %12.1f  %s' % (
+            name, result['requests_per_second'], result['p50_ms'], result['p99_ms'],
+            result['objects_per_request'], change))
+    return regressions
+
+def main(argv):
+    import argparse, platform
+    parser = argparse.ArgumentParser(prog='runtests.py benchmarks')
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--save')
+    parser.add_argument('--compare')
+    parser.add_argument('--tolerance', type=float, default=10.0)
+    args = parser.parse_args(argv)
+
+    results = run(count=args.requests)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+    regressions = report(results, baseline=baseline, tolerance=args.tolerance)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'results': results,
+            }, f, indent=2, sort_keys=True)
+    return 1 if regressions else 0
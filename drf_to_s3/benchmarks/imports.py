@@ -0,0 +1,91 @@
+'''
+Measure cold start in a fresh interpreter, after Django and
+Django REST Framework are loaded: how long the package takes to
+import, and how long until the first signed policy and upload URI
+are ready. Also check that optional dependencies stay unloaded
+until they're used.
+
+    python -m drf_to_s3.benchmarks.imports
+
+'''
+import json, os, subprocess, sys
+
+
+MODULES = [
+    'drf_to_s3.s3',
+    'drf_to_s3.serializers',
+    'drf_to_s3.urls',
+]
+
+LAZY_MODULES = [
+    'boto',
+    'querystring_parser',
+    'multiprocessing.pool',
+]
+
+SCRIPT = '''
+import json, sys, timeit
+import django.conf, django.db.models, rest_framework.views
+from rest_framework.test import APIRequestFactory
+settings = django.conf.settings
+settings.INSTALLED_APPS
+settings.AWS_UPLOAD_BUCKET = 'my-upload-bucket'
+settings.AWS_UPLOAD_ACCESS_KEY_ID = '12345'
+settings.AWS_UPLOAD_SECRET_ACCESS_KEY = '67890'
+settings.AWS_UPLOAD_PREFIX_FUNC = lambda request: 'uploads'
+factory = APIRequestFactory()
+sign_request = factory.post('/sign', {
+    'expiration': '2007-12-01T12:00:00.000Z',
+    'conditions': [
+        {'acl': 'private'},
+        {'bucket': 'my-upload-bucket'},
+        {'key': 'uploads/foo.jpg'},
+    ]
+}, format='json')
+upload_uri_request = factory.post('/upload_uri')
+
+start = timeit.default_timer()
+__import__(%(module)r)
+imported = timeit.default_timer()
+from drf_to_s3.views import api_client_views, fine_uploader_views
+assert fine_uploader_views.FineSignPolicyView.as_view()(sign_request).status_code == 200
+assert api_client_views.SignedPutURIView.as_view()(upload_uri_request).status_code == 200
+ready = timeit.default_timer()
+print(json.dumps({
+    'import': imported - start,
+    'ready': ready - start,
+    'loaded': [name for name in %(lazy_modules)r if name in sys.modules],
+}))
+'''
+
+
+def measure(module):
+    env = dict(os.environ)
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'drf_to_s3.runtests.settings')
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [
+        os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+        env.get('PYTHONPATH'),
+    ]))
+    output = subprocess.check_output(
+        [sys.executable, '-c', SCRIPT % {'module': module, 'lazy_modules': LAZY_MODULES}],
+        env=env
+    )
+    return json.loads(output)
+
+def median(values):
+    return sorted(values)[len(values) // 2]
+
+def main(repeat=7):
+    print('%-24s %10s %18s  %s' % ('module', 'import ms', 'first requests ms', 'optional modules loaded'))
+    for module in MODULES:
+        results = [measure(module) for i in range(repeat)]
+        print('%-24s %10.1f %18.1f  %s' % (
+            module,
+            1000 * median([result['import'] for result in results]),
+            1000 * median([result['ready'] for result in results]),
+            ', '.join(results[0]['loaded']) or 'none',
+        ))
+
+
+if __name__ == '__main__':
+    main()
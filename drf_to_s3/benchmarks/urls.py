@@ -0,0 +1,8 @@
+from django.conf.urls import include, patterns, url
+from drf_to_s3.views import api_client_views, fine_uploader_views
+
+urlpatterns = patterns('',
+    url(r'^', include('drf_to_s3.urls')),
+    url(r'^fine/uploaded$', fine_uploader_views.FineUploadCompletionView.as_view()),
+    url(r'^api/uploaded$', api_client_views.APIUploadCompletionView.as_view()),
+)
@@ -0,0 +1,43 @@
+'''
+Compare the precompiled validators with the character scans they
+replaced, on 1 KB keys.
+
+    python -m drf_to_s3.benchmarks.validators
+
+'''
+import string, timeit
+
+
+def legacy_contains_only_url_characters(string_value):
+    allowed_characters = "-._~:/?#[]@!$&'()*+,;=" + string.ascii_letters + string.digits
+    return all([char in allowed_characters for char in string_value])
+
+def legacy_is_valid_filename(string_value):
+    allowed_characters = ' ' + string.printable
+    return all([char in allowed_characters for char in string_value])
+
+
+def main(number=2000):
+    from drf_to_s3 import validators
+    key = ('uploads/frodo/' + string.ascii_letters + string.digits + '-._~') * 13
+    key = key[:1024]
+    cases = [
+        ('url characters (str)', legacy_contains_only_url_characters, validators.contains_only_url_characters, key),
+        ('url characters (unicode)', legacy_contains_only_url_characters, validators.contains_only_url_characters, key.decode('ascii')),
+        ('filename (str)', legacy_is_valid_filename, validators.is_valid_filename, key),
+    ]
+    print('%-26s %12s %12s %8s' % ('1 KB key', 'legacy us', 'compiled us', 'speedup'))
+    for name, legacy, compiled, value in cases:
+        assert legacy(value) == compiled(value)
+        legacy_seconds = min(timeit.repeat(lambda: legacy(value), number=number, repeat=3))
+        compiled_seconds = min(timeit.repeat(lambda: compiled(value), number=number, repeat=3))
+        print('%-26s %12.2f %12.2f %7.1fx' % (
+            name,
+            1e6 * legacy_seconds / number,
+            1e6 * compiled_seconds / number,
+            legacy_seconds / compiled_seconds,
+        ))
+
+
+if __name__ == '__main__':
+    main()
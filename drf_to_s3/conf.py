@@ -0,0 +1,149 @@
+'''
+The package's configuration, read from Django settings once and
+kept until a setting changes.
+
+    from drf_to_s3 import conf
+    conf.get_settings().upload_bucket
+
+Settings are validated when they're first read, which is usually
+the first request, not at startup. To catch a misconfiguration
+when the process starts, call conf.get_settings() from your own
+startup code, such as wsgi.py.
+
+'''
+from django.conf import settings as django_settings
+from django.core.exceptions import ImproperlyConfigured
+from django.dispatch import receiver
+from django.test.signals import setting_changed
+from drf_to_s3.validators import is_valid_bucket_name
+
+
+REQUIRED = object()
+
+# (attribute, Django setting, default)
+SETTINGS = (
+    ('upload_bucket', 'AWS_UPLOAD_BUCKET', REQUIRED),
+    ('upload_buckets', 'AWS_UPLOAD_BUCKETS', None),
+    ('upload_bucket_regions', 'AWS_UPLOAD_BUCKET_REGIONS', {}),
+    ('storage_bucket', 'AWS_STORAGE_BUCKET_NAME', REQUIRED),
+    ('storage_buckets', 'AWS_STORAGE_BUCKETS', None),
+    ('upload_access_key_id', 'AWS_UPLOAD_ACCESS_KEY_ID', REQUIRED),
+    ('upload_secret_access_key', 'AWS_UPLOAD_SECRET_ACCESS_KEY', REQUIRED),
+    ('upload_region', 'AWS_UPLOAD_REGION', 'us-east-1'),
+    ('upload_endpoint', 'AWS_UPLOAD_ENDPOINT', None),
+    ('upload_region_endpoints', 'AWS_UPLOAD_REGION_ENDPOINTS', {}),
+    ('upload_expire_after_seconds', 'AWS_UPLOAD_EXPIRE_AFTER_SECONDS', 300),
+    ('upload_signature_version', 'AWS_UPLOAD_SIGNATURE_VERSION', 2),
+    ('upload_signature_cache_seconds', 'AWS_UPLOAD_SIGNATURE_CACHE_SECONDS', None),
+    ('upload_signature_cache', 'AWS_UPLOAD_SIGNATURE_CACHE', 'default'),
+    ('upload_max_uris_per_request', 'AWS_UPLOAD_MAX_URIS_PER_REQUEST', 100),
+    ('upload_policy_encoder', 'AWS_UPLOAD_POLICY_ENCODER', 'drf_to_s3.encoders.canonical_json'),
+    ('upload_prefix_func', 'AWS_UPLOAD_PREFIX_FUNC', None),
+    ('upload_prefix_cache_seconds', 'AWS_UPLOAD_PREFIX_CACHE_SECONDS', None),
+    ('upload_prefix_cache', 'AWS_UPLOAD_PREFIX_CACHE', 'default'),
+    ('upload_prefix_cookie_name', 'UPLOAD_PREFIX_COOKIE_NAME', 'upload_prefix'),
+    ('upload_bucket_cookie_name', 'UPLOAD_BUCKET_COOKIE_NAME', 'upload_bucket'),
+    ('upload_key_layout', 'AWS_UPLOAD_KEY_LAYOUT', 'drf_to_s3.key_layout.DefaultKeyLayout'),
+    ('copy_job_queue', 'AWS_COPY_JOB_QUEUE', 'drf_to_s3.copy_jobs.ThreadPoolCopyJobQueue'),
+    ('copy_concurrency', 'AWS_S3_COPY_CONCURRENCY', 16),
+    ('storage_backend', 'AWS_S3_STORAGE_BACKEND', 'drf_to_s3.backends.BotoStorageBackend'),
+    ('filesystem_root', 'AWS_S3_FILESYSTEM_ROOT', REQUIRED),
+    ('connection_pool_size', 'AWS_S3_CONNECTION_POOL_SIZE', 10),
+    ('connection_pool_idle_timeout', 'AWS_S3_CONNECTION_POOL_IDLE_TIMEOUT', 60),
+    ('multipart_copy_threshold', 'AWS_S3_MULTIPART_COPY_THRESHOLD', None),
+    ('multipart_copy_part_size', 'AWS_S3_MULTIPART_COPY_PART_SIZE', 64 * 1024 * 1024),
+    ('multipart_copy_concurrency', 'AWS_S3_MULTIPART_COPY_CONCURRENCY', 8),
+)
+
+SETTING_NAMES = frozenset(name for attribute, name, default in SETTINGS)
+
+
+class Settings(object):
+    '''
+    A snapshot of the settings in SETTINGS, as attributes.
+
+    Reading a required setting which isn't defined raises
+    ImproperlyConfigured. Settings only some sites need, such as
+    AWS_S3_FILESYSTEM_ROOT, are required only when they're read.
+
+    source: An object to read the settings from. Defaults to
+      django.conf.settings.
+
+    '''
+    def __init__(self, source=None):
+        if source is None:
+            source = django_settings
+        self._missing = {}
+        for attribute, name, default in SETTINGS:
+            value = getattr(source, name, default)
+            if value is REQUIRED:
+                self._missing[attribute] = name
+            else:
+                setattr(self, attribute, value)
+
+    def __getattr__(self, attribute):
+        # Only called for attributes which weren't set
+        if attribute != '_missing' and attribute in self._missing:
+            raise ImproperlyConfigured('%s is required' % self._missing[attribute])
+        raise AttributeError(attribute)
+
+    def validate(self):
+        '''
+        Raise ImproperlyConfigured if any of the settings are
+        invalid.
+
+        '''
+        if self.upload_signature_version not in (2, 4):
+            raise ImproperlyConfigured('AWS_UPLOAD_SIGNATURE_VERSION should be 2 or 4')
+        for name, value in [
+            ('AWS_UPLOAD_EXPIRE_AFTER_SECONDS', self.upload_expire_after_seconds),
+            ('AWS_UPLOAD_MAX_URIS_PER_REQUEST', self.upload_max_uris_per_request),
+        ]:
+            if not isinstance(value, (int, long)) or value < 1:
+                raise ImproperlyConfigured('%s should be a positive integer' % name)
+        if (self.upload_signature_cache_seconds and
+            self.upload_signature_cache_seconds >= self.upload_expire_after_seconds):
+            raise ImproperlyConfigured(
+                'AWS_UPLOAD_SIGNATURE_CACHE_SECONDS should be less than AWS_UPLOAD_EXPIRE_AFTER_SECONDS'
+            )
+        for name, attribute in [
+            ('AWS_UPLOAD_BUCKET', 'upload_bucket'),
+            ('AWS_STORAGE_BUCKET_NAME', 'storage_bucket'),
+        ]:
+            if attribute not in self._missing and not is_valid_bucket_name(getattr(self, attribute)):
+                raise ImproperlyConfigured('%s is not a valid bucket name' % name)
+        for name, buckets in [
+            ('AWS_UPLOAD_BUCKETS', self.upload_buckets),
+            ('AWS_STORAGE_BUCKETS', self.storage_buckets),
+        ]:
+            if buckets is not None and (
+                not buckets or not all(is_valid_bucket_name(bucket) for bucket in buckets)):
+                raise ImproperlyConfigured('%s should be a list of valid bucket names' % name)
+
+
+_settings = None
+
+def get_settings():
+    '''
+    Return the current Settings, reading and validating them on
+    first use.
+
+    '''
+    global _settings
+    if _settings is None:
+        current = Settings()
+        current.validate()
+        _settings = current
+    return _settings
+
+@receiver(setting_changed)
+def reset_settings(sender=None, setting=None, **kwargs):
+    '''
+    Discard the snapshot when one of its settings changes, such as
+    under override_settings. Called with no arguments, discards it
+    unconditionally.
+
+    '''
+    global _settings
+    if setting is None or setting in SETTING_NAMES:
+        _settings = None
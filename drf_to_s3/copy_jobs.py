@@ -0,0 +1,221 @@
+import datetime, logging, threading, time, uuid
+from django.utils import timezone
+from django.utils.module_loading import import_by_path
+from django.utils.translation import ugettext as _
+from rest_framework.exceptions import APIException
+from drf_to_s3 import conf, s3
+from drf_to_s3.models import CopyJob
+
+
+PENDING = 'pending'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+
+class BaseCopyJobQueue(object):
+    '''
+    A queue of copies to run in the background, so the
+    completion callback can respond before the copy finishes.
+
+    Subclasses implement enqueue() and get_job().
+
+    '''
+    def enqueue(self, src_bucket, src_key, dst_bucket, dst_key, src_etag=None, validate_src_etag=False):
+        '''
+        Queue a copy, accepting the same arguments as s3.copy().
+        Return a string job id.
+
+        '''
+        raise NotImplementedError()
+
+    def get_job(self, job_id):
+        '''
+        Return a dictionary describing the job, or None if there
+        is no such job. It contains:
+
+          - id
+          - status: 'pending', 'running', 'succeeded', or 'failed'
+          - error: For failed jobs, an error message
+          - src_bucket, src_key, dst_bucket, dst_key
+
+        '''
+        raise NotImplementedError()
+
+    def run_copy(self, job):
+        '''
+        Run the copy for the given job dictionary. Return None on
+        success, or an error message.
+
+        '''
+        try:
+            s3.copy(
+                src_bucket=job['src_bucket'],
+                src_key=job['src_key'],
+                dst_bucket=job['dst_bucket'],
+                dst_key=job['dst_key'],
+                src_etag=job['src_etag'],
+                validate_src_etag=job['validate_src_etag']
+            )
+        except APIException as exc:
+            return exc.detail
+        except Exception:
+            logging.getLogger(__name__).exception('Copy job %s failed', job['id'])
+            return _('Unable to complete your request.')
+
+
+class ThreadPoolCopyJobQueue(BaseCopyJobQueue):
+    '''
+    Runs copies on the process-wide copy executor, and keeps
+    their status in memory.
+
+    Status is only visible to the process which queued the job,
+    and is lost on restart, so this is best suited to a single
+    process, or to clients which don't need to poll.
+
+    retention_seconds: Finished jobs are forgotten after this
+      many seconds.
+
+    '''
+    retention_seconds = 3600
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def enqueue(self, src_bucket, src_key, dst_bucket, dst_key, src_etag=None, validate_src_etag=False):
+        job = {
+            'id': uuid.uuid4().hex,
+            'status': PENDING,
+            'error': None,
+            'finished': None,
+            'src_bucket': src_bucket,
+            'src_key': src_key,
+            'dst_bucket': dst_bucket,
+            'dst_key': dst_key,
+            'src_etag': src_etag,
+            'validate_src_etag': validate_src_etag,
+        }
+        with self._lock:
+            self._forget_finished_jobs()
+            self._jobs[job['id']] = job
+        s3.get_copy_executor().apply_async(self._run, (job,))
+        return job['id']
+
+    def get_job(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def _run(self, job):
+        with self._lock:
+            job['status'] = RUNNING
+        error = self.run_copy(job)
+        with self._lock:
+            job['status'] = FAILED if error else SUCCEEDED
+            job['error'] = error
+            job['finished'] = time.time()
+
+    def _forget_finished_jobs(self):
+        cutoff = time.time() - self.retention_seconds
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job['finished'] is not None and job['finished'] < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+class DatabaseCopyJobQueue(BaseCopyJobQueue):
+    '''
+    Stores jobs using the drf_to_s3.models.CopyJob model, so any
+    process can report their status. Add 'drf_to_s3' to
+    INSTALLED_APPS to create its table.
+
+    Queued jobs don't run by themselves. Run the process_copy_jobs
+    management command from a worker process or cron job, or call
+    process_pending() from a task queue.
+
+    stale_seconds: A job still running this many seconds after it
+      was claimed is assumed to belong to a worker which died, and
+      is queued again. Copies to the same key can safely be
+      repeated. This should be longer than your slowest copy.
+
+    '''
+    stale_seconds = 3600
+
+    def enqueue(self, src_bucket, src_key, dst_bucket, dst_key, src_etag=None, validate_src_etag=False):
+        job = CopyJob.objects.create(
+            id=uuid.uuid4().hex,
+            src_bucket=src_bucket,
+            src_key=src_key,
+            dst_bucket=dst_bucket,
+            dst_key=dst_key,
+            src_etag=src_etag,
+            validate_src_etag=validate_src_etag,
+            status=PENDING
+        )
+        return job.id
+
+    def get_job(self, job_id):
+        try:
+            return CopyJob.objects.get(id=job_id).as_dict()
+        except CopyJob.DoesNotExist:
+            return None
+
+    def requeue_stale(self):
+        '''
+        Queue again the running jobs claimed more than
+        stale_seconds ago. Return the number of jobs queued.
+        '''
+        now = timezone.now()
+        cutoff = now - datetime.timedelta(seconds=self.stale_seconds)
+        return CopyJob.objects.filter(status=RUNNING, updated__lt=cutoff).update(
+            status=PENDING, updated=now)
+
+    def process_pending(self, limit=None):
+        '''
+        Run pending jobs, oldest first, after queueing stale ones
+        again. Each job is claimed before it runs, so several
+        workers may call this at once.
+
+        Return the number of jobs run.
+
+        '''
+        self.requeue_stale()
+        pending = CopyJob.objects.filter(status=PENDING).order_by('created')
+        if limit is not None:
+            pending = pending[:limit]
+        count = 0
+        for job_id in list(pending.values_list('id', flat=True)):
+            # update() skips auto_now, and requeue_stale() needs the
+            # time of the claim
+            claimed = CopyJob.objects.filter(id=job_id, status=PENDING).update(
+                status=RUNNING, updated=timezone.now())
+            if not claimed:
+                continue
+            job = CopyJob.objects.get(id=job_id)
+            error = self.run_copy(job.as_dict())
+            job.status = FAILED if error else SUCCEEDED
+            job.error = error or ''
+            job.save()
+            count += 1
+        return count
+
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+def get_copy_job_queue():
+    '''
+    Return the process-wide copy job queue. Its class is the
+    dotted path in settings.AWS_COPY_JOB_QUEUE, which defaults
+    to ThreadPoolCopyJobQueue.
+
+    '''
+    path = conf.get_settings().copy_job_queue
+    try:
+        return _queues[path]
+    except KeyError:
+        with _queues_lock:
+            if path not in _queues:
+                _queues[path] = import_by_path(path)()
+            return _queues[path]
@@ -0,0 +1,81 @@
+'''
+Encoders which turn a policy document into the JSON string that
+is base64-encoded and signed.
+
+Set AWS_UPLOAD_POLICY_ENCODER to the dotted path of a function
+which accepts a document and returns a byte string, to choose an
+encoder. The default is canonical_json.
+
+'''
+import json as _stdlib_json
+from django.utils.module_loading import import_by_path
+from drf_to_s3 import conf
+try:
+    # simplejson's C extension supports sort_keys
+    import simplejson as json
+    _sorted_encoder_is_fast = True
+except ImportError:
+    import json
+    _sorted_encoder_is_fast = False
+
+
+_encode = json.JSONEncoder(separators=(',', ':')).encode
+_encode_sorted = json.JSONEncoder(separators=(',', ':'), sort_keys=True).encode
+
+
+def _is_ordered(value):
+    '''
+    Return True if value contains no dictionaries with more than
+    one key, so its encoding doesn't depend on key order.
+    '''
+    if isinstance(value, dict):
+        return len(value) <= 1 and all(_is_ordered(item) for item in value.itervalues())
+    elif isinstance(value, (list, tuple)):
+        return all(_is_ordered(item) for item in value)
+    return True
+
+def canonical_json(document):
+    '''
+    Compact JSON with sorted keys, so equal documents always
+    produce the same policy.
+
+    The standard library only sorts keys in its slower, pure-Python
+    encoder. Policy documents have a single dictionary with more
+    than one key, at the top level, so this sorts that one by hand
+    and leaves the rest to the C encoder.
+
+    '''
+    if (not _sorted_encoder_is_fast and isinstance(document, dict) and
+        all(_is_ordered(value) for value in document.itervalues())):
+        return '{%s}' % ','.join([
+            _encode(key) + ':' + _encode(document[key]) for key in sorted(document)
+        ])
+    return _encode_sorted(document)
+
+def compact_json(document):
+    '''
+    Compact JSON, with keys in whatever order the document has.
+    '''
+    return _encode(document)
+
+def legacy_json(document):
+    '''
+    json.dumps() with its default separators, which is how policies
+    were encoded before the encoder was configurable.
+    '''
+    return _stdlib_json.dumps(document)
+
+
+_encoders = {}
+
+def get_policy_encoder():
+    '''
+    Return the function named by settings.AWS_UPLOAD_POLICY_ENCODER,
+    or canonical_json.
+
+    '''
+    path = conf.get_settings().upload_policy_encoder
+    try:
+        return _encoders[path]
+    except KeyError:
+        return _encoders.setdefault(path, import_by_path(path))
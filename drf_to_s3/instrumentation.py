@@ -0,0 +1,130 @@
+'''
+Timing for the phases of the sign, upload URI, and completion
+views: parsing, validation, permission checks, signing, and
+copying to storage.
+
+Register a callback to receive each phase's name and duration in
+seconds, for example from your urls.py:
+
+    from drf_to_s3 import instrumentation
+    instrumentation.register(instrumentation.StatsDCallback(statsd_client))
+
+Until a callback is registered, timed() returns a shared context
+manager which does nothing, so the views don't read the clock.
+
+The phases are:
+
+  sign.parse, sign.validate, sign.permissions, sign.sign
+  sign_rest_request.validate, sign_rest_request.permissions,
+    sign_rest_request.sign
+  upload_uri.parse, upload_uri.prefix, upload_uri.sign
+  completion.parse, completion.validate, completion.permissions,
+    completion.handle_upload, completion.copy
+
+completion.copy is part of completion.handle_upload. A batch
+completion reports completion.validate and completion.permissions
+once for the batch, completion.handle_upload for
+handle_batch_upload, and completion.copy once for all of its
+copies.
+
+'''
+import logging, timeit
+
+
+_callbacks = []
+
+
+def register(callback):
+    '''
+    Call callback(phase, duration) after each timed phase. The
+    callback runs in the request thread, so it should be quick.
+    Exceptions it raises are logged, not propagated.
+
+    '''
+    if callback not in _callbacks:
+        _callbacks.append(callback)
+
+def unregister(callback):
+    if callback in _callbacks:
+        _callbacks.remove(callback)
+
+def is_enabled():
+    return bool(_callbacks)
+
+
+class _NullTimer(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+class _Timer(object):
+    def __init__(self, phase):
+        self.phase = phase
+        self.start = None
+
+    def __enter__(self):
+        self.start = timeit.default_timer()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        duration = timeit.default_timer() - self.start
+        for callback in list(_callbacks):
+            try:
+                callback(self.phase, duration)
+            except Exception:
+                logging.getLogger(__name__).exception('Instrumentation callback failed')
+        return False
+
+
+_null_timer = _NullTimer()
+
+def timed(phase):
+    '''
+    Context manager which reports how long its block took to the
+    registered callbacks, including when it raises.
+
+        with instrumentation.timed('sign.validate'):
+            ...
+
+    '''
+    if not _callbacks:
+        return _null_timer
+    return _Timer(phase)
+
+
+class StatsDCallback(object):
+    '''
+    Sends each phase as a timer to a StatsD client, such as
+    statsd.StatsClient, named prefix.phase.
+
+    '''
+    def __init__(self, client, prefix='drf_to_s3'):
+        self.client = client
+        self.prefix = prefix
+
+    def __call__(self, phase, duration):
+        self.client.timing('%s.%s' % (self.prefix, phase), duration * 1000)
+
+
+class PrometheusCallback(object):
+    '''
+    Observes each phase in a Prometheus histogram with a `phase`
+    label. When histogram is None, one is created with
+    prometheus_client, named drf_to_s3_phase_seconds.
+
+    '''
+    def __init__(self, histogram=None):
+        if histogram is None:
+            from prometheus_client import Histogram
+            histogram = Histogram(
+                'drf_to_s3_phase_seconds',
+                'Time spent in each phase of the drf_to_s3 views',
+                ['phase']
+            )
+        self.histogram = histogram
+
+    def __call__(self, phase, duration):
+        self.histogram.labels(phase=phase).observe(duration)
@@ -0,0 +1,137 @@
+'''
+Key layouts, which decide where uploads and their copies in
+storage are put.
+
+S3 scales request rates per key prefix, so sites with sustained
+high PUT or COPY rates can spread keys over more prefixes. Set
+AWS_UPLOAD_KEY_LAYOUT to the dotted path of a layout class to
+choose one:
+
+  drf_to_s3.key_layout.DefaultKeyLayout: Uploads go to
+    <upload_prefix>/<uuid>, and copies to <uuid><ext> at the root of
+    the storage bucket. This is the default.
+  drf_to_s3.key_layout.HashedKeyLayout: Uploads go to
+    <shard>/<upload_prefix>/<uuid>, where shard is taken from a hash
+    of the upload prefix, and copies to <shard>/<uuid><ext>, where
+    shard is taken from the uuid.
+  drf_to_s3.key_layout.DatePartitionedKeyLayout: Uploads go to
+    <upload_prefix>/<yyyy>/<mm>/<dd>/<uuid>, and copies to
+    <yyyy>/<mm>/<dd>/<uuid><ext>.
+
+The layout also decides which keys a user may upload to, so
+changing it invalidates keys clients have already been given. Clients
+which build their own keys should use the prefix set by
+UploadPrefixMiddleware, which follows the layout.
+
+'''
+import datetime, hashlib, os, threading, uuid
+from django.utils.module_loading import import_by_path
+from drf_to_s3 import conf
+
+
+class BaseKeyLayout(object):
+    '''
+    Subclasses implement key_prefix(), new_upload_key(), and
+    new_storage_key().
+
+    '''
+    def key_prefix(self, upload_prefix):
+        '''
+        Return the prefix, without a trailing slash, which every key
+        the user uploads to must start with.
+        '''
+        raise NotImplementedError()
+
+    def new_upload_key(self, upload_prefix):
+        '''
+        Return a new, random key for an upload, which starts with
+        key_prefix(upload_prefix) followed by a slash.
+        '''
+        raise NotImplementedError()
+
+    def new_storage_key(self, filename):
+        '''
+        Return a new, random key for a copy in the storage bucket,
+        preserving the extension of filename.
+        '''
+        raise NotImplementedError()
+
+
+class DefaultKeyLayout(BaseKeyLayout):
+
+    def key_prefix(self, upload_prefix):
+        return upload_prefix
+
+    def new_upload_key(self, upload_prefix):
+        return '%s/%s' % (self.key_prefix(upload_prefix), str(uuid.uuid4()))
+
+    def new_storage_key(self, filename):
+        basename, ext = os.path.splitext(filename)
+        return str(uuid.uuid4()) + ext
+
+
+class HashedKeyLayout(DefaultKeyLayout):
+    '''
+    Puts a short hex shard in front of each key. A user's uploads
+    share a shard, so their keys can still be checked against a
+    single prefix; copies in storage are sharded per object.
+
+    shard_length: The number of hex digits in each shard. Four
+      gives 65,536 prefixes.
+
+    '''
+    shard_length = 4
+
+    def key_prefix(self, upload_prefix):
+        if isinstance(upload_prefix, unicode):
+            encoded = upload_prefix.encode('utf-8')
+        else:
+            encoded = upload_prefix
+        shard = hashlib.md5(encoded).hexdigest()[:self.shard_length]
+        return '%s/%s' % (shard, upload_prefix)
+
+    def new_storage_key(self, filename):
+        basename, ext = os.path.splitext(filename)
+        key = uuid.uuid4().hex
+        return '%s/%s%s' % (key[:self.shard_length], key, ext)
+
+
+class DatePartitionedKeyLayout(DefaultKeyLayout):
+    '''
+    Puts the UTC date after the user's prefix, so keys written on
+    different days fall under different prefixes. Users may upload
+    to any date under their prefix, so uploads which straddle
+    midnight aren't rejected.
+
+    '''
+    date_format = '%Y/%m/%d'
+
+    def today(self):
+        return datetime.datetime.utcnow().strftime(self.date_format)
+
+    def new_upload_key(self, upload_prefix):
+        return '%s/%s/%s' % (self.key_prefix(upload_prefix), self.today(), str(uuid.uuid4()))
+
+    def new_storage_key(self, filename):
+        basename, ext = os.path.splitext(filename)
+        return '%s/%s%s' % (self.today(), str(uuid.uuid4()), ext)
+
+
+_layouts = {}
+_layouts_lock = threading.Lock()
+
+def get_key_layout():
+    '''
+    Return the process-wide key layout. Its class is the dotted
+    path in settings.AWS_UPLOAD_KEY_LAYOUT, which defaults to
+    DefaultKeyLayout.
+
+    '''
+    path = conf.get_settings().upload_key_layout
+    try:
+        return _layouts[path]
+    except KeyError:
+        with _layouts_lock:
+            if path not in _layouts:
+                _layouts[path] = import_by_path(path)()
+            return _layouts[path]
@@ -0,0 +1,35 @@
+import time
+from optparse import make_option
+from django.core.management.base import BaseCommand, CommandError
+from drf_to_s3.copy_jobs import get_copy_job_queue
+
+
+class Command(BaseCommand):
+    '''
+    Run the copies queued by DatabaseCopyJobQueue. Run it from cron,
+    or with --interval as a long-running worker. Several workers may
+    run at once.
+
+    '''
+    help = 'Run queued copy jobs. Requires AWS_COPY_JOB_QUEUE to be a DatabaseCopyJobQueue.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--limit', type='int', default=None,
+                    help='Run at most this many jobs per pass'),
+        make_option('--interval', type='float', default=None,
+                    help='Keep running, checking for jobs every this many seconds'),
+    )
+
+    def handle(self, *args, **options):
+        queue = get_copy_job_queue()
+        if not hasattr(queue, 'process_pending'):
+            raise CommandError('%s does not store jobs for a worker to run' % type(queue).__name__)
+        limit = options.get('limit')
+        interval = options.get('interval')
+        while True:
+            count = queue.process_pending(limit=limit)
+            if int(options.get('verbosity', 1)) > 1:
+                self.stdout.write('Ran %d copy jobs' % count)
+            if interval is None:
+                return
+            time.sleep(interval)
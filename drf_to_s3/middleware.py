@@ -1,6 +1,23 @@
+from rest_framework.exceptions import PermissionDenied
+from drf_to_s3 import conf
+from drf_to_s3.access_control import upload_bucket_for_request, upload_prefix_for_request
+from drf_to_s3.key_layout import get_key_layout
+
+
 class UploadPrefixMiddleware(object):
     '''
-    Sets a cookie with the upload prefix.
+    Sets a cookie with the upload prefix. Keys the client builds
+    should start with its value and a slash. With a key layout
+    other than the default, this includes the layout's shard; see
+    drf_to_s3.key_layout.
+
+    With AWS_UPLOAD_BUCKETS, each user is routed to one of several
+    buckets (see drf_to_s3.routing), so it also sets a cookie with
+    the user's bucket. A browser client should build its endpoint
+    from it, e.g. https://<bucket>.s3.amazonaws.com, rather than
+    hard-coding AWS_UPLOAD_BUCKET. The cookie names are set by
+    UPLOAD_PREFIX_COOKIE_NAME and UPLOAD_BUCKET_COOKIE_NAME, which
+    default to upload_prefix and upload_bucket.
 
     To be agnostic about your method of user authentication, this is
     handled using middleware. It can't be in a signal, since the signal
@@ -21,13 +38,16 @@ class UploadPrefixMiddleware(object):
     '''
 
     def process_response(self, request, response):
-        from django.conf import settings
-        from rest_framework.exceptions import PermissionDenied
-        from .access_control import upload_prefix_for_request
-
-        cookie_name = getattr(settings, 'UPLOAD_PREFIX_COOKIE_NAME', 'upload_prefix')
+        config = conf.get_settings()
         try:
-            response.set_cookie(cookie_name, upload_prefix_for_request(request))
+            key_prefix = get_key_layout().key_prefix(upload_prefix_for_request(request))
+            bucket = upload_bucket_for_request(request) if config.upload_buckets else None
         except PermissionDenied:
-            response.delete_cookie(cookie_name)
+            response.delete_cookie(config.upload_prefix_cookie_name)
+            if config.upload_buckets:
+                response.delete_cookie(config.upload_bucket_cookie_name)
+        else:
+            response.set_cookie(config.upload_prefix_cookie_name, key_prefix)
+            if bucket is not None:
+                response.set_cookie(config.upload_bucket_cookie_name, bucket)
         return response
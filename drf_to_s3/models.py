@@ -1,3 +1,10 @@
+from django.db import models
+
+
+def _unpickle(cls, kwargs):
+    return cls(**kwargs)
+
+
 class Policy(object):
     '''
     Encapsulates a policy document for an S3 POST request.
@@ -6,15 +13,35 @@ class Policy(object):
 
     expiration: The policy expiration date, a native datetime.datetime object
     conditions: A list of PolicyCondition objects
-    
+
+    Conditions are indexed by element name when they're set, so
+    policy['key'] doesn't scan the list. Assign a new list to
+    conditions, rather than changing it in place, to keep the
+    index current.
+
     '''
-    expiration = None
-    conditions = None
+    __slots__ = ('expiration', '_conditions', '_index')
 
     def __init__(self, **kwargs):
         self.expiration = kwargs.get('expiration')
         self.conditions = kwargs.get('conditions')
 
+    @property
+    def conditions(self):
+        return self._conditions
+
+    @conditions.setter
+    def conditions(self, conditions):
+        self._conditions = conditions
+        self._index = self._build_index(conditions)
+
+    @staticmethod
+    def _build_index(conditions):
+        index = {}
+        for item in conditions or ():
+            index.setdefault(item.element_name, item)
+        return index
+
     def __getitem__(self, element_name):
         '''
         Return the condition matching the given element name.
@@ -22,10 +49,58 @@ class Policy(object):
 
         '''
         try:
-            return next(item for item in self.conditions if item.element_name == element_name)
-        except StopIteration:
+            return self._index[element_name]
+        except KeyError:
             raise AttributeError('No matching condition')
 
+    def freeze(self):
+        '''
+        Return an immutable copy, which is safe to cache and share.
+        '''
+        return FrozenPolicy(expiration=self.expiration, conditions=self.conditions)
+
+    def __reduce__(self):
+        # With __slots__ and, for FrozenPolicy, no __setattr__, the
+        # default pickling doesn't work
+        return (_unpickle, (type(self), {
+            'expiration': self.expiration,
+            'conditions': self.conditions,
+        }))
+
+
+class FrozenPolicy(Policy):
+    '''
+    An immutable, hashable Policy. Its conditions are a tuple of
+    FrozenPolicyCondition objects.
+
+    '''
+    __slots__ = ()
+
+    def __init__(self, **kwargs):
+        conditions = kwargs.get('conditions')
+        if conditions is not None:
+            conditions = tuple(item.freeze() for item in conditions)
+        object.__setattr__(self, 'expiration', kwargs.get('expiration'))
+        object.__setattr__(self, '_conditions', conditions)
+        object.__setattr__(self, '_index', self._build_index(conditions))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('FrozenPolicy is immutable')
+
+    def __eq__(self, other):
+        return (isinstance(other, FrozenPolicy) and
+                (self.expiration, self.conditions) == (other.expiration, other.conditions))
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.expiration, self.conditions))
+
+    def freeze(self):
+        return self
+
+
 class PolicyCondition(object):
     '''
     Encapsulates a condition on a Policy.
@@ -37,10 +112,7 @@ class PolicyCondition(object):
       value or value_range is required. Defining both is an error.
 
     '''
-    operator = None
-    element_name = None
-    value = None
-    value_range = None
+    __slots__ = ('operator', 'element_name', 'value', 'value_range')
 
     def __init__(self, **kwargs):
         self.operator = kwargs.get('operator')
@@ -57,3 +129,148 @@ class PolicyCondition(object):
 
         '''
         return self.operator and self.operator != 'eq'
+
+    def freeze(self):
+        '''
+        Return an immutable copy, which is safe to cache and share.
+        '''
+        return FrozenPolicyCondition(
+            operator=self.operator,
+            element_name=self.element_name,
+            value=self.value,
+            value_range=self.value_range
+        )
+
+    def __reduce__(self):
+        return (_unpickle, (type(self), {
+            'operator': self.operator,
+            'element_name': self.element_name,
+            'value': self.value,
+            'value_range': self.value_range,
+        }))
+
+
+class FrozenPolicyCondition(PolicyCondition):
+    '''
+    An immutable, hashable PolicyCondition. value_range, if
+    present, is a tuple.
+
+    '''
+    __slots__ = ()
+
+    def __init__(self, **kwargs):
+        value_range = kwargs.get('value_range')
+        if kwargs.get('value') is not None and value_range is not None:
+            raise AssertionError('value and value_range should not both be defined')
+        object.__setattr__(self, 'operator', kwargs.get('operator'))
+        object.__setattr__(self, 'element_name', kwargs.get('element_name'))
+        object.__setattr__(self, 'value', kwargs.get('value'))
+        object.__setattr__(self, 'value_range', tuple(value_range) if value_range is not None else None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('FrozenPolicyCondition is immutable')
+
+    def _key(self):
+        return (self.operator, self.element_name, self.value, self.value_range)
+
+    def __eq__(self, other):
+        return isinstance(other, FrozenPolicyCondition) and self._key() == other._key()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def freeze(self):
+        return self
+
+
+class RESTRequest(object):
+    '''
+    Encapsulates the string to sign for an S3 REST request, which
+    Fine Uploader sends to the signature endpoint when uploading
+    in chunks.
+
+    http://docs.aws.amazon.com/AmazonS3/latest/dev/RESTAuthentication.html
+
+    method: 'POST', 'PUT', or 'DELETE'
+    content_md5, content_type, date: The header values, which may
+      be empty strings
+    amz_headers: A list of (name, value) tuples for the x-amz-*
+      headers, in order
+    bucket: The bucket name
+    key: The key, unquoted
+    resource: The canonicalized resource, as sent
+    subresources: A list of (name, value) tuples from the query
+      string, with value None for a bare name like 'uploads'
+
+    '''
+    method = None
+    content_md5 = None
+    content_type = None
+    date = None
+    amz_headers = None
+    bucket = None
+    key = None
+    resource = None
+    subresources = None
+
+    def __init__(self, **kwargs):
+        self.method = kwargs.get('method')
+        self.content_md5 = kwargs.get('content_md5', '')
+        self.content_type = kwargs.get('content_type', '')
+        self.date = kwargs.get('date', '')
+        self.amz_headers = kwargs.get('amz_headers', [])
+        self.bucket = kwargs.get('bucket')
+        self.key = kwargs.get('key')
+        self.resource = kwargs.get('resource')
+        self.subresources = kwargs.get('subresources', [])
+
+    def get_amz_header(self, name, default=None):
+        for header_name, value in self.amz_headers:
+            if header_name == name:
+                return value
+        return default
+
+    @property
+    def canonicalized_headers(self):
+        return '\n'.join('%s:%s' % header for header in self.amz_headers)
+
+    @property
+    def subresource_names(self):
+        return [name for name, value in self.subresources]
+
+
+class CopyJob(models.Model):
+    '''
+    A copy queued by copy_jobs.DatabaseCopyJobQueue.
+
+    '''
+    id = models.CharField(max_length=32, primary_key=True)
+    src_bucket = models.CharField(max_length=255)
+    src_key = models.CharField(max_length=1024)
+    dst_bucket = models.CharField(max_length=255)
+    dst_key = models.CharField(max_length=1024)
+    src_etag = models.CharField(max_length=255, null=True, blank=True)
+    validate_src_etag = models.BooleanField(default=False)
+    status = models.CharField(max_length=16, db_index=True)
+    error = models.TextField(blank=True, default='')
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        app_label = 'drf_to_s3'
+
+    def as_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'error': self.error or None,
+            'src_bucket': self.src_bucket,
+            'src_key': self.src_key,
+            'dst_bucket': self.dst_bucket,
+            'dst_key': self.dst_key,
+            'src_etag': self.src_etag,
+            'validate_src_etag': self.validate_src_etag,
+        }
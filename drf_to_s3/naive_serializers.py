@@ -1,6 +1,148 @@
-from rest_framework import serializers
+import urllib
+from numbers import Integral, Number
 from django.core.exceptions import ValidationError
+from django.db.models.query import EmptyQuerySet
 from django.utils.translation import ugettext as _
+from rest_framework import serializers
+from drf_to_s3.models import Policy, PolicyCondition, RESTRequest
+from drf_to_s3.util import duplicates_in
+
+
+def condition_to_native(value):
+    '''
+    Return the list or dictionary representation of a
+    PolicyCondition.
+
+    '''
+    if value.value_range is not None:
+        if value.value is not None:
+            raise ValidationError(
+                _('Do not use value and value_range together')
+            )
+        if value.operator is not None:
+            raise ValidationError(
+                _('operator should not be used with value_range')
+            )
+        if not isinstance(value.value_range, (list, tuple)):
+            raise ValidationError(
+                _('value_range should be a list')
+            )
+    if value.value_range:
+        return [value.element_name] + list(value.value_range)
+    elif value.operator:
+        return [value.operator, '$' + value.element_name, value.value]
+    else:
+        return {value.element_name: value.value}
+
+def condition_from_native(data):
+    '''
+    Return a PolicyCondition for a condition in list or
+    dictionary form. Raises ValidationError if it's malformed.
+
+    '''
+    if isinstance(data, list):
+        return _condition_from_list(data)
+    elif isinstance(data, dict):
+        return _condition_from_dict(data)
+    else:
+        raise ValidationError(
+            _('Condition must be array or dictionary, not %(type)s: %(condition)s'),
+            params={'type': data.__class__.__name__, 'condition': data},
+        )
+
+def _condition_from_list(condition_list):
+    '''
+    These arrive in one of three formats:
+      - ["content-length-range", 1048579, 10485760]
+      - ["content-length-range", 1024]
+      - ["starts-with", "$key", "user/eric/"]
+
+    Returns an object with these attributes set:
+      - operator: 'eq', 'starts-with', or None
+      - element_name: 'content-length-range', 'key', etc.
+      - value: "user/eric/", 1024, or None
+      - value_range: [1048579, 10485760] or None
+    '''
+    original_condition_list = condition_list # We use this for error reporting
+    condition_list = list(condition_list)
+    for item in condition_list:
+        if not isinstance(item, basestring) and not isinstance(item, Number):
+            raise ValidationError(
+                _('Values in condition arrays should be numbers or strings'),
+            )
+    try:
+        if condition_list[0] in ['eq', 'starts-with']:
+            operator = condition_list.pop(0)
+        else:
+            operator = None
+    except IndexError:
+        raise ValidationError(
+            _('Empty condition array: %(condition)s'),
+            params={'condition': original_condition_list},
+        )
+    try:
+        element_name = condition_list.pop(0)
+    except IndexError:
+        raise ValidationError(
+            _('Missing element in condition array: %(condition)s'),
+            params={'condition': original_condition_list},
+        )
+    if operator:
+        if element_name.startswith('$'):
+            element_name = element_name[1:]
+        else:
+            raise ValidationError(
+                _('Element name in condition array should start with $: %(element_name)s'),
+                params={'element_name': element_name},
+            )
+    if len(condition_list) == 0:
+        raise ValidationError(
+            _('Missing values in condition array: %(condition)s'),
+            params={'condition': original_condition_list},
+        )
+    elif len(condition_list) == 1:
+        value = condition_list.pop(0)
+        value_range = None
+    elif len(condition_list) == 2:
+        value = None
+        value_range = condition_list
+    else:
+        raise ValidationError(
+            _('Too many values in condition array: %(condition)s'),
+            params={'condition': original_condition_list},
+        )
+    return PolicyCondition(
+        operator=operator,
+        element_name=element_name,
+        value=value,
+        value_range=value_range
+    )
+
+def _condition_from_dict(condition_dict):
+    '''
+    {"bucket": "name-of-bucket"}
+    '''
+    if len(condition_dict) > 1:
+        raise ValidationError(
+            _('Too many values in condition dictionary: %(condition)s'),
+            params={'condition': condition_dict},
+        )
+    elif len(condition_dict) == 0:
+        raise ValidationError(
+            _('Empty condition dictionary: %(condition)s'),
+            params={'condition': condition_dict},
+        )
+    (element_name, value), = condition_dict.items()
+    if not isinstance(value, basestring) and not isinstance(value, Number):
+        raise ValidationError(
+            _('Values in condition dictionaries should be numbers or strings'),
+        )
+    return PolicyCondition(
+        operator=None,
+        element_name=element_name,
+        value=value,
+        value_range=None
+    )
 
 
 class NaivePolicyConditionField(serializers.RelatedField):
@@ -24,129 +166,44 @@ class NaivePolicyConditionField(serializers.RelatedField):
     http://docs.aws.amazon.com/AmazonS3/latest/dev/HTTPPOSTForms.html#HTTPPOSTConstructPolicy
     '''
     def to_native(self, value):
-        if value.value_range is not None:
-            if value.value is not None:
-                raise ValidationError(
-                    _('Do not use value and value_range together')
-                )
-            if value.operator is not None:
-                raise ValidationError(
-                    _('operator should not be used with value_range')
-                )
-            if not isinstance(value.value_range, list):
-                raise ValidationError(
-                    _('value_range should be a list')
-                )
-        if value.value_range:
-            return [value.element_name] + value.value_range
-        elif value.operator:
-            return [value.operator, '$' + value.element_name, value.value]
-        else:
-            return {value.element_name: value.value}
+        return condition_to_native(value)
 
     def from_native(self, data):
-        if isinstance(data, list):
-            return self._from_native_list(data)
-        elif isinstance(data, dict):
-            return self._from_native_dict(data)
-        else:
-            raise ValidationError(
-                _('Condition must be array or dictionary, not %(type)s: %(condition)s'),
-                params={'type': data.__class__.__name__, 'condition': data},
-            )
+        return condition_from_native(data)
 
-    def _from_native_list(self, condition_list):
-        '''
-        These arrive in one of three formats:
-          - ["content-length-range", 1048579, 10485760]
-          - ["content-length-range", 1024]
-          - ["starts-with", "$key", "user/eric/"]
-
-        Returns an object with these attributes set:
-          - operator: 'eq', 'starts-with', or None
-          - element_name: 'content-length-range', 'key', etc.
-          - value: "user/eric/", 1024, or None
-          - value_range: [1048579, 10485760] or None
-        '''
-        from numbers import Number
-        from drf_to_s3.models import PolicyCondition
-        original_condition_list = condition_list # We use this for error reporting
-        condition_list = list(condition_list)
-        for item in condition_list:
-            if not isinstance(item, basestring) and not isinstance(item, Number):
-                raise ValidationError(
-                    _('Values in condition arrays should be numbers or strings'),
-                )
-        try:
-            if condition_list[0] in ['eq', 'starts-with']:
-                operator = condition_list.pop(0)
-            else:
-                operator = None
-        except IndexError:
-            raise ValidationError(
-                _('Empty condition array: %(condition)s'),
-                params={'condition': original_condition_list},
-            )
-        try:
-            element_name = condition_list.pop(0)
-        except IndexError:
-            raise ValidationError(
-                _('Missing element in condition array: %(condition)s'),
-                params={'condition': original_condition_list},
-            )
-        if operator:
-            if element_name.startswith('$'):
-                element_name = element_name[1:]
-            else:
-                raise ValidationError(
-                    _('Element name in condition array should start with $: %(element_name)s'),
-                    params={'element_name': element_name},
-                )
-        if len(condition_list) == 0:
-            raise ValidationError(
-                _('Missing values in condition array: %(condition)s'),
-                params={'condition': original_condition_list},
-            )
-        elif len(condition_list) == 1:
-            value = condition_list.pop(0)
-            value_range = None
-        elif len(condition_list) == 2:
-            value = None
-            value_range = condition_list
-        else:
-            raise ValidationError(
-                _('Too many values in condition array: %(condition)s'),
-                params={'condition': original_condition_list},
-            )
-        return PolicyCondition(
-            operator=operator,
-            element_name=element_name,
-            value=value,
-            value_range=value_range
-        )
 
-    def _from_native_dict(self, condition_dict):
-        '''
-        {"bucket": "name-of-bucket"}
-        '''
-        from numbers import Number
-        from drf_to_s3.models import PolicyCondition
-        if len(condition_dict) > 1:
-            raise ValidationError(
-                _('Too many values in condition dictionary: %(condition)s'),
-                params={'condition': condition_dict},
-            )
-        element_name, value = condition_dict.popitem()
-        if not isinstance(value, basestring) and not isinstance(value, Number):
-            raise ValidationError(
-                _('Values in condition dictionaries should be numbers or strings'),
-            )
-        return PolicyCondition(
-            operator=None,
-            element_name=element_name,
-            value=value,
-            value_range=None
+class PolicySerializerMetaclass(serializers.SerializerMetaclass):
+    '''
+    Compiles the policy schema once, when the serializer class is
+    created:
+
+      - condition_validators: A dictionary from element name to the
+        name of its validate_condition_<name> method. It's keyed by
+        both the sanitized name (Content_Type) and the element names
+        in required_conditions and optional_conditions
+        (Content-Type).
+      - required_condition_set: A frozenset of required_conditions
+      - allowed_condition_set: A frozenset of required_conditions
+        and optional_conditions
+
+    '''
+    def __new__(cls, name, bases, attrs):
+        new_class = super(PolicySerializerMetaclass, cls).__new__(cls, name, bases, attrs)
+        prefix = 'validate_condition_'
+        condition_validators = dict(
+            (attr_name[len(prefix):], attr_name)
+            for attr_name in dir(new_class) if attr_name.startswith(prefix)
         )
+        required_conditions = list(getattr(new_class, 'required_conditions', []))
+        optional_conditions = list(getattr(new_class, 'optional_conditions', []))
+        for element_name in required_conditions + optional_conditions:
+            sanitized_element_name = element_name.replace('-', '_')
+            if sanitized_element_name in condition_validators:
+                condition_validators[element_name] = condition_validators[sanitized_element_name]
+        new_class.condition_validators = condition_validators
+        new_class.required_condition_set = frozenset(required_conditions)
+        new_class.allowed_condition_set = frozenset(required_conditions + optional_conditions)
+        return new_class
 
 
 class NaivePolicySerializer(serializers.Serializer):
@@ -168,15 +225,18 @@ class NaivePolicySerializer(serializers.Serializer):
     subclass may implement
 
        def validate_condition_<name>(self, condition):
-
     which this method automatically will call whenever a condition
     is present with the given element name. Raise a ValidationError
     to indicate an error. Note this method is only called when
     a condition is present. To make the condition required, add
     it to required_conditions.
 
+    These methods are looked up once, when the class is created.
+    See PolicySerializerMetaclass.
+
     '''
-    from django.db.models.query import EmptyQuerySet
+    __metaclass__ = PolicySerializerMetaclass
+
     expiration = serializers.DateTimeField(required=False, format='%Y-%m-%dT%H:%M:%SZ')
     conditions = NaivePolicyConditionField(
         many=True,
@@ -186,15 +246,36 @@ class NaivePolicySerializer(serializers.Serializer):
     )
 
     def restore_object(self, attrs, instance=None):
-        from drf_to_s3.models import Policy
         return Policy(**attrs)
 
+    def get_condition_validator(self, element_name):
+        '''
+        Return the validate_condition_<name> method for the given
+        element name, or None.
+
+        '''
+        method_name = self.condition_validators.get(element_name)
+        if method_name is None:
+            # Element names which aren't in required_conditions or
+            # optional_conditions are only keyed by their sanitized
+            # name: validate_condition_Content-Type ->
+            # validate_condition_Content_Type
+            # FIXME this needs to sanitize the arguments a bit more
+            sanitized_element_name = element_name.replace('-', '_')
+            method_name = self.condition_validators.get(sanitized_element_name)
+            if method_name is None:
+                # Not defined on the class, but may have been set on
+                # this instance
+                method_name = 'validate_condition_' + sanitized_element_name
+                if method_name not in self.__dict__:
+                    return None
+        return getattr(self, method_name)
+
     def validate(self, attrs):
         '''
         1. Disallow multiple conditions with the same element name
-        2. Use introspection to validate individual conditions which are present.
+        2. Validate individual conditions which are present.
         '''
-        from .util import duplicates_in
         conditions = attrs.get('conditions', [])
         errors = {}
         all_names = [item.element_name for item in conditions]
@@ -202,10 +283,7 @@ class NaivePolicySerializer(serializers.Serializer):
             message = _('Duplicate element name')
             errors['conditions.' + name] = [message]
         for item in conditions:
-            # FIXME this needs to sanitize the arguments a bit more
-            # validate_condition_Content-Type -> validate_condition_Content_Type
-            sanitized_element_name = item.element_name.replace('-', '_')
-            condition_validate = getattr(self, "validate_condition_%s" % sanitized_element_name, None)
+            condition_validate = self.get_condition_validator(item.element_name)
             if condition_validate:
                 try:
                     condition_validate(item)
@@ -218,10 +296,137 @@ class NaivePolicySerializer(serializers.Serializer):
             return attrs
 
 
+class NaiveRESTRequestSerializer(serializers.Serializer):
+    '''
+    Parses the string to sign for an S3 REST request into a
+    RESTRequest instance. Fine Uploader posts this as `headers`
+    when it uploads in chunks:
+
+      POST
+      <Content-MD5>
+      <Content-Type>
+      <Date>
+      x-amz-acl:private
+      x-amz-date:Sat, 01 Feb 2014 12:00:00 GMT
+      /bucket/key?uploads
+
+    Like NaivePolicySerializer, it only checks the format.
+    serializers.DefaultRESTRequestSerializer decides which requests
+    may be signed.
+
+    http://docs.aws.amazon.com/AmazonS3/latest/dev/RESTAuthentication.html#ConstructingTheAuthenticationHeader
+
+    '''
+    headers = serializers.CharField()
+
+    def validate_headers(self, attrs, source):
+        lines = attrs[source].split('\n')
+        if len(lines) < 5:
+            raise ValidationError(_('Expected a string to sign for a REST request'))
+        method, content_md5, content_type, date = lines[:4]
+        resource = lines[-1]
+
+        amz_headers = []
+        for line in lines[4:-1]:
+            name, sep, value = line.partition(':')
+            if not sep or not name.startswith('x-amz-') or name != name.lower():
+                raise ValidationError(
+                    _('Invalid header: %(header)s'),
+                    params={'header': line},
+                )
+            amz_headers.append((name, value))
+
+        path, sep, query = resource.partition('?')
+        bucket, sep, key = path[1:].partition('/')
+        if not path.startswith('/') or not bucket or not key:
+            raise ValidationError(_('Resource should be /<bucket>/<key>'))
+        subresources = []
+        if query:
+            for item in query.split('&'):
+                name, sep, value = item.partition('=')
+                subresources.append((name, value if sep else None))
+
+        attrs[source] = RESTRequest(
+            method=method,
+            content_md5=content_md5,
+            content_type=content_type,
+            date=date,
+            amz_headers=amz_headers,
+            bucket=bucket,
+            key=urllib.unquote(key.encode('utf-8')),
+            resource=resource,
+            subresources=subresources
+        )
+        return attrs
+
+    def restore_object(self, attrs, instance=None):
+        return attrs['headers']
+
+
 class APIUploadCompletionSerializer(serializers.Serializer):
     key = serializers.CharField()
     filename = serializers.CharField()
 
+
+def _validate_part_number(value):
+    if isinstance(value, bool) or not isinstance(value, Integral) or not 1 <= value <= 10000:
+        raise ValidationError(_('Part numbers should be integers between 1 and 10000'))
+    return int(value)
+
+
+class PartNumberListField(serializers.WritableField):
+    '''
+    A non-empty list of distinct part numbers, such as [1, 2, 3].
+
+    '''
+    def from_native(self, value):
+        if not isinstance(value, list) or not len(value):
+            raise ValidationError(_('Expected a non-empty list of part numbers'))
+        part_numbers = [_validate_part_number(item) for item in value]
+        if len(set(part_numbers)) != len(part_numbers):
+            raise ValidationError(_('Duplicate part number'))
+        return part_numbers
+
+
+class CompletedPartListField(serializers.WritableField):
+    '''
+    A non-empty list of uploaded parts, each a dictionary with
+    `part_number` and `etag`:
+
+      [{"part_number": 1, "etag": "b54357faf0632cce46e942fa68356b38"}]
+
+    Restores to a list of (part_number, etag) tuples.
+
+    '''
+    def from_native(self, value):
+        if not isinstance(value, list) or not len(value):
+            raise ValidationError(_('Expected a non-empty list of parts'))
+        parts = []
+        for item in value:
+            if not isinstance(item, dict):
+                raise ValidationError(_('Parts should be dictionaries with part_number and etag'))
+            etag = item.get('etag')
+            if not isinstance(etag, basestring) or not len(etag):
+                raise ValidationError(_('Parts should be dictionaries with part_number and etag'))
+            parts.append((_validate_part_number(item.get('part_number')), etag))
+        if len(set(part_number for part_number, etag in parts)) != len(parts):
+            raise ValidationError(_('Duplicate part number'))
+        return parts
+
+
+class MultipartUploadSerializer(serializers.Serializer):
+    key = serializers.CharField()
+    upload_id = serializers.CharField()
+
+
+class MultipartUploadPartsSerializer(MultipartUploadSerializer):
+    part_numbers = PartNumberListField()
+
+
+class MultipartUploadCompletionSerializer(APIUploadCompletionSerializer):
+    upload_id = serializers.CharField()
+    parts = CompletedPartListField()
+
  
 class FineUploadCompletionSerializer(serializers.Serializer):
     bucket = serializers.CharField()
@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import parsers
 
 
@@ -54,9 +55,8 @@ class NestedFormParser(parsers.BaseParser):
     media_type = 'application/x-www-form-urlencoded'
 
     def parse(self, stream, media_type=None, parser_context=None):
-        import urllib
+        # querystring_parser is only needed by sites which use this parser
         from querystring_parser import parser
-        from django.conf import settings
 
         encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
         return parser.parse(stream.read(), unquote=True, encoding=encoding)
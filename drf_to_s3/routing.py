@@ -0,0 +1,111 @@
+'''
+Route each user's uploads to one of several buckets, to spread
+requests across buckets, and regions, beyond the rate S3 allows
+for one.
+
+Set AWS_UPLOAD_BUCKETS to a list of bucket names to route uploads,
+and AWS_STORAGE_BUCKETS to route copies to storage. Users are
+assigned to buckets by a consistent hash of their upload prefix,
+so adding a bucket moves only about 1/n of the users. Set
+AWS_UPLOAD_BUCKET_REGIONS to a dictionary of bucket names to
+regions, for buckets outside AWS_UPLOAD_REGION.
+
+The signed-URI views sign for the user's bucket themselves. Browser
+clients, which build their own endpoint, can read the bucket from
+the cookie drf_to_s3.middleware.UploadPrefixMiddleware sets.
+
+With only AWS_UPLOAD_BUCKET and AWS_STORAGE_BUCKET_NAME, every user
+gets those buckets.
+
+'''
+import bisect, hashlib, threading
+from drf_to_s3 import conf
+
+
+def _hash(value):
+    return int(hashlib.md5(value).hexdigest()[:16], 16)
+
+
+class BucketRing(object):
+    '''
+    A consistent hash ring over bucket names.
+
+    replicas: The number of points each bucket gets on the ring.
+      More points spread users more evenly.
+
+    '''
+    def __init__(self, buckets, replicas=100):
+        if not buckets:
+            raise ValueError('At least one bucket is required')
+        self.buckets = tuple(buckets)
+        points = sorted(
+            (_hash('%s-%d' % (bucket, i)), bucket)
+            for bucket in self.buckets
+            for i in range(replicas)
+        )
+        self._hashes = [point for point, bucket in points]
+        self._buckets = [bucket for point, bucket in points]
+
+    def bucket_for(self, value):
+        '''
+        Return the bucket for the given string.
+        '''
+        if len(self.buckets) == 1:
+            return self.buckets[0]
+        if isinstance(value, unicode):
+            value = value.encode('utf-8')
+        index = bisect.bisect(self._hashes, _hash(value)) % len(self._hashes)
+        return self._buckets[index]
+
+
+_rings = {}
+_rings_lock = threading.Lock()
+
+def get_ring(buckets):
+    '''
+    Return the BucketRing for the given list of buckets, building
+    it on first use.
+    '''
+    key = tuple(buckets)
+    try:
+        return _rings[key]
+    except KeyError:
+        with _rings_lock:
+            if key not in _rings:
+                _rings[key] = BucketRing(key)
+            return _rings[key]
+
+def upload_buckets():
+    '''
+    Return the list of upload buckets.
+    '''
+    config = conf.get_settings()
+    return config.upload_buckets or [config.upload_bucket]
+
+def storage_buckets():
+    '''
+    Return the list of storage buckets.
+    '''
+    config = conf.get_settings()
+    return config.storage_buckets or [config.storage_bucket]
+
+def upload_bucket_for_prefix(upload_prefix):
+    '''
+    Return the upload bucket for the given upload prefix. Use
+    access_control.upload_bucket_for_request() to route a request.
+    '''
+    return get_ring(upload_buckets()).bucket_for(upload_prefix)
+
+def storage_bucket_for_prefix(upload_prefix):
+    '''
+    Return the storage bucket for the given upload prefix.
+    '''
+    return get_ring(storage_buckets()).bucket_for(upload_prefix)
+
+def region_for_bucket(bucket):
+    '''
+    Return the region of the given bucket, from
+    AWS_UPLOAD_BUCKET_REGIONS, or AWS_UPLOAD_REGION.
+    '''
+    config = conf.get_settings()
+    return config.upload_bucket_regions.get(bucket, config.upload_region)
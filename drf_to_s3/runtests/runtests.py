@@ -30,10 +30,28 @@ def usage():
     With no arguments, it runs the unit tests, in tests/.
 
     To run the integration tests, use runtests.py integration.
+
+    To run the endpoint benchmarks, use runtests.py benchmarks. Add
+    --help for its options.
     """
 
 
+def run_benchmarks(argv):
+    from drf_to_s3.benchmarks import endpoints
+    test_runner = get_runner(settings)()
+    test_runner.setup_test_environment()
+    old_config = test_runner.setup_databases()
+    try:
+        return endpoints.main(argv)
+    finally:
+        test_runner.teardown_databases(old_config)
+        test_runner.teardown_test_environment()
+
+
 def main():
+    if len(sys.argv) >= 2 and sys.argv[1] == 'benchmarks':
+        sys.exit(run_benchmarks(sys.argv[2:]))
+
     TestRunner = get_runner(settings)
 
     test_runner = TestRunner()
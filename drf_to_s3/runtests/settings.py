@@ -100,6 +100,7 @@ INSTALLED_APPS = (
     'rest_framework',
     'rest_framework.authtoken',
     'rest_framework.tests',
+    'drf_to_s3',
     'drf_to_s3.integration',
 )
 
@@ -1,19 +1,140 @@
+import base64, calendar, collections, datetime, hashlib, hmac, math, numbers, threading, time, urllib, urlparse
+from xml.sax.saxutils import escape
+from django.core.exceptions import ImproperlyConfigured
+from django.dispatch import receiver
+from django.test.signals import setting_changed
+from django.utils.module_loading import import_by_path
+from django.utils.translation import ugettext_lazy
 from rest_framework import status
 from rest_framework.exceptions import APIException
-from django.utils.translation import ugettext as _
+from drf_to_s3 import conf
+from drf_to_s3.encoders import get_policy_encoder
+from drf_to_s3.validators import is_valid_bucket_name
 
 
-def sign_policy_document(policy_document, secret_key):
+class Signer(object):
+    '''
+    Computes HMAC signatures with a fixed secret key.
+
+    The key schedule is computed once, when the signer is
+    created. Each signature starts from a copy of that state,
+    so a signer may be shared between threads.
+
+    '''
+    def __init__(self, secret_key, digestmod=hashlib.sha1):
+        self._hmac = hmac.new(secret_key, digestmod=digestmod)
+
+    def digest(self, string_to_sign):
+        h = self._hmac.copy()
+        h.update(string_to_sign)
+        return h.digest()
+
+    def hexdigest(self, string_to_sign):
+        h = self._hmac.copy()
+        h.update(string_to_sign)
+        return h.hexdigest()
+
+    def sign(self, string_to_sign):
+        '''
+        Return the base64-encoded signature of string_to_sign.
+        '''
+        return base64.b64encode(self.digest(string_to_sign))
+
+
+_signers = {}
+
+def get_signer(secret_key):
+    '''
+    Return a shared SHA-1 Signer for the given secret key. One is
+    kept for each configured key.
+    '''
+    try:
+        return _signers[secret_key]
+    except KeyError:
+        return _signers.setdefault(secret_key, Signer(secret_key))
+
+def derive_signing_key_v4(secret_key, date_stamp, region, service='s3'):
+    '''
+    Derive the Signature Version 4 signing key for the given
+    secret key, date (YYYYMMDD), region and service.
+
+    http://docs.aws.amazon.com/general/latest/gr/signature-v4-examples.html
+
+    '''
+    k_date = hmac.new('AWS4' + secret_key, date_stamp, hashlib.sha256).digest()
+    k_region = hmac.new(k_date, region, hashlib.sha256).digest()
+    k_service = hmac.new(k_region, service, hashlib.sha256).digest()
+    return hmac.new(k_service, 'aws4_request', hashlib.sha256).digest()
+
+
+_signing_keys = {}
+_signing_keys_lock = threading.Lock()
+
+def get_signer_v4(secret_key, date_stamp, region, service='s3'):
+    '''
+    Return a SHA-256 Signer keyed with the Signature Version 4
+    signing key for the given secret key, date (YYYYMMDD), region
+    and service.
+
+    Deriving the key takes four HMACs. The result is good for the
+    whole day, so it's cached, and signing a request costs just
+    one more.
+
+    '''
+    cache_key = (secret_key, date_stamp, region, service)
+    try:
+        return _signing_keys[cache_key]
+    except KeyError:
+        pass
+    signer = Signer(
+        derive_signing_key_v4(secret_key, date_stamp, region, service),
+        digestmod=hashlib.sha256
+    )
+    with _signing_keys_lock:
+        # Keys for past days are useless. Rather than track them,
+        # start over once enough have piled up.
+        if len(_signing_keys) >= 64:
+            _signing_keys.clear()
+        _signing_keys[cache_key] = signer
+    return signer
+
+def sign_policy_document(policy_document, secret_key, encoder=None):
     '''
     Sign the given policy document.
 
+    encoder: A function which encodes the document as JSON.
+      Defaults to encoders.get_policy_encoder().
+
     Returns a dictionary with the policy and the signature.
 
     http://aws.amazon.com/articles/1434/#signyours3postform
     '''
-    import base64, json, hmac, hashlib
-    policy = base64.b64encode(json.dumps(policy_document))
-    signature = base64.b64encode(hmac.new(secret_key, policy, hashlib.sha1).digest())
+    if encoder is None:
+        encoder = get_policy_encoder()
+    policy = base64.b64encode(encoder(policy_document))
+    signature = get_signer(secret_key).sign(policy)
+    return {
+        'policy': policy,
+        'signature': signature,
+    }
+
+def sign_policy_document_v4(policy_document, secret_key, date_stamp, region, encoder=None):
+    '''
+    Sign the given policy document using Signature Version 4.
+    The policy should include x-amz-algorithm, x-amz-credential
+    and x-amz-date conditions, and date_stamp and region must
+    match the credential.
+
+    Returns a dictionary with the policy and the signature.
+
+    encoder: As for sign_policy_document.
+
+    http://docs.aws.amazon.com/AmazonS3/latest/API/sigv4-HTTPPOSTConstructPolicy.html
+    '''
+    if encoder is None:
+        encoder = get_policy_encoder()
+    policy = base64.b64encode(encoder(policy_document))
+    signature = get_signer_v4(secret_key, date_stamp, region).hexdigest(policy)
     return {
         'policy': policy,
         'signature': signature,
@@ -26,26 +147,110 @@ def sign_rest_request(secret_key, method, content_md5='', content_type='', expir
     http://docs.aws.amazon.com/AmazonS3/latest/dev/RESTAuthentication.html#RESTAuthenticationExamples
 
     '''
-    import base64, hashlib, hmac
     string_to_sign = "\n".join([method, content_md5, content_type, str(expires), canonicalized_headers, canonicalized_resource])
-    return base64.b64encode(hmac.new(secret_key, string_to_sign, hashlib.sha1).digest())
+    return get_signer(secret_key).sign(string_to_sign)
+
+class Endpoint(object):
+    '''
+    Chooses the scheme, host, and path of upload URIs.
+
+    By default, buckets in us-east-1, or with no region given, are
+    addressed at bucket.s3.amazonaws.com, and other buckets at
+    their regional endpoint, bucket.s3.<region>.amazonaws.com,
+    which saves clients the redirect from the global endpoint.
+
+    accelerate: Use S3 Transfer Acceleration, which enters AWS's
+      network at the edge location nearest the client. The bucket
+      must have acceleration enabled, and its name can't contain
+      dots.
+    dualstack: Use the endpoint which accepts IPv6 as well as IPv4.
+    url: The base URL of an S3-compatible service, such as
+      http://localhost:9000. Buckets are addressed by path.
+
+    http://docs.aws.amazon.com/AmazonS3/latest/dev/transfer-acceleration.html
+    http://docs.aws.amazon.com/AmazonS3/latest/dev/dual-stack-endpoints.html
+    '''
+    def __init__(self, accelerate=False, dualstack=False, url=None):
+        self.accelerate = accelerate
+        self.dualstack = dualstack
+        self.url = url
+
+    def locate(self, bucket, key, region=None):
+        '''
+        Return a tuple of (scheme, host, path) for the given key.
+        The path is not escaped.
+        '''
+        if self.url is not None:
+            parts = urlparse.urlsplit(self.url)
+            return parts.scheme, parts.netloc, '%s/%s/%s' % (parts.path.rstrip('/'), bucket, key)
+        if self.accelerate:
+            service = 's3-accelerate.dualstack' if self.dualstack else 's3-accelerate'
+        elif self.dualstack:
+            service = 's3.dualstack.%s' % (region or 'us-east-1')
+        elif region is None or region == 'us-east-1':
+            service = 's3'
+        else:
+            service = 's3.%s' % region
+        return 'https', '%s.%s.amazonaws.com' % (bucket, service), '/' + key
+
+    def __eq__(self, other):
+        return isinstance(other, Endpoint) and vars(self) == vars(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'Endpoint(accelerate=%r, dualstack=%r, url=%r)' % (self.accelerate, self.dualstack, self.url)
+
+
+ENDPOINT_NAMES = {
+    'default': Endpoint(),
+    'accelerate': Endpoint(accelerate=True),
+    'dualstack': Endpoint(dualstack=True),
+    'accelerate-dualstack': Endpoint(accelerate=True, dualstack=True),
+}
+
+def get_endpoint(value=None):
+    '''
+    Return the Endpoint for a value of AWS_UPLOAD_ENDPOINT: None,
+    an Endpoint, one of the names in ENDPOINT_NAMES, or the URL of
+    an S3-compatible service.
 
-def build_signed_upload_uri(bucket, key, access_key_id, secret_key, expire_after_seconds):
+    '''
+    if value is None:
+        return ENDPOINT_NAMES['default']
+    if isinstance(value, Endpoint):
+        return value
+    if isinstance(value, basestring):
+        if value in ENDPOINT_NAMES:
+            return ENDPOINT_NAMES[value]
+        if value.startswith(('http://', 'https://')):
+            return Endpoint(url=value)
+    raise ImproperlyConfigured(
+        "Endpoint should be one of %s, or a URL" % ', '.join(sorted(ENDPOINT_NAMES))
+    )
+
+def build_signed_upload_uri(bucket, key, access_key_id, secret_key, expire_after_seconds, now=None, region=None, endpoint=None):
     '''
     Accept bucket name, bucket key and s3 credentials as input
     Return signed_url for PUT upload.
+
+    now: The signing time, a naive UTC datetime. Defaults to the
+      current time. Pass the same value to sign a batch with one
+      expiration.
+    region: The bucket's region, used to choose its endpoint.
+    endpoint: An Endpoint. Defaults to the bucket's standard
+      endpoint.
     
     http://docs.aws.amazon.com/AmazonS3/latest/dev/RESTAuthentication.html#RESTAuthenticationExamples
     '''
-
-    import numbers, time, base64, hmac, urllib, hashlib
     for v in [bucket, key, access_key_id, secret_key]:
         if not isinstance(v, basestring) or not len(v):
             raise ValueError('Parameter must be a non-zero-length string')
     if not isinstance(expire_after_seconds, numbers.Integral):
         raise ValueError('expire_after_seconds must be an integer')
 
-    expires = utc_plus_as_timestamp(expire_after_seconds)
+    expires = utc_plus_as_timestamp(expire_after_seconds, now=now)
     signature = sign_rest_request(
         secret_key,
         method='PUT',
@@ -59,19 +264,158 @@ def build_signed_upload_uri(bucket, key, access_key_id, secret_key, expire_after
         'x-amz-acl': 'private',
         'Signature': signature.strip(),
     }
-    return 'https://%s.s3.amazonaws.com/%s?%s' % (
-        bucket,
-        urllib.quote(key),
+    scheme, host, path = get_endpoint(endpoint).locate(bucket, key, region)
+    return '%s://%s%s?%s' % (
+        scheme,
+        host,
+        urllib.quote(path),
         urllib.urlencode(params)
     )
 
-def utc_plus(seconds):
-    import datetime
-    return datetime.datetime.utcnow() + datetime.timedelta(0, seconds)
+def presign_uri_v4(method, host, path, access_key_id, secret_key, region, expire_after_seconds, params=None, now=None, scheme='https'):
+    '''
+    Return a URI for the given request, presigned using Signature
+    Version 4 query parameters. Only the host header is signed,
+    and the payload is unsigned.
+
+    path: The unescaped path, starting with a slash
+    params: Additional query parameters to sign, such as x-amz-acl
+    now: The signing time, a naive UTC datetime. Defaults to the
+      current time.
+
+    http://docs.aws.amazon.com/AmazonS3/latest/API/sigv4-query-string-auth.html
+    '''
+    if now is None:
+        now = datetime.datetime.utcnow()
+    amz_date = now.strftime('%Y%m%dT%H%M%SZ')
+    date_stamp = now.strftime('%Y%m%d')
+    credential_scope = '%s/%s/s3/aws4_request' % (date_stamp, region)
+
+    query = dict(params or {})
+    query.update({
+        'X-Amz-Algorithm': 'AWS4-HMAC-SHA256',
+        'X-Amz-Credential': '%s/%s' % (access_key_id, credential_scope),
+        'X-Amz-Date': amz_date,
+        'X-Amz-Expires': str(expire_after_seconds),
+        'X-Amz-SignedHeaders': 'host',
+    })
+    canonical_query = '&'.join(
+        '%s=%s' % (urllib.quote(k, safe='-_.~'), urllib.quote(str(v), safe='-_.~'))
+        for k, v in sorted(query.items())
+    )
+    canonical_path = urllib.quote(path, safe='/-_.~')
+    canonical_request = '\n'.join([
+        method,
+        canonical_path,
+        canonical_query,
+        'host:%s\n' % host,
+        'host',
+        'UNSIGNED-PAYLOAD',
+    ])
+    string_to_sign = '\n'.join([
+        'AWS4-HMAC-SHA256',
+        amz_date,
+        credential_scope,
+        hashlib.sha256(canonical_request).hexdigest(),
+    ])
+    signature = get_signer_v4(secret_key, date_stamp, region).hexdigest(string_to_sign)
+    return '%s://%s%s?%s&X-Amz-Signature=%s' % (scheme, host, canonical_path, canonical_query, signature)
+
+def build_signed_upload_uri_v4(bucket, key, access_key_id, secret_key, expire_after_seconds, region='us-east-1', now=None, endpoint=None):
+    '''
+    Like build_signed_upload_uri, but signed with Signature
+    Version 4, which is required in newer regions.
+
+    '''
+    for v in [bucket, key, access_key_id, secret_key, region]:
+        if not isinstance(v, basestring) or not len(v):
+            raise ValueError('Parameter must be a non-zero-length string')
+    if not isinstance(expire_after_seconds, numbers.Integral):
+        raise ValueError('expire_after_seconds must be an integer')
+
+    scheme, host, path = get_endpoint(endpoint).locate(bucket, key, region)
+    return presign_uri_v4(
+        method='PUT',
+        host=host,
+        path=path,
+        access_key_id=access_key_id,
+        secret_key=secret_key,
+        region=region,
+        expire_after_seconds=expire_after_seconds,
+        params={'x-amz-acl': 'private'},
+        now=now,
+        scheme=scheme
+    )
+
+def build_signed_upload_part_uri(bucket, key, upload_id, part_number, access_key_id, secret_key, expire_after_seconds, now=None, region=None, endpoint=None):
+    '''
+    Return a signed URI for uploading one part of a multipart
+    upload with PUT. region and endpoint choose the endpoint, as
+    for build_signed_upload_uri.
+
+    http://docs.aws.amazon.com/AmazonS3/latest/API/mpUploadUploadPart.html
+    '''
+    for v in [bucket, key, upload_id, access_key_id, secret_key]:
+        if not isinstance(v, basestring) or not len(v):
+            raise ValueError('Parameter must be a non-zero-length string')
+    if not isinstance(expire_after_seconds, numbers.Integral):
+        raise ValueError('expire_after_seconds must be an integer')
+
+    expires = utc_plus_as_timestamp(expire_after_seconds, now=now)
+    subresources = 'partNumber=%d&uploadId=%s' % (part_number, upload_id)
+    signature = sign_rest_request(
+        secret_key,
+        method='PUT',
+        expires=expires,
+        canonicalized_resource=urllib.quote("/%s/%s" % (bucket, key)) + '?' + subresources
+    )
+    params = {
+        'AWSAccessKeyId': access_key_id,
+        'Expires': expires,
+        'Signature': signature.strip(),
+    }
+    scheme, host, path = get_endpoint(endpoint).locate(bucket, key, region)
+    return '%s://%s%s?%s&%s' % (
+        scheme,
+        host,
+        urllib.quote(path),
+        urllib.urlencode({'partNumber': part_number, 'uploadId': upload_id}),
+        urllib.urlencode(params)
+    )
+
+def build_signed_upload_part_uri_v4(bucket, key, upload_id, part_number, access_key_id, secret_key, expire_after_seconds, region='us-east-1', now=None, endpoint=None):
+    '''
+    Like build_signed_upload_part_uri, but signed with Signature
+    Version 4.
+
+    '''
+    for v in [bucket, key, upload_id, access_key_id, secret_key, region]:
+        if not isinstance(v, basestring) or not len(v):
+            raise ValueError('Parameter must be a non-zero-length string')
+    if not isinstance(expire_after_seconds, numbers.Integral):
+        raise ValueError('expire_after_seconds must be an integer')
+
+    scheme, host, path = get_endpoint(endpoint).locate(bucket, key, region)
+    return presign_uri_v4(
+        method='PUT',
+        host=host,
+        path=path,
+        access_key_id=access_key_id,
+        secret_key=secret_key,
+        region=region,
+        expire_after_seconds=expire_after_seconds,
+        params={'partNumber': part_number, 'uploadId': upload_id},
+        now=now,
+        scheme=scheme
+    )
+
+def utc_plus(seconds, now=None):
+    if now is None:
+        now = datetime.datetime.utcnow()
+    return now + datetime.timedelta(0, seconds)
 
-def utc_plus_as_timestamp(seconds):
-    import calendar
-    return calendar.timegm(utc_plus(seconds).timetuple())
+def utc_plus_as_timestamp(seconds, now=None):
+    return calendar.timegm(utc_plus(seconds, now=now).timetuple())
 
 def validate_bucket_name(string_value):
     '''
@@ -80,19 +424,228 @@ def validate_bucket_name(string_value):
 
     http://docs.aws.amazon.com/AmazonS3/latest/dev/BucketRestrictions.html
     '''
-    import string
-    if len(string_value) < 3 or len(string_value) > 255:
-        return False
-    allowed_characters = "-._" + string.ascii_letters + string.digits
-    return all([char in allowed_characters for char in string_value])
+    return is_valid_bucket_name(string_value)
 
 
 class ObjectNotFoundException(APIException):
     status_code = status.HTTP_400_BAD_REQUEST
-    default_detail = _('Invalid key or bad ETag')
+    default_detail = ugettext_lazy('Invalid key or bad ETag')
+
+
+class InvalidMultipartUploadException(APIException):
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_detail = ugettext_lazy('Invalid upload id or parts')
+
+
+class S3ConnectionPool(object):
+    '''
+    A thread-safe pool of S3 connections, each of which keeps
+    the bucket handles it has already looked up.
 
+    Opening a connection and validating a bucket costs a TLS
+    handshake and an extra round trip. Checking a connection out
+    of the pool lets repeated copies reuse both.
+
+    size: The maximum number of idle connections kept around.
+      When more threads need a connection at once, extras are
+      opened and discarded when they are returned.
+    idle_timeout: Connections which have sat idle for more than
+      this many seconds are closed instead of being reused.
+    connect: A callable which returns a new connection.
+      Defaults to boto.connect_s3.
 
-def copy(src_bucket, src_key, dst_bucket, dst_key, src_etag=None, validate_src_etag=False):
+    '''
+    def __init__(self, size=10, idle_timeout=60, connect=None):
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self._connect = connect
+        self._idle = collections.deque()
+        self._lock = threading.Lock()
+
+    def _new_connection(self):
+        if self._connect is None:
+            # boto is slow to import, and only needed for copies
+            import boto
+            return boto.connect_s3()
+        return self._connect()
+
+    def acquire(self):
+        '''
+        Check a connection out of the pool, opening a new one if
+        no idle connection is available.
+
+        Returns a _PooledConnection. Callers must hand it back with
+        release() or discard().
+
+        '''
+        now = time.time()
+        expired = []
+        pooled = None
+        with self._lock:
+            while len(self._idle):
+                candidate = self._idle.pop()
+                if now - candidate.last_used > self.idle_timeout:
+                    expired.append(candidate)
+                else:
+                    pooled = candidate
+                    break
+        for item in expired:
+            item.close()
+        if pooled is None:
+            pooled = _PooledConnection(self._new_connection())
+        return pooled
+
+    def release(self, pooled):
+        '''
+        Return a connection to the pool.
+        '''
+        pooled.last_used = time.time()
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(pooled)
+                return
+        pooled.close()
+
+    def discard(self, pooled):
+        '''
+        Close a connection which is in an unknown state, instead of
+        returning it to the pool.
+        '''
+        pooled.close()
+
+    def clear(self):
+        '''
+        Close all idle connections.
+        '''
+        with self._lock:
+            idle = list(self._idle)
+            self._idle.clear()
+        for pooled in idle:
+            pooled.close()
+
+    def bucket(self, bucket_name):
+        '''
+        Context manager which checks out a connection and yields a
+        handle to the named bucket.
+
+            with pool.bucket('my-bucket') as bucket:
+                bucket.copy_key(...)
+
+        S3 errors leave the connection usable, so it goes back to
+        the pool. On any other error it's discarded.
+
+        '''
+        return _PooledBucket(self, bucket_name)
+
+
+class _PooledConnection(object):
+    def __init__(self, connection):
+        self.connection = connection
+        self.last_used = None
+        self._buckets = {}
+
+    def get_bucket(self, bucket_name):
+        '''
+        Return a handle to the named bucket without the
+        validation request boto would otherwise make. A missing
+        bucket surfaces as a 404 on the first real request.
+        '''
+        try:
+            return self._buckets[bucket_name]
+        except KeyError:
+            bucket = self.connection.get_bucket(bucket_name, validate=False)
+            self._buckets[bucket_name] = bucket
+            return bucket
+
+    def close(self):
+        try:
+            self.connection.close()
+        except Exception:
+            pass
+
+
+class _PooledBucket(object):
+    def __init__(self, pool, bucket_name):
+        self.pool = pool
+        self.bucket_name = bucket_name
+        self.pooled = None
+
+    def __enter__(self):
+        self.pooled = self.pool.acquire()
+        return self.pooled.get_bucket(self.bucket_name)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        from boto.exception import S3ResponseError
+        if exc_type is None or issubclass(exc_type, S3ResponseError):
+            self.pool.release(self.pooled)
+        else:
+            self.pool.discard(self.pooled)
+        self.pooled = None
+        return False
+
+
+_connection_pool = None
+_connection_pool_lock = threading.Lock()
+
+def get_connection_pool():
+    '''
+    Return the process-wide connection pool, creating it on first
+    use. It's configured by these settings:
+
+    AWS_S3_CONNECTION_POOL_SIZE: Maximum number of idle
+      connections to keep. Defaults to 10.
+    AWS_S3_CONNECTION_POOL_IDLE_TIMEOUT: Seconds after which an
+      idle connection is closed. Defaults to 60.
+
+    '''
+    global _connection_pool
+    if _connection_pool is None:
+        with _connection_pool_lock:
+            if _connection_pool is None:
+                _connection_pool = S3ConnectionPool(
+                    size=conf.get_settings().connection_pool_size,
+                    idle_timeout=conf.get_settings().connection_pool_idle_timeout
+                )
+    return _connection_pool
+
+def reset_connection_pool():
+    '''
+    Close the process-wide pool's connections and discard it, so
+    the next call to get_connection_pool() rebuilds it from
+    settings.
+    '''
+    global _connection_pool
+    with _connection_pool_lock:
+        pool, _connection_pool = _connection_pool, None
+    if pool is not None:
+        pool.clear()
+
+
+# Backends are found by dotted path, since drf_to_s3.backends
+# imports this module
+BOTO_STORAGE_BACKEND = 'drf_to_s3.backends.BotoStorageBackend'
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+def get_storage_backend():
+    '''
+    Return the process-wide storage backend. Its class is the
+    dotted path in settings.AWS_S3_STORAGE_BACKEND, which defaults
+    to drf_to_s3.backends.BotoStorageBackend.
+
+    '''
+    path = conf.get_settings().storage_backend
+    try:
+        return _backends[path]
+    except KeyError:
+        with _backends_lock:
+            if path not in _backends:
+                _backends[path] = import_by_path(path)()
+            return _backends[path]
+
+
+def copy(src_bucket, src_key, dst_bucket, dst_key, src_etag=None, validate_src_etag=False, connection_pool=None):
     '''
     Copy a key from one bucket to another.
 
@@ -106,26 +659,225 @@ def copy(src_bucket, src_key, dst_bucket, dst_key, src_etag=None, validate_src_e
     By returning the same error, we avoid giving out extra
     information.
 
+    The copy is made by the storage backend named in
+    settings.AWS_S3_STORAGE_BACKEND, which defaults to S3 through
+    boto. See drf_to_s3.backends. When connection_pool is given,
+    the copy is made on S3 with a connection from that pool.
+
     '''
-    import boto
-    from boto.exception import S3ResponseError
-    conn = boto.connect_s3()
-    bucket = conn.get_bucket(dst_bucket)
-    if validate_src_etag:
-        headers = {
-            'x-amz-copy-source-if-match': src_etag,
-        }
+    if connection_pool is None:
+        backend = get_storage_backend()
     else:
-        headers = {}
+        backend = import_by_path(BOTO_STORAGE_BACKEND)(connection_pool=connection_pool)
+    backend.copy(
+        src_bucket=src_bucket,
+        src_key=src_key,
+        dst_bucket=dst_bucket,
+        dst_key=dst_key,
+        src_etag=src_etag,
+        validate_src_etag=validate_src_etag
+    )
+
+# Headers of the source which a single copy keeps, as boto's Key
+# attributes
+MULTIPART_COPY_HEADERS = [
+    ('Content-Type', 'content_type'),
+    ('Cache-Control', 'cache_control'),
+    ('Content-Disposition', 'content_disposition'),
+    ('Content-Encoding', 'content_encoding'),
+    ('Content-Language', 'content_language'),
+]
+
+def multipart_copy(bucket, src, dst_key, headers, part_size, concurrency, connection_pool=None):
+    '''
+    Copy the boto Key src to dst_key in bucket using a multipart
+    upload, copying up to `concurrency` byte ranges at once. The
+    source's metadata and the headers in MULTIPART_COPY_HEADERS
+    are carried over, as they would be with a single copy.
+
+    headers are sent with each part, so a copy-source-if-match
+    header applies to all of them. If any part fails, the upload
+    is aborted.
+
+    Each part is copied with a connection checked out of
+    connection_pool, which defaults to the process-wide pool, so
+    the pool's size bounds the connections kept open.
+
+    '''
+    from boto.s3.multipart import MultiPartUpload
+    from multiprocessing.pool import ThreadPool
+
+    if connection_pool is None:
+        connection_pool = get_connection_pool()
+
+    # S3 allows at most 10,000 parts, of at least 5 MB each
+    part_size = max(part_size, 5 * 1024 * 1024, int(math.ceil(src.size / 10000.0)))
+    ranges = [
+        (part_num, start, min(start + part_size, src.size) - 1)
+        for part_num, start in enumerate(range(0, src.size, part_size), 1)
+    ]
+
+    upload_headers = {}
+    for header, attribute in MULTIPART_COPY_HEADERS:
+        value = getattr(src, attribute, None)
+        if value:
+            upload_headers[header] = value
+    upload = bucket.initiate_multipart_upload(
+        dst_key,
+        headers=upload_headers,
+        metadata=src.metadata
+    )
+
+    def copy_part(part_range):
+        part_num, start, end = part_range
+        with connection_pool.bucket(bucket.name) as part_bucket:
+            part_upload = MultiPartUpload(part_bucket)
+            part_upload.key_name = upload.key_name
+            part_upload.id = upload.id
+            part_upload.copy_part_from_key(
+                src.bucket.name, src.name, part_num,
+                start=start, end=end, headers=headers
+            )
+
+    try:
+        pool = ThreadPool(max(1, min(concurrency, len(ranges))))
+        try:
+            pool.map(copy_part, ranges)
+        finally:
+            pool.close()
+            pool.join()
+        upload.complete_upload()
+    except Exception:
+        upload.cancel_upload()
+        raise
+
+
+def initiate_multipart_upload(bucket, key, connection_pool=None):
+    '''
+    Start a private multipart upload to the given key, and return
+    its upload id.
+
+    '''
+    if connection_pool is None:
+        connection_pool = get_connection_pool()
+    with connection_pool.bucket(bucket) as bucket_handle:
+        return bucket_handle.initiate_multipart_upload(key, policy='private').id
+
+def complete_multipart_upload(bucket, key, upload_id, parts, connection_pool=None):
+    '''
+    Complete a multipart upload.
+
+    parts: A list of (part_number, etag) tuples, one for each part
+      the client uploaded.
+
+    Raises InvalidMultipartUploadException if the upload doesn't
+    exist, or the parts don't match what was uploaded.
+
+    http://docs.aws.amazon.com/AmazonS3/latest/API/mpUploadComplete.html
+    '''
+    from boto.exception import S3ResponseError
+    if connection_pool is None:
+        connection_pool = get_connection_pool()
+    xml_body = '<CompleteMultipartUpload>%s</CompleteMultipartUpload>' % ''.join(
+        '<Part><PartNumber>%d</PartNumber><ETag>%s</ETag></Part>' % (part_number, escape(etag))
+        for part_number, etag in sorted(parts)
+    )
+    try:
+        with connection_pool.bucket(bucket) as bucket_handle:
+            bucket_handle.complete_multipart_upload(key, upload_id, xml_body)
+    except S3ResponseError as e:
+        if e.status in [status.HTTP_400_BAD_REQUEST, status.HTTP_404_NOT_FOUND]:
+            raise InvalidMultipartUploadException()
+        else:
+            raise
+
+def abort_multipart_upload(bucket, key, upload_id, connection_pool=None):
+    '''
+    Abort a multipart upload, freeing the parts uploaded so far.
+
+    Raises InvalidMultipartUploadException if the upload doesn't
+    exist.
+
+    '''
+    from boto.exception import S3ResponseError
+    if connection_pool is None:
+        connection_pool = get_connection_pool()
     try:
-        bucket.copy_key(
-            new_key_name=dst_key,
-            src_bucket_name=src_bucket,
-            src_key_name=src_key,
-            headers=headers
-        )
+        with connection_pool.bucket(bucket) as bucket_handle:
+            bucket_handle.cancel_multipart_upload(key, upload_id)
     except S3ResponseError as e:
-        if e.status in [status.HTTP_404_NOT_FOUND, status.HTTP_412_PRECONDITION_FAILED]:
-            raise ObjectNotFoundException()
+        if e.status == status.HTTP_404_NOT_FOUND:
+            raise InvalidMultipartUploadException()
         else:
             raise
+
+
+_copy_executor = None
+_copy_executor_lock = threading.Lock()
+
+def get_copy_executor():
+    '''
+    Return the process-wide thread pool which runs copy_async(),
+    creating it on first use. AWS_S3_COPY_CONCURRENCY sets the
+    number of copies which may be in flight at once, across all
+    requests. Defaults to 16.
+
+    '''
+    global _copy_executor
+    if _copy_executor is None:
+        from multiprocessing.pool import ThreadPool
+        with _copy_executor_lock:
+            if _copy_executor is None:
+                _copy_executor = ThreadPool(
+                    conf.get_settings().copy_concurrency
+                )
+    return _copy_executor
+
+def reset_copy_executor():
+    '''
+    Discard the process-wide copy thread pool, so the next call to
+    get_copy_executor() rebuilds it from settings. Copies already
+    started on the old pool finish, and its threads then exit.
+    '''
+    global _copy_executor
+    with _copy_executor_lock:
+        executor, _copy_executor = _copy_executor, None
+    if executor is not None:
+        executor.close()
+
+@receiver(setting_changed)
+def reset_pools(sender=None, setting=None, **kwargs):
+    '''
+    Rebuild the connection pool or copy thread pool when one of
+    their settings changes, such as under override_settings.
+    '''
+    if setting in ('AWS_S3_CONNECTION_POOL_SIZE', 'AWS_S3_CONNECTION_POOL_IDLE_TIMEOUT'):
+        reset_connection_pool()
+    elif setting == 'AWS_S3_COPY_CONCURRENCY':
+        reset_copy_executor()
+
+def copy_async(src_bucket, src_key, dst_bucket, dst_key, src_etag=None, validate_src_etag=False):
+    '''
+    Start a copy without waiting for it to finish. Accepts the
+    same arguments as copy().
+
+    Returns a multiprocessing.pool.AsyncResult. Its get() method
+    waits for the copy, and raises ObjectNotFoundException
+    under the same conditions as copy().
+
+    Start all the copies before waiting on any of them to have
+    them run concurrently:
+
+        pending = [s3.copy_async(**kwargs) for kwargs in copies]
+        for result in pending:
+            result.get()
+
+    '''
+    return get_copy_executor().apply_async(copy, kwds={
+        'src_bucket': src_bucket,
+        'src_key': src_key,
+        'dst_bucket': dst_bucket,
+        'dst_key': dst_key,
+        'src_etag': src_etag,
+        'validate_src_etag': validate_src_etag,
+    })
@@ -1,6 +1,10 @@
-from drf_to_s3 import naive_serializers
+import datetime, urllib
 from django.core.exceptions import ValidationError
 from django.utils.translation import ugettext as _
+from drf_to_s3 import naive_serializers, s3
+from drf_to_s3.models import Policy
+from drf_to_s3.naive_serializers import condition_from_native, condition_to_native
+from drf_to_s3.util import string_contains_only_url_characters, string_is_valid_filename, string_is_valid_media_type
 
 
 class DefaultPolicySerializer(naive_serializers.NaivePolicySerializer):
@@ -40,8 +44,28 @@ class DefaultPolicySerializer(naive_serializers.NaivePolicySerializer):
         'success_action_status',
         'x-amz-meta-qqfilename',
         'x-amz-security-token',
+        # Signature Version 4
+        'x-amz-algorithm',
+        'x-amz-credential',
+        'x-amz-date',
     ]
 
+    def get_condition_sets(self):
+        '''
+        Return frozensets of the required and allowed element names.
+        These are compiled with the class, unless required_conditions
+        or optional_conditions has been replaced on the instance.
+
+        '''
+        cls = type(self)
+        if (self.required_conditions is cls.required_conditions and
+            self.optional_conditions is cls.optional_conditions):
+            return self.required_condition_set, self.allowed_condition_set
+        return (
+            frozenset(self.required_conditions),
+            frozenset(self.required_conditions + self.optional_conditions)
+        )
+
     def validate(self, attrs):
         '''
         1. Disallow starts-with, which complicates validation, and
@@ -54,7 +78,8 @@ class DefaultPolicySerializer(naive_serializers.NaivePolicySerializer):
         '''
         conditions = attrs.get('conditions', [])
         errors = {}
-        missing_conditions = set(self.required_conditions) - set([item.element_name for item in conditions])
+        required_condition_set, allowed_condition_set = self.get_condition_sets()
+        missing_conditions = required_condition_set.difference([item.element_name for item in conditions])
         for element_name in missing_conditions:
             message = _('Required condition is missing')
             errors['conditions.' + element_name] = [message]
@@ -63,7 +88,7 @@ class DefaultPolicySerializer(naive_serializers.NaivePolicySerializer):
             if item.operator and item.operator != 'eq':
                 message = _("starts-with and operators other than 'eq' are not allowed")
                 errors[field_name] = errors.get(field_name, []) + [message]
-            elif item.element_name not in self.required_conditions + self.optional_conditions:
+            elif item.element_name not in allowed_condition_set:
                 message = _('Invalid element name')
                 errors[field_name] = errors.get(field_name, []) + [message]
         try:
@@ -78,7 +103,6 @@ class DefaultPolicySerializer(naive_serializers.NaivePolicySerializer):
             return attrs
 
     def validate_condition_bucket(self, condition):
-        import s3
         if (not isinstance(condition.value, basestring) or
             not s3.validate_bucket_name(condition.value)):
             raise ValidationError(
@@ -89,8 +113,6 @@ class DefaultPolicySerializer(naive_serializers.NaivePolicySerializer):
         '''
         Require a valid Media Type according to the RFC.
         '''
-        import string
-        from util import string_is_valid_media_type
         if (not isinstance(condition.value, basestring) or
             not string_is_valid_media_type(condition.value)):
             raise ValidationError(
@@ -106,7 +128,6 @@ class DefaultPolicySerializer(naive_serializers.NaivePolicySerializer):
         That includes unprintable characters and direction-changing
         characters, which sounds like trouble.
         '''
-        from .util import string_contains_only_url_characters
         if not isinstance(condition.value, basestring):
             raise ValidationError(
                 _('Key should be a string'),
@@ -120,13 +141,32 @@ class DefaultPolicySerializer(naive_serializers.NaivePolicySerializer):
                 _('Invalid character in key'),
             )
 
+    def validate_condition_x_amz_credential(self, condition):
+        '''
+        Require a Signature Version 4 credential for S3, of the form
+        <access-key-id>/<YYYYMMDD>/<region>/s3/aws4_request.
+        '''
+        if not isinstance(condition.value, basestring):
+            raise ValidationError(
+                _('Invalid credential'),
+            )
+        parts = condition.value.split('/')
+        if len(parts) != 5 or parts[3:] != ['s3', 'aws4_request'] or not all(parts):
+            raise ValidationError(
+                _('Invalid credential'),
+            )
+        try:
+            datetime.datetime.strptime(parts[1], '%Y%m%d')
+        except ValueError:
+            raise ValidationError(
+                _('Invalid credential'),
+            )
+
     def validate_condition_x_amz_meta_qqfilename(self, condition):
         '''
         Require that x-amz-meta-qqfilename is a valid URL-encoded
         string containing only URL characters.
         '''
-        import urllib
-        from .util import string_is_valid_filename
         if not isinstance(condition.value, basestring):
             raise ValidationError(
                 _('Filename should be a string'),
@@ -141,3 +181,189 @@ class DefaultPolicySerializer(naive_serializers.NaivePolicySerializer):
             raise ValidationError(
                 _('Filename should not include fancy characters'),
             )
+
+
+class FastPolicySerializer(DefaultPolicySerializer):
+    '''
+    A drop-in replacement for DefaultPolicySerializer, for use as
+    FineSignPolicyView.serializer_class, which skips Django REST
+    Framework's field machinery.
+
+    It parses and validates the policy in a single pass, with the
+    same schema, and reports identical errors. Serializing a
+    Policy back to a document is a direct conversion, so the sign
+    view doesn't pay for a second full serializer.
+
+    Subclasses may change required_conditions and
+    optional_conditions and add validate_condition_<name> methods
+    as usual. Overrides of validate() and the DRF field hooks are
+    not called. A list, which DRF would treat as many policies,
+    is rejected as invalid data.
+
+    '''
+    def __init__(self, instance=None, data=None, **kwargs):
+        self.object = instance
+        self.init_data = data
+        self._errors = None
+        self._data = None
+
+    @property
+    def errors(self):
+        if self._errors is None:
+            self._errors = {}
+            policy = self.parse(self.init_data, self._errors)
+            if not self._errors:
+                self.object = policy
+        return self._errors
+
+    def is_valid(self):
+        return not self.errors
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = self.to_native(self.object)
+        return self._data
+
+    def to_native(self, obj):
+        if obj is None:
+            return None
+        conditions = obj.conditions
+        return {
+            'expiration': self.base_fields['expiration'].to_native(obj.expiration),
+            'conditions': None if conditions is None else [condition_to_native(item) for item in conditions],
+        }
+
+    def parse(self, data, errors):
+        '''
+        Return a validated Policy for the given data, adding any
+        errors to `errors`.
+        '''
+        if data is None:
+            errors['non_field_errors'] = ['No input provided']
+            return None
+        elif not isinstance(data, dict):
+            errors['non_field_errors'] = ['Invalid data']
+            return None
+
+        attrs = {}
+        if 'expiration' in data:
+            try:
+                attrs['expiration'] = self.base_fields['expiration'].from_native(data['expiration'])
+            except ValidationError as err:
+                errors['expiration'] = list(err.messages)
+        if 'conditions' in data:
+            value = data['conditions']
+            if value in (None, '', 'None'):
+                attrs['conditions'] = None
+            else:
+                try:
+                    attrs['conditions'] = [condition_from_native(item) for item in value]
+                except ValidationError as err:
+                    errors['conditions'] = list(err.messages)
+        if errors:
+            return None
+
+        self.validate_conditions(attrs.get('conditions', []), errors)
+        return Policy(**attrs)
+
+    def validate_conditions(self, conditions, errors):
+        '''
+        Apply DefaultPolicySerializer's checks, then
+        NaivePolicySerializer's, merging the errors in the same
+        order they do.
+        '''
+        schema_errors = {}
+        condition_errors = {}
+        required_condition_set, allowed_condition_set = self.get_condition_sets()
+        all_names = [item.element_name for item in conditions]
+
+        for element_name in required_condition_set.difference(all_names):
+            schema_errors['conditions.' + element_name] = [_('Required condition is missing')]
+        seen = set()
+        for name in all_names:
+            if name in seen:
+                condition_errors['conditions.' + name] = [_('Duplicate element name')]
+            seen.add(name)
+
+        for item in conditions:
+            field_name = 'conditions.' + item.element_name
+            if item.operator and item.operator != 'eq':
+                message = _("starts-with and operators other than 'eq' are not allowed")
+                schema_errors.setdefault(field_name, []).append(message)
+            elif item.element_name not in allowed_condition_set:
+                schema_errors.setdefault(field_name, []).append(_('Invalid element name'))
+            condition_validate = self.get_condition_validator(item.element_name)
+            if condition_validate:
+                try:
+                    condition_validate(item)
+                except ValidationError as err:
+                    condition_errors.setdefault(field_name, []).extend(err.messages)
+
+        for field_name, error_messages in condition_errors.items():
+            schema_errors[field_name] = schema_errors.get(field_name, []) + error_messages
+        errors.update(schema_errors)
+
+
+class DefaultRESTRequestSerializer(naive_serializers.NaiveRESTRequestSerializer):
+    '''
+    Allows only the REST requests needed for a chunked upload:
+    initiating, uploading parts to, completing, and aborting a
+    multipart upload. It requires x-amz-date, and disallows x-amz-*
+    headers other than those in allowed_headers or starting with
+    x-amz-meta-.
+
+    It expects the caller to check the bucket, key, and ACL.
+
+    http://docs.aws.amazon.com/AmazonS3/latest/dev/mpuoverview.html
+
+    '''
+    allowed_headers = [
+        'x-amz-acl',
+        'x-amz-date',
+        'x-amz-security-token',
+    ]
+
+    # Method and query string parameters of the allowed requests
+    allowed_operations = [
+        ('POST', ['uploads']),                   # Initiate
+        ('PUT', ['partNumber', 'uploadId']),     # Upload part
+        ('POST', ['uploadId']),                  # Complete
+        ('DELETE', ['uploadId']),                # Abort
+    ]
+
+    def validate(self, attrs):
+        rest_request = attrs['headers']
+        errors = []
+        if (rest_request.method, rest_request.subresource_names) not in self.allowed_operations:
+            errors.append(_('Only multipart upload requests may be signed'))
+        else:
+            subresources = dict(rest_request.subresources)
+            if rest_request.subresource_names == ['uploads']:
+                if subresources['uploads'] is not None:
+                    errors.append(_('Invalid multipart upload request'))
+            elif not subresources['uploadId']:
+                errors.append(_('Invalid multipart upload request'))
+            if 'partNumber' in subresources:
+                part_number = subresources['partNumber'] or ''
+                if not part_number.isdigit() or not 1 <= int(part_number) <= 10000:
+                    errors.append(_('Invalid part number'))
+        for name, value in rest_request.amz_headers:
+            if name not in self.allowed_headers and not name.startswith('x-amz-meta-'):
+                errors.append(_('Header not allowed: %s') % name)
+        if rest_request.get_amz_header('x-amz-date') is None:
+            errors.append(_('x-amz-date is required'))
+        if not s3.validate_bucket_name(rest_request.bucket):
+            errors.append(_('Invalid bucket name'))
+        try:
+            key_length = len(rest_request.key.decode('utf-8'))
+        except UnicodeDecodeError:
+            errors.append(_('Invalid character in key'))
+        else:
+            if key_length > 1024:
+                errors.append(_('Key too long'))
+            elif not string_contains_only_url_characters(rest_request.key):
+                errors.append(_('Invalid character in key'))
+        if len(errors):
+            raise ValidationError({'headers': errors})
+        return attrs
@@ -0,0 +1,98 @@
+import mock
+from django.test import SimpleTestCase
+from django.test.client import RequestFactory
+from django.test.utils import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+
+class UploadPrefixForRequestTest(SimpleTestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.prefix_func = mock.MagicMock(return_value='uploads')
+        self.request = RequestFactory().get('/')
+        self.request.user = mock.Mock(pk=42)
+        self.request.user.is_authenticated.return_value = True
+
+    def test_that_prefix_is_computed_once_per_request(self):
+        from drf_to_s3.access_control import check_upload_permissions, upload_prefix_for_request
+        with self.settings(AWS_UPLOAD_PREFIX_FUNC=self.prefix_func, AWS_UPLOAD_BUCKET='my-bucket'):
+            self.assertEquals(upload_prefix_for_request(self.request), 'uploads')
+            check_upload_permissions(self.request, 'my-bucket', 'uploads/foo')
+            check_upload_permissions(self.request, 'my-bucket', 'uploads/bar')
+        self.assertEquals(self.prefix_func.call_count, 1)
+
+    def test_that_prefix_is_computed_for_each_request(self):
+        from drf_to_s3.access_control import upload_prefix_for_request
+        other_request = RequestFactory().get('/')
+        other_request.user = self.request.user
+        with self.settings(AWS_UPLOAD_PREFIX_FUNC=self.prefix_func):
+            upload_prefix_for_request(self.request)
+            upload_prefix_for_request(other_request)
+        self.assertEquals(self.prefix_func.call_count, 2)
+
+    def test_that_permission_denied_is_not_memoized(self):
+        from django.contrib.auth.models import AnonymousUser
+        from rest_framework.exceptions import PermissionDenied
+        from drf_to_s3.access_control import upload_prefix_for_request
+        self.request.user = AnonymousUser()
+        with self.assertRaises(PermissionDenied):
+            upload_prefix_for_request(self.request)
+        self.request.user = mock.Mock()
+        self.request.user.get_username.return_value = 'frodo'
+        self.assertEquals(upload_prefix_for_request(self.request), 'frodo')
+
+    def test_that_prefix_is_cached_per_user_when_configured(self):
+        from drf_to_s3.access_control import upload_prefix_for_request
+        other_request = RequestFactory().get('/')
+        other_request.user = self.request.user
+        with self.settings(AWS_UPLOAD_PREFIX_FUNC=self.prefix_func, AWS_UPLOAD_PREFIX_CACHE_SECONDS=60):
+            upload_prefix_for_request(self.request)
+            self.assertEquals(upload_prefix_for_request(other_request), 'uploads')
+        self.assertEquals(self.prefix_func.call_count, 1)
+
+    def test_that_invalidate_discards_cached_prefix(self):
+        from drf_to_s3.access_control import invalidate_upload_prefix, upload_prefix_for_request
+        with self.settings(AWS_UPLOAD_PREFIX_FUNC=self.prefix_func, AWS_UPLOAD_PREFIX_CACHE_SECONDS=60):
+            upload_prefix_for_request(self.request)
+            invalidate_upload_prefix(self.request.user)
+            self.prefix_func.return_value = 'renamed'
+            other_request = RequestFactory().get('/')
+            other_request.user = self.request.user
+            self.assertEquals(upload_prefix_for_request(other_request), 'renamed')
+        self.assertEquals(self.prefix_func.call_count, 2)
+
+    def test_that_anonymous_users_are_not_cached(self):
+        from django.contrib.auth.models import AnonymousUser
+        from drf_to_s3.access_control import upload_prefix_for_request
+        self.request.user = AnonymousUser()
+        other_request = RequestFactory().get('/')
+        other_request.user = AnonymousUser()
+        with self.settings(AWS_UPLOAD_PREFIX_FUNC=self.prefix_func, AWS_UPLOAD_PREFIX_CACHE_SECONDS=60):
+            upload_prefix_for_request(self.request)
+            upload_prefix_for_request(other_request)
+        self.assertEquals(self.prefix_func.call_count, 2)
+
+
+@override_settings(
+    AWS_UPLOAD_BUCKET='my-upload-bucket',
+    AWS_STORAGE_BUCKET_NAME='my-storage-bucket',
+    APPEND_SLASH=False # Work around a Django bug: https://code.djangoproject.com/ticket/21766
+)
+class BatchCompletionUploadPrefixTest(APITestCase):
+    from django.conf.urls import patterns, url
+    from drf_to_s3.views import api_client_views
+    urls = patterns('',
+        url(r'^api/uploaded$', api_client_views.APIUploadCompletionView.as_view()),
+    )
+
+    @mock.patch('drf_to_s3.s3.copy')
+    def test_that_batch_computes_prefix_once(self, copy):
+        prefix_func = mock.MagicMock(return_value='uploads')
+        notifications = [{'key': 'uploads/%d' % i, 'filename': 'foo'} for i in range(5)]
+        with self.settings(AWS_UPLOAD_PREFIX_FUNC=prefix_func):
+            resp = self.client.post('/api/uploaded', notifications, format='json')
+        self.assertEquals(resp.status_code, status.HTTP_200_OK)
+        self.assertEquals(prefix_func.call_count, 1)
@@ -0,0 +1,121 @@
+import unittest
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+
+
+class MemoryStorageBackendTest(unittest.TestCase):
+
+    def setUp(self):
+        from drf_to_s3.backends import MemoryStorageBackend
+        self.backend = MemoryStorageBackend()
+        self.etag = self.backend.put_object('my-upload-bucket', 'uploads/foo', 'Hello, world', content_type='text/plain')
+
+    def test_that_put_object_returns_md5_etag(self):
+        self.assertEquals(self.etag, '"bc6e6f16b8a077ef5fbc8d59d0b931b9"')
+
+    def test_that_copy_copies_data_and_content_type(self):
+        self.backend.copy('my-upload-bucket', 'uploads/foo', 'my-storage-bucket', 'bar')
+        copied = self.backend.get_object('my-storage-bucket', 'bar')
+        self.assertEquals(copied.data, 'Hello, world')
+        self.assertEquals(copied.etag, self.etag)
+        self.assertEquals(copied.content_type, 'text/plain')
+
+    def test_that_copy_accepts_matching_etag_with_or_without_quotes(self):
+        for etag in [self.etag, self.etag.strip('"')]:
+            self.backend.copy(
+                'my-upload-bucket', 'uploads/foo', 'my-storage-bucket', 'bar',
+                src_etag=etag, validate_src_etag=True
+            )
+
+    def test_that_copy_of_missing_key_raises_not_found(self):
+        from drf_to_s3.s3 import ObjectNotFoundException
+        with self.assertRaises(ObjectNotFoundException):
+            self.backend.copy('my-upload-bucket', 'uploads/missing', 'my-storage-bucket', 'bar')
+
+    def test_that_copy_with_mismatched_etag_raises_not_found(self):
+        from drf_to_s3.s3 import ObjectNotFoundException
+        with self.assertRaises(ObjectNotFoundException):
+            self.backend.copy(
+                'my-upload-bucket', 'uploads/foo', 'my-storage-bucket', 'bar',
+                src_etag='12345', validate_src_etag=True
+            )
+        self.assertIsNone(self.backend.get_object('my-storage-bucket', 'bar'))
+
+    def test_that_mismatched_etag_is_ignored_without_validation(self):
+        self.backend.copy(
+            'my-upload-bucket', 'uploads/foo', 'my-storage-bucket', 'bar',
+            src_etag='12345'
+        )
+        self.assertIsNotNone(self.backend.get_object('my-storage-bucket', 'bar'))
+
+
+class FileSystemStorageBackendTest(unittest.TestCase):
+
+    def setUp(self):
+        import tempfile
+        from drf_to_s3.backends import FileSystemStorageBackend
+        self.root = tempfile.mkdtemp()
+        self.backend = FileSystemStorageBackend(root=self.root)
+        self.etag = self.backend.put_object('my-upload-bucket', 'uploads/foo', 'Hello, world')
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.root)
+
+    def test_that_copy_writes_file(self):
+        import os
+        self.backend.copy(
+            'my-upload-bucket', 'uploads/foo', 'my-storage-bucket', 'bar/baz',
+            src_etag=self.etag, validate_src_etag=True
+        )
+        with open(os.path.join(self.root, 'my-storage-bucket', 'bar', 'baz')) as f:
+            self.assertEquals(f.read(), 'Hello, world')
+        self.assertEquals(self.backend.get_etag('my-storage-bucket', 'bar/baz'), self.etag)
+
+    def test_that_copy_of_missing_key_raises_not_found(self):
+        from drf_to_s3.s3 import ObjectNotFoundException
+        with self.assertRaises(ObjectNotFoundException):
+            self.backend.copy('my-upload-bucket', 'uploads/missing', 'my-storage-bucket', 'bar')
+
+    def test_that_copy_with_mismatched_etag_raises_not_found(self):
+        from drf_to_s3.s3 import ObjectNotFoundException
+        with self.assertRaises(ObjectNotFoundException):
+            self.backend.copy(
+                'my-upload-bucket', 'uploads/foo', 'my-storage-bucket', 'bar',
+                src_etag='12345', validate_src_etag=True
+            )
+        self.assertIsNone(self.backend.get_etag('my-storage-bucket', 'bar'))
+
+    def test_that_keys_cannot_escape_the_bucket(self):
+        from drf_to_s3.s3 import ObjectNotFoundException
+        for bucket, key in [
+            ('my-upload-bucket', '../my-storage-bucket/foo'),
+            ('..', 'foo'),
+            ('my-upload-bucket', ''),
+        ]:
+            with self.assertRaises(ObjectNotFoundException):
+                self.backend.path_for(bucket, key)
+
+
+class StorageBackendSettingTest(SimpleTestCase):
+
+    @override_settings(AWS_S3_STORAGE_BACKEND='drf_to_s3.backends.MemoryStorageBackend')
+    def test_that_copy_uses_configured_backend(self):
+        from drf_to_s3 import backends, s3
+        backend = backends.get_storage_backend()
+        self.assertIsInstance(backend, backends.MemoryStorageBackend)
+        self.assertIs(backends.get_storage_backend(), backend)
+        etag = backend.put_object('my-upload-bucket', 'uploads/foo', 'Hello, world')
+        s3.copy(
+            src_bucket='my-upload-bucket',
+            src_key='uploads/foo',
+            dst_bucket='my-storage-bucket',
+            dst_key='bar',
+            src_etag=etag,
+            validate_src_etag=True
+        )
+        self.assertEquals(backend.get_object('my-storage-bucket', 'bar').data, 'Hello, world')
+
+    def test_that_default_backend_is_boto(self):
+        from drf_to_s3 import backends
+        self.assertIsInstance(backends.get_storage_backend(), backends.BotoStorageBackend)
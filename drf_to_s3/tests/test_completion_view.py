@@ -2,7 +2,10 @@ import datetime, json, mock, unittest
 from django.conf.urls import patterns, url
 from django.test.utils import override_settings
 from rest_framework import status
+from rest_framework.response import Response
 from rest_framework.test import APITestCase
+from drf_to_s3 import s3
+from drf_to_s3.views import PendingCopy
 
 
 @override_settings(
@@ -233,3 +236,189 @@ class TestCompletionViewSessionAuth(APITestCase):
         self.assertEquals(resp.status_code, status.HTTP_400_BAD_REQUEST)
         content = json.loads(resp.content)
         self.assertEquals(content['detail'], 'Invalid key or bad ETag')
+
+
+@override_settings(
+    AWS_UPLOAD_SECRET_ACCESS_KEY='12345',
+    AWS_UPLOAD_BUCKET='my-upload-bucket',
+    AWS_UPLOAD_PREFIX_FUNC=lambda x: 'uploads',
+    AWS_STORAGE_BUCKET_NAME='my-storage-bucket',
+    APPEND_SLASH=False # Work around a Django bug: https://code.djangoproject.com/ticket/21766
+)
+class TestBatchCompletionView(APITestCase):
+    from drf_to_s3.views import api_client_views, fine_uploader_views
+    urls = patterns('',
+        url(r'^s3/uploaded$', fine_uploader_views.FineUploadCompletionView.as_view()),
+        url(r'^s3/api_uploaded$', api_client_views.APIUploadCompletionView.as_view()),
+    )
+
+    def notification(self, key, name='baz.txt'):
+        return {
+            'bucket': 'my-upload-bucket',
+            'key': key,
+            'uuid': '12345',
+            'name': name,
+            'etag': '67890',
+        }
+
+    @mock.patch('drf_to_s3.s3.copy')
+    def test_that_batch_notification_copies_every_item(self, copy):
+        notifications = [self.notification('uploads/foo/%d' % i) for i in range(5)]
+        resp = self.client.post('/s3/uploaded', notifications, format='json')
+        self.assertEquals(resp.status_code, status.HTTP_200_OK)
+        content = json.loads(resp.content)
+        self.assertEquals(content['results'], [{'success': True}] * 5)
+        copied_keys = sorted(call[1]['src_key'] for call in copy.call_args_list)
+        self.assertEquals(copied_keys, sorted(item['key'] for item in notifications))
+
+    @mock.patch('drf_to_s3.s3.copy')
+    def test_that_batch_notification_reports_per_item_errors(self, copy):
+        from drf_to_s3 import s3
+        def copy_side_effect(**kwargs):
+            if kwargs['src_key'] == 'uploads/missing':
+                raise s3.ObjectNotFoundException()
+        copy.side_effect = copy_side_effect
+        invalid = self.notification('uploads/invalid')
+        del invalid['bucket']
+        notifications = [
+            self.notification('uploads/ok'),
+            invalid,
+            self.notification('elsewhere/hijacked'),
+            self.notification('uploads/missing'),
+        ]
+        resp = self.client.post('/s3/uploaded', notifications, format='json')
+        self.assertEquals(resp.status_code, status.HTTP_200_OK)
+        results = json.loads(resp.content)['results']
+        self.assertEquals(results[0], {'success': True})
+        self.assertTrue(results[1]['invalid'])
+        self.assertIn('bucket', results[1]['errors'])
+        self.assertTrue(results[2]['error'].startswith('Key should start with'))
+        self.assertEquals(results[3]['error'], 'Invalid key or bad ETag')
+        self.assertEquals(copy.call_count, 2)
+
+    @mock.patch('drf_to_s3.s3.copy')
+    def test_that_oversized_batch_is_rejected(self, copy):
+        from drf_to_s3.views import fine_uploader_views
+        notifications = [self.notification('uploads/foo/%d' % i) for i in range(3)]
+        with mock.patch.object(fine_uploader_views.FineUploadCompletionView, 'max_batch_size', 2):
+            resp = self.client.post('/s3/uploaded', notifications, format='json')
+        self.assertEquals(resp.status_code, status.HTTP_200_OK) # for IE9/IE3
+        content = json.loads(resp.content)
+        self.assertTrue(content['error'].startswith('Too many uploads in batch'))
+        self.assertFalse(copy.called)
+
+    @mock.patch('drf_to_s3.s3.copy')
+    def test_that_api_batch_notification_uses_upload_bucket(self, copy):
+        notifications = [
+            {'key': 'uploads/foo/1', 'filename': 'one.txt'},
+            {'key': 'uploads/foo/2', 'filename': 'two.txt'},
+        ]
+        resp = self.client.post('/s3/api_uploaded', notifications, format='json')
+        self.assertEquals(resp.status_code, status.HTTP_200_OK)
+        content = json.loads(resp.content)
+        self.assertEquals(content['results'], [{'success': True}] * 2)
+        for call in copy.call_args_list:
+            self.assertEquals(call[1]['src_bucket'], 'my-upload-bucket')
+
+
+@override_settings(
+    AWS_UPLOAD_SECRET_ACCESS_KEY='12345',
+    AWS_UPLOAD_BUCKET='my-upload-bucket',
+    AWS_UPLOAD_PREFIX_FUNC=lambda x: 'uploads',
+    AWS_STORAGE_BUCKET_NAME='my-storage-bucket',
+    APPEND_SLASH=False # Work around a Django bug: https://code.djangoproject.com/ticket/21766
+)
+class TestBatchCompletionViewSubclass(APITestCase):
+    from drf_to_s3.views import fine_uploader_views
+
+    class CustomCompletionView(fine_uploader_views.FineUploadCompletionView):
+        handled = []
+
+        def handle_upload(self, request, serializer, obj, bucket, key, filename):
+            self.handled.append(key)
+            if key == 'uploads/rejected':
+                return Response({'error': 'Not allowed'}, status=status.HTTP_400_BAD_REQUEST)
+            return Response({'stored_as': key.upper()}, status=status.HTTP_200_OK)
+
+    urls = patterns('',
+        url(r'^s3/uploaded$', CustomCompletionView.as_view()),
+    )
+
+    def notification(self, key):
+        return {
+            'bucket': 'my-upload-bucket',
+            'key': key,
+            'uuid': '12345',
+            'name': 'baz.txt',
+            'etag': '67890',
+        }
+
+    @mock.patch('drf_to_s3.s3.copy')
+    def test_that_overridden_handle_upload_receives_each_batch_item(self, copy):
+        self.CustomCompletionView.handled = []
+        notifications = [self.notification('uploads/foo'), self.notification('uploads/rejected')]
+        resp = self.client.post('/s3/uploaded', notifications, format='json')
+        self.assertEquals(resp.status_code, status.HTTP_200_OK)
+        results = json.loads(resp.content)['results']
+        self.assertEquals(self.CustomCompletionView.handled, ['uploads/foo', 'uploads/rejected'])
+        self.assertEquals(results[0], {'success': True, 'stored_as': 'UPLOADS/FOO'})
+        self.assertTrue(results[1]['invalid'])
+        self.assertEquals(results[1]['error'], 'Not allowed')
+        self.assertFalse(copy.called)
+
+
+@override_settings(
+    AWS_UPLOAD_SECRET_ACCESS_KEY='12345',
+    AWS_UPLOAD_BUCKET='my-upload-bucket',
+    AWS_UPLOAD_PREFIX_FUNC=lambda x: 'uploads',
+    AWS_STORAGE_BUCKET_NAME='my-storage-bucket',
+    APPEND_SLASH=False # Work around a Django bug: https://code.djangoproject.com/ticket/21766
+)
+class TestCompletionViewCopyOverrides(APITestCase):
+    from drf_to_s3.views import fine_uploader_views
+
+    class CopyCompletionView(fine_uploader_views.FineUploadCompletionView):
+        def copy_upload_to_storage(self, request, bucket, key, filename):
+            s3.copy(src_bucket=bucket, src_key=key, dst_bucket='archive', dst_key='archive/' + key)
+            return 'archive/' + key
+
+    class AsyncCopyCompletionView(fine_uploader_views.FineUploadCompletionView):
+        def copy_upload_to_storage_async(self, request, bucket, key, filename):
+            return PendingCopy(
+                s3.copy_async(src_bucket=bucket, src_key=key, dst_bucket='archive', dst_key='archive/' + key),
+                'archive/' + key
+            )
+
+    urls = patterns('',
+        url(r'^s3/copy$', CopyCompletionView.as_view()),
+        url(r'^s3/async_copy$', AsyncCopyCompletionView.as_view()),
+    )
+
+    def notification(self, key):
+        return {
+            'bucket': 'my-upload-bucket',
+            'key': key,
+            'uuid': '12345',
+            'name': 'baz.txt',
+            'etag': '67890',
+        }
+
+    def assert_copies_to_archive(self, copy, path):
+        resp = self.client.post(path, self.notification('uploads/single'))
+        self.assertEquals(resp.status_code, status.HTTP_200_OK)
+        resp = self.client.post(path, [self.notification('uploads/one'), self.notification('uploads/two')], format='json')
+        self.assertEquals(json.loads(resp.content)['results'], [{'success': True}] * 2)
+        self.assertEquals(
+            sorted(call[1]['dst_key'] for call in copy.call_args_list),
+            ['archive/uploads/one', 'archive/uploads/single', 'archive/uploads/two']
+        )
+        for call in copy.call_args_list:
+            self.assertEquals(call[1]['dst_bucket'], 'archive')
+
+    @mock.patch('drf_to_s3.s3.copy')
+    def test_that_batch_uses_overridden_copy_upload_to_storage(self, copy):
+        self.assert_copies_to_archive(copy, '/s3/copy')
+
+    @mock.patch('drf_to_s3.s3.copy')
+    def test_that_single_upload_uses_overridden_copy_upload_to_storage_async(self, copy):
+        self.assert_copies_to_archive(copy, '/s3/async_copy')
@@ -0,0 +1,78 @@
+import unittest
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+
+
+class Source(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class SettingsTest(unittest.TestCase):
+
+    def test_that_defaults_are_used(self):
+        from drf_to_s3.conf import Settings
+        config = Settings(Source(AWS_UPLOAD_BUCKET='my-upload-bucket'))
+        self.assertEquals(config.upload_bucket, 'my-upload-bucket')
+        self.assertEquals(config.upload_expire_after_seconds, 300)
+        self.assertEquals(config.upload_signature_version, 2)
+        self.assertEquals(config.upload_region, 'us-east-1')
+        self.assertIsNone(config.upload_prefix_func)
+        self.assertEquals(config.upload_prefix_cookie_name, 'upload_prefix')
+        self.assertEquals(config.upload_bucket_cookie_name, 'upload_bucket')
+
+    def test_that_missing_required_setting_raises_improperly_configured(self):
+        from drf_to_s3.conf import Settings
+        config = Settings(Source())
+        with self.assertRaisesRegexp(ImproperlyConfigured, 'AWS_UPLOAD_SECRET_ACCESS_KEY'):
+            config.upload_secret_access_key
+        with self.assertRaises(AttributeError):
+            config.no_such_setting
+
+    def test_that_valid_settings_pass_validation(self):
+        from drf_to_s3.conf import Settings
+        Settings(Source(
+            AWS_UPLOAD_BUCKET='my-upload-bucket',
+            AWS_UPLOAD_SIGNATURE_VERSION=4,
+            AWS_UPLOAD_SIGNATURE_CACHE_SECONDS=60,
+        )).validate()
+
+    def test_that_invalid_settings_fail_validation(self):
+        from drf_to_s3.conf import Settings
+        for kwargs in [
+            {'AWS_UPLOAD_SIGNATURE_VERSION': 3},
+            {'AWS_UPLOAD_EXPIRE_AFTER_SECONDS': 0},
+            {'AWS_UPLOAD_MAX_URIS_PER_REQUEST': '100'},
+            {'AWS_UPLOAD_SIGNATURE_CACHE_SECONDS': 300},
+            {'AWS_STORAGE_BUCKET_NAME': 'my storage bucket'},
+            {'AWS_UPLOAD_BUCKETS': []},
+            {'AWS_STORAGE_BUCKETS': ['my-storage-bucket', 'my storage bucket']},
+        ]:
+            with self.assertRaises(ImproperlyConfigured):
+                Settings(Source(**kwargs)).validate()
+
+
+class GetSettingsTest(SimpleTestCase):
+
+    def test_that_settings_are_read_once(self):
+        from drf_to_s3 import conf
+        self.assertIs(conf.get_settings(), conf.get_settings())
+
+    def test_that_changed_setting_is_picked_up(self):
+        from drf_to_s3 import conf
+        with self.settings(AWS_UPLOAD_REGION='eu-west-1'):
+            self.assertEquals(conf.get_settings().upload_region, 'eu-west-1')
+        self.assertEquals(conf.get_settings().upload_region, 'us-east-1')
+
+    def test_that_unrelated_setting_keeps_snapshot(self):
+        from drf_to_s3 import conf
+        config = conf.get_settings()
+        with self.settings(USE_TZ=True):
+            self.assertIs(conf.get_settings(), config)
+
+    @override_settings(AWS_UPLOAD_SIGNATURE_VERSION=3)
+    def test_that_invalid_settings_raise_on_first_use(self):
+        from drf_to_s3 import conf
+        with self.assertRaises(ImproperlyConfigured):
+            conf.get_settings()
@@ -0,0 +1,236 @@
+import json, mock, time
+from django.conf.urls import patterns, url
+from django.test import TestCase
+from django.test.utils import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+
+def wait_for_job(queue, job_id, timeout=5):
+    from drf_to_s3 import copy_jobs
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get_job(job_id)
+        if job['status'] in [copy_jobs.SUCCEEDED, copy_jobs.FAILED]:
+            return job
+        time.sleep(0.01)
+    raise AssertionError('Job did not finish')
+
+
+class ThreadPoolCopyJobQueueTest(TestCase):
+
+    def setUp(self):
+        from drf_to_s3.copy_jobs import ThreadPoolCopyJobQueue
+        self.queue = ThreadPoolCopyJobQueue()
+
+    @mock.patch('drf_to_s3.s3.copy')
+    def test_that_queued_job_runs_copy(self, copy):
+        job_id = self.queue.enqueue(
+            src_bucket='my-upload-bucket',
+            src_key='uploads/foo',
+            dst_bucket='my-storage-bucket',
+            dst_key='bar'
+        )
+        job = wait_for_job(self.queue, job_id)
+        self.assertEquals(job['status'], 'succeeded')
+        self.assertIsNone(job['error'])
+        copy.assert_called_once_with(
+            src_bucket='my-upload-bucket',
+            src_key='uploads/foo',
+            dst_bucket='my-storage-bucket',
+            dst_key='bar',
+            src_etag=None,
+            validate_src_etag=False
+        )
+
+    @mock.patch('drf_to_s3.s3.copy')
+    def test_that_failed_copy_is_reported(self, copy):
+        from drf_to_s3 import s3
+        copy.side_effect = s3.ObjectNotFoundException
+        job_id = self.queue.enqueue(
+            src_bucket='my-upload-bucket',
+            src_key='uploads/foo',
+            dst_bucket='my-storage-bucket',
+            dst_key='bar'
+        )
+        job = wait_for_job(self.queue, job_id)
+        self.assertEquals(job['status'], 'failed')
+        self.assertEquals(job['error'], 'Invalid key or bad ETag')
+
+    def test_that_unknown_job_returns_none(self):
+        self.assertIsNone(self.queue.get_job('12345'))
+
+
+class DatabaseCopyJobQueueTest(TestCase):
+
+    def setUp(self):
+        from drf_to_s3.copy_jobs import DatabaseCopyJobQueue
+        self.queue = DatabaseCopyJobQueue()
+
+    @mock.patch('drf_to_s3.s3.copy')
+    def test_that_job_is_pending_until_processed(self, copy):
+        job_id = self.queue.enqueue(
+            src_bucket='my-upload-bucket',
+            src_key='uploads/foo',
+            dst_bucket='my-storage-bucket',
+            dst_key='bar',
+            src_etag='12345',
+            validate_src_etag=True
+        )
+        self.assertEquals(self.queue.get_job(job_id)['status'], 'pending')
+        self.assertFalse(copy.called)
+
+        self.assertEquals(self.queue.process_pending(), 1)
+        self.assertEquals(self.queue.get_job(job_id)['status'], 'succeeded')
+        copy.assert_called_once_with(
+            src_bucket='my-upload-bucket',
+            src_key='uploads/foo',
+            dst_bucket='my-storage-bucket',
+            dst_key='bar',
+            src_etag='12345',
+            validate_src_etag=True
+        )
+        self.assertEquals(self.queue.process_pending(), 0)
+
+    @mock.patch('drf_to_s3.s3.copy')
+    def test_that_failed_copy_is_reported(self, copy):
+        from drf_to_s3 import s3
+        copy.side_effect = s3.ObjectNotFoundException
+        job_id = self.queue.enqueue(
+            src_bucket='my-upload-bucket',
+            src_key='uploads/foo',
+            dst_bucket='my-storage-bucket',
+            dst_key='bar'
+        )
+        self.queue.process_pending()
+        job = self.queue.get_job(job_id)
+        self.assertEquals(job['status'], 'failed')
+        self.assertEquals(job['error'], 'Invalid key or bad ETag')
+
+    @mock.patch('drf_to_s3.s3.copy')
+    def test_that_stale_running_job_is_run_again(self, copy):
+        import datetime
+        from django.utils import timezone
+        from drf_to_s3.models import CopyJob
+        job_id = self.queue.enqueue(
+            src_bucket='my-upload-bucket',
+            src_key='uploads/foo',
+            dst_bucket='my-storage-bucket',
+            dst_key='bar'
+        )
+        # A worker claimed the job and died
+        claimed = timezone.now() - datetime.timedelta(seconds=self.queue.stale_seconds - 60)
+        CopyJob.objects.filter(id=job_id).update(status='running', updated=claimed)
+        self.assertEquals(self.queue.process_pending(), 0)
+        self.assertEquals(self.queue.get_job(job_id)['status'], 'running')
+
+        claimed = timezone.now() - datetime.timedelta(seconds=self.queue.stale_seconds + 60)
+        CopyJob.objects.filter(id=job_id).update(status='running', updated=claimed)
+        self.assertEquals(self.queue.process_pending(), 1)
+        self.assertEquals(self.queue.get_job(job_id)['status'], 'succeeded')
+        self.assertEquals(copy.call_count, 1)
+
+
+@override_settings(AWS_COPY_JOB_QUEUE='drf_to_s3.copy_jobs.DatabaseCopyJobQueue')
+class ProcessCopyJobsCommandTest(TestCase):
+
+    @mock.patch('drf_to_s3.s3.copy')
+    def test_that_command_runs_pending_jobs(self, copy):
+        from django.core.management import call_command
+        from drf_to_s3.copy_jobs import get_copy_job_queue
+        queue = get_copy_job_queue()
+        job_ids = [
+            queue.enqueue(
+                src_bucket='my-upload-bucket',
+                src_key='uploads/%d' % i,
+                dst_bucket='my-storage-bucket',
+                dst_key='bar'
+            )
+            for i in range(3)
+        ]
+        call_command('process_copy_jobs', limit=2)
+        self.assertEquals(copy.call_count, 2)
+        call_command('process_copy_jobs')
+        self.assertEquals(copy.call_count, 3)
+        self.assertEquals([queue.get_job(job_id)['status'] for job_id in job_ids], ['succeeded'] * 3)
+
+    @override_settings(AWS_COPY_JOB_QUEUE='drf_to_s3.copy_jobs.ThreadPoolCopyJobQueue')
+    def test_that_command_requires_database_queue(self):
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        with self.assertRaises(CommandError):
+            call_command('process_copy_jobs')
+
+
+@override_settings(
+    AWS_UPLOAD_BUCKET='my-upload-bucket',
+    AWS_STORAGE_BUCKET_NAME='my-storage-bucket',
+    AWS_COPY_JOB_QUEUE='drf_to_s3.copy_jobs.DatabaseCopyJobQueue',
+    APPEND_SLASH=False # Work around a Django bug: https://code.djangoproject.com/ticket/21766
+)
+class DeferredCompletionViewTest(APITestCase):
+    from drf_to_s3.views import CopyJobStatusView, fine_uploader_views
+
+    class DeferredCompletionView(fine_uploader_views.FineUploadCompletionView):
+        defer_copy = True
+
+    urls = patterns('',
+        url(r'^s3/uploaded$', DeferredCompletionView.as_view()),
+        url(r'^copy_job/(?P<job_id>[0-9a-f]+)$', CopyJobStatusView.as_view()),
+    )
+
+    def setUp(self):
+        from .util import get_user_model
+        self.username = 'frodo'
+        self.password = 'shire1234'
+        get_user_model().objects.create_user(
+            username=self.username,
+            password=self.password
+        )
+        self.client.login(
+            username=self.username,
+            password=self.password
+        )
+        self.notification = {
+            'bucket': 'my-upload-bucket',
+            'key': self.username + '/foo/bar/baz',
+            'uuid': '12345',
+            'name': 'baz.txt',
+            'etag': '67890',
+        }
+
+    @mock.patch('drf_to_s3.s3.copy')
+    def test_that_completion_returns_job_id_without_copying(self, copy):
+        resp = self.client.post('/s3/uploaded', self.notification)
+        self.assertEquals(resp.status_code, status.HTTP_200_OK)
+        self.assertIn('job_id', json.loads(resp.content))
+        self.assertFalse(copy.called)
+
+    @mock.patch('drf_to_s3.s3.copy')
+    def test_that_status_endpoint_reports_job_status(self, copy):
+        from drf_to_s3.copy_jobs import get_copy_job_queue
+        resp = self.client.post('/s3/uploaded', self.notification)
+        job_id = json.loads(resp.content)['job_id']
+
+        resp = self.client.get('/copy_job/' + job_id)
+        self.assertEquals(resp.status_code, status.HTTP_200_OK)
+        self.assertEquals(json.loads(resp.content), {'job_id': job_id, 'status': 'pending'})
+
+        get_copy_job_queue().process_pending()
+        resp = self.client.get('/copy_job/' + job_id)
+        self.assertEquals(json.loads(resp.content)['status'], 'succeeded')
+
+    def test_that_status_endpoint_returns_404_for_unknown_job(self):
+        resp = self.client.get('/copy_job/abcdef')
+        self.assertEquals(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_that_status_endpoint_hides_other_users_jobs(self):
+        from drf_to_s3.copy_jobs import get_copy_job_queue
+        job_id = get_copy_job_queue().enqueue(
+            src_bucket='my-upload-bucket',
+            src_key='samwise/foo/bar/baz',
+            dst_bucket='my-storage-bucket',
+            dst_key='bar'
+        )
+        resp = self.client.get('/copy_job/' + job_id)
+        self.assertEquals(resp.status_code, status.HTTP_403_FORBIDDEN)
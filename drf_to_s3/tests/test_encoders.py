@@ -0,0 +1,50 @@
+import base64, json, unittest
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+
+
+class EncodersTest(unittest.TestCase):
+
+    documents = [
+        {},
+        {'expiration': '2014-01-01T00:00:00Z', 'conditions': [
+            {'acl': 'private'},
+            {'success_action_status': 200},
+            ['content-length-range', 1024, 10240],
+            ['eq', '$key', u'uploads/caf\xe9'],
+        ]},
+        {'b': {'y': 1, 'x': [{'q': 1, 'p': 2}]}, 'a': None},
+        [{'b': 1, 'a': 2}],
+    ]
+
+    def test_that_canonical_json_is_compact_and_sorted(self):
+        from drf_to_s3.encoders import canonical_json
+        for document in self.documents:
+            expected = json.dumps(document, separators=(',', ':'), sort_keys=True)
+            self.assertEquals(canonical_json(document), expected)
+            self.assertIsInstance(canonical_json(document), str)
+
+    def test_that_compact_json_round_trips(self):
+        from drf_to_s3.encoders import compact_json
+        for document in self.documents:
+            self.assertEquals(json.loads(compact_json(document)), document)
+            self.assertNotIn(', ', compact_json(document))
+
+
+class PolicyEncoderSettingTest(SimpleTestCase):
+
+    def test_that_policy_is_signed_with_canonical_json_by_default(self):
+        from drf_to_s3 import s3
+        policy_document = {'expiration': '2014-01-01T00:00:00Z', 'conditions': [{'bucket': 'my-bucket'}]}
+        result = s3.sign_policy_document(policy_document, '12345')
+        self.assertEquals(
+            base64.b64decode(result['policy']),
+            '{"conditions":[{"bucket":"my-bucket"}],"expiration":"2014-01-01T00:00:00Z"}'
+        )
+
+    @override_settings(AWS_UPLOAD_POLICY_ENCODER='drf_to_s3.encoders.legacy_json')
+    def test_that_encoder_is_configurable(self):
+        from drf_to_s3 import s3
+        policy_document = {'conditions': [{'bucket': 'my-bucket'}]}
+        result = s3.sign_policy_document(policy_document, '12345')
+        self.assertEquals(base64.b64decode(result['policy']), json.dumps(policy_document))
@@ -0,0 +1,132 @@
+import mock, unittest
+from django.conf.urls import include, patterns, url
+from django.test.utils import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+
+class InstrumentationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+        self.callback = lambda phase, duration: self.calls.append((phase, duration))
+
+    def tearDown(self):
+        from drf_to_s3 import instrumentation
+        instrumentation.unregister(self.callback)
+
+    def test_that_timed_does_nothing_without_callbacks(self):
+        from drf_to_s3 import instrumentation
+        self.assertFalse(instrumentation.is_enabled())
+        self.assertIs(instrumentation.timed('foo'), instrumentation.timed('bar'))
+
+    def test_that_timed_reports_phase_and_duration(self):
+        from drf_to_s3 import instrumentation
+        instrumentation.register(self.callback)
+        with instrumentation.timed('foo'):
+            pass
+        self.assertEquals(len(self.calls), 1)
+        phase, duration = self.calls[0]
+        self.assertEquals(phase, 'foo')
+        self.assertGreaterEqual(duration, 0)
+
+    def test_that_timed_reports_when_block_raises(self):
+        from drf_to_s3 import instrumentation
+        instrumentation.register(self.callback)
+        with self.assertRaises(ValueError):
+            with instrumentation.timed('foo'):
+                raise ValueError()
+        self.assertEquals([phase for phase, duration in self.calls], ['foo'])
+
+    def test_that_failing_callback_is_logged_not_raised(self):
+        from drf_to_s3 import instrumentation
+        failing = mock.MagicMock(side_effect=ValueError())
+        instrumentation.register(failing)
+        instrumentation.register(self.callback)
+        try:
+            with mock.patch('logging.Logger.exception') as exception:
+                with instrumentation.timed('foo'):
+                    pass
+        finally:
+            instrumentation.unregister(failing)
+        self.assertTrue(exception.called)
+        self.assertEquals(len(self.calls), 1)
+
+    def test_that_statsd_callback_sends_milliseconds(self):
+        from drf_to_s3 import instrumentation
+        client = mock.MagicMock()
+        instrumentation.StatsDCallback(client)('sign.validate', 0.25)
+        client.timing.assert_called_once_with('drf_to_s3.sign.validate', 250.0)
+
+    def test_that_prometheus_callback_observes_seconds(self):
+        from drf_to_s3 import instrumentation
+        histogram = mock.MagicMock()
+        instrumentation.PrometheusCallback(histogram)('sign.validate', 0.25)
+        histogram.labels.assert_called_once_with(phase='sign.validate')
+        histogram.labels.return_value.observe.assert_called_once_with(0.25)
+
+
+@override_settings(
+    AWS_UPLOAD_SECRET_ACCESS_KEY='12345',
+    AWS_UPLOAD_ACCESS_KEY_ID='67890',
+    AWS_UPLOAD_BUCKET='my-upload-bucket',
+    AWS_UPLOAD_PREFIX_FUNC=lambda x: 'uploads',
+    AWS_STORAGE_BUCKET_NAME='my-storage-bucket',
+    APPEND_SLASH=False # Work around a Django bug: https://code.djangoproject.com/ticket/21766
+)
+class ViewInstrumentationTest(APITestCase):
+    from drf_to_s3.views import fine_uploader_views
+    urls = patterns('',
+        url(r'^', include('drf_to_s3.urls')),
+        url(r'^s3/uploaded$', fine_uploader_views.FineUploadCompletionView.as_view()),
+    )
+
+    def setUp(self):
+        from drf_to_s3 import instrumentation
+        self.phases = []
+        self.callback = lambda phase, duration: self.phases.append(phase)
+        instrumentation.register(self.callback)
+
+    def tearDown(self):
+        from drf_to_s3 import instrumentation
+        instrumentation.unregister(self.callback)
+
+    def test_that_sign_view_reports_phases(self):
+        policy_document = {
+            'expiration': '2007-12-01T12:00:00.000Z',
+            'conditions': [
+                {'acl': 'private'},
+                {'bucket': 'my-upload-bucket'},
+                {'Content-Type': 'image/jpeg'},
+                {'success_action_status': 200},
+                {'key': 'uploads/foo/bar/baz.jpg'},
+                {'x-amz-meta-qqfilename': 'baz.jpg'},
+                ['content-length-range', 1024, 10240]
+            ]
+        }
+        resp = self.client.post('/sign', policy_document, format='json')
+        self.assertEquals(resp.status_code, status.HTTP_200_OK)
+        self.assertEquals(self.phases, ['sign.parse', 'sign.validate', 'sign.permissions', 'sign.sign'])
+
+    def test_that_upload_uri_view_reports_phases(self):
+        resp = self.client.post('/upload_uri')
+        self.assertEquals(resp.status_code, status.HTTP_200_OK)
+        self.assertEquals(self.phases, ['upload_uri.parse', 'upload_uri.prefix', 'upload_uri.sign'])
+
+    @mock.patch('drf_to_s3.s3.copy')
+    def test_that_completion_view_reports_phases(self, copy):
+        resp = self.client.post('/s3/uploaded', {
+            'bucket': 'my-upload-bucket',
+            'key': 'uploads/foo/bar/baz',
+            'uuid': '12345',
+            'name': 'baz',
+            'etag': '67890',
+        })
+        self.assertEquals(resp.status_code, status.HTTP_200_OK)
+        self.assertEquals(self.phases, [
+            'completion.parse',
+            'completion.validate',
+            'completion.permissions',
+            'completion.copy',
+            'completion.handle_upload',
+        ])
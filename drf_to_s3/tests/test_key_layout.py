@@ -0,0 +1,121 @@
+import datetime, json, mock, unittest
+from django.conf.urls import patterns, url
+from django.test.utils import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+
+class DefaultKeyLayoutTest(unittest.TestCase):
+
+    def test_that_upload_key_is_under_upload_prefix(self):
+        from drf_to_s3.key_layout import DefaultKeyLayout
+        layout = DefaultKeyLayout()
+        self.assertEquals(layout.key_prefix('frodo'), 'frodo')
+        self.assertRegexpMatches(layout.new_upload_key('frodo'), r'^frodo/[0-9a-f-]{36}$')
+
+    def test_that_storage_key_preserves_extension(self):
+        from drf_to_s3.key_layout import DefaultKeyLayout
+        self.assertRegexpMatches(DefaultKeyLayout().new_storage_key('baz.jpg'), r'^[0-9a-f-]{36}\.jpg$')
+
+
+class HashedKeyLayoutTest(unittest.TestCase):
+
+    def test_that_key_prefix_is_sharded_by_upload_prefix(self):
+        from drf_to_s3.key_layout import HashedKeyLayout
+        layout = HashedKeyLayout()
+        self.assertRegexpMatches(layout.key_prefix('frodo'), r'^[0-9a-f]{4}/frodo$')
+        self.assertEquals(layout.key_prefix('frodo'), layout.key_prefix(u'frodo'))
+
+    def test_that_upload_key_is_under_key_prefix(self):
+        from drf_to_s3.key_layout import HashedKeyLayout
+        layout = HashedKeyLayout()
+        self.assertTrue(layout.new_upload_key('frodo').startswith(layout.key_prefix('frodo') + '/'))
+
+    def test_that_storage_keys_are_sharded_per_object(self):
+        from drf_to_s3.key_layout import HashedKeyLayout
+        layout = HashedKeyLayout()
+        key = layout.new_storage_key('baz.jpg')
+        self.assertRegexpMatches(key, r'^[0-9a-f]{4}/[0-9a-f]{32}\.jpg$')
+        shard, name = key.split('/')
+        self.assertTrue(name.startswith(shard))
+
+    def test_that_shard_length_is_configurable(self):
+        from drf_to_s3.key_layout import HashedKeyLayout
+        class TwoDigitLayout(HashedKeyLayout):
+            shard_length = 2
+        self.assertRegexpMatches(TwoDigitLayout().key_prefix('frodo'), r'^[0-9a-f]{2}/frodo$')
+
+
+class DatePartitionedKeyLayoutTest(unittest.TestCase):
+
+    @mock.patch('drf_to_s3.key_layout.DatePartitionedKeyLayout.today', return_value='2014/03/09')
+    def test_that_keys_are_partitioned_by_date(self, today):
+        from drf_to_s3.key_layout import DatePartitionedKeyLayout
+        layout = DatePartitionedKeyLayout()
+        self.assertEquals(layout.key_prefix('frodo'), 'frodo')
+        self.assertRegexpMatches(layout.new_upload_key('frodo'), r'^frodo/2014/03/09/[0-9a-f-]{36}$')
+        self.assertRegexpMatches(layout.new_storage_key('baz.jpg'), r'^2014/03/09/[0-9a-f-]{36}\.jpg$')
+
+    def test_that_today_is_utc_date(self):
+        from drf_to_s3.key_layout import DatePartitionedKeyLayout
+        self.assertEquals(
+            DatePartitionedKeyLayout().today(),
+            datetime.datetime.utcnow().strftime('%Y/%m/%d')
+        )
+
+
+@override_settings(
+    AWS_UPLOAD_SECRET_ACCESS_KEY='12345',
+    AWS_UPLOAD_ACCESS_KEY_ID='67890',
+    AWS_UPLOAD_BUCKET='my-upload-bucket',
+    AWS_STORAGE_BUCKET_NAME='my-storage-bucket',
+    AWS_UPLOAD_KEY_LAYOUT='drf_to_s3.key_layout.HashedKeyLayout',
+    APPEND_SLASH=False # Work around a Django bug: https://code.djangoproject.com/ticket/21766
+)
+class HashedKeyLayoutViewsTest(APITestCase):
+    from drf_to_s3.views import api_client_views
+    urls = patterns('',
+        url(r'^upload_uri$', api_client_views.SignedPutURIView.as_view()),
+        url(r'^s3/api_uploaded$', api_client_views.APIUploadCompletionView.as_view()),
+    )
+
+    def setUp(self):
+        from .util import get_user_model
+        from drf_to_s3.key_layout import HashedKeyLayout
+        self.username = 'frodo'
+        self.password = 'shire1234'
+        get_user_model().objects.create_user(
+            username=self.username,
+            password=self.password
+        )
+        self.client.login(
+            username=self.username,
+            password=self.password
+        )
+        self.key_prefix = HashedKeyLayout().key_prefix(self.username)
+
+    def test_that_upload_uri_key_is_under_key_prefix(self):
+        resp = self.client.post('/upload_uri', {'count': 2}, format='json')
+        self.assertEquals(resp.status_code, status.HTTP_200_OK)
+        for upload in json.loads(resp.content)['uploads']:
+            self.assertTrue(upload['key'].startswith(self.key_prefix + '/'))
+
+    @mock.patch('drf_to_s3.s3.copy')
+    def test_that_completion_accepts_key_under_key_prefix(self, copy):
+        notification = {
+            'key': self.key_prefix + '/foo/bar/baz',
+            'filename': 'baz.jpg',
+        }
+        resp = self.client.post('/s3/api_uploaded', notification)
+        self.assertEquals(resp.status_code, status.HTTP_200_OK)
+        self.assertRegexpMatches(copy.call_args[1]['dst_key'], r'^[0-9a-f]{4}/[0-9a-f]{32}\.jpg$')
+
+    @mock.patch('drf_to_s3.s3.copy')
+    def test_that_completion_rejects_key_without_shard(self, copy):
+        notification = {
+            'key': self.username + '/foo/bar/baz',
+            'filename': 'baz.jpg',
+        }
+        resp = self.client.post('/s3/api_uploaded', notification)
+        self.assertEquals(resp.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertFalse(copy.called)
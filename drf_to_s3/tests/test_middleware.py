@@ -53,3 +53,48 @@ class TestLogin(TestCase):
         resp = self.client.post('/api-auth/login/', data)
         self.assertNotIn('upload_prefix', resp.cookies)
         self.assertEquals(resp.cookies['my-app-prefix-cookie'].value, self.username)
+
+    @override_settings(
+        MIDDLEWARE_CLASSES=settings.MIDDLEWARE_CLASSES + ('drf_to_s3.middleware.UploadPrefixMiddleware',),
+        AWS_UPLOAD_KEY_LAYOUT='drf_to_s3.key_layout.HashedKeyLayout',
+    )
+    def test_login_view_sets_key_prefix_of_layout(self):
+        from drf_to_s3.key_layout import HashedKeyLayout
+        data = {
+            'username': self.username,
+            'password': self.password,
+        }
+        resp = self.client.post('/api-auth/login/', data)
+        self.assertEquals(
+            resp.cookies['upload_prefix'].value,
+            HashedKeyLayout().key_prefix(self.username)
+        )
+
+    @override_settings(
+        MIDDLEWARE_CLASSES=settings.MIDDLEWARE_CLASSES + ('drf_to_s3.middleware.UploadPrefixMiddleware',)
+    )
+    def test_login_view_does_not_set_upload_bucket_cookie_without_routing(self):
+        data = {
+            'username': self.username,
+            'password': self.password,
+        }
+        resp = self.client.post('/api-auth/login/', data)
+        self.assertNotIn('upload_bucket', resp.cookies)
+
+    @override_settings(
+        MIDDLEWARE_CLASSES=settings.MIDDLEWARE_CLASSES + ('drf_to_s3.middleware.UploadPrefixMiddleware',),
+        AWS_UPLOAD_BUCKETS=['uploads-a', 'uploads-b', 'uploads-c'],
+        UPLOAD_BUCKET_COOKIE_NAME='my-app-bucket-cookie',
+    )
+    def test_login_view_sets_routed_upload_bucket_cookie(self):
+        from drf_to_s3 import routing
+        data = {
+            'username': self.username,
+            'password': self.password,
+        }
+        resp = self.client.post('/api-auth/login/', data)
+        self.assertNotIn('upload_bucket', resp.cookies)
+        self.assertEquals(
+            resp.cookies['my-app-bucket-cookie'].value,
+            routing.upload_bucket_for_prefix(self.username)
+        )
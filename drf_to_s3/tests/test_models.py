@@ -0,0 +1,85 @@
+import unittest
+
+
+class PolicyTest(unittest.TestCase):
+
+    def setUp(self):
+        from drf_to_s3.models import Policy, PolicyCondition
+        self.policy = Policy(conditions=[
+            PolicyCondition(element_name='acl', value='private'),
+            PolicyCondition(element_name='key', value='uploads/foo'),
+            PolicyCondition(element_name='key', value='uploads/bar'),
+            PolicyCondition(element_name='content-length-range', value_range=[1024, 10240]),
+        ])
+
+    def test_that_getitem_returns_first_matching_condition(self):
+        self.assertEquals(self.policy['acl'].value, 'private')
+        self.assertEquals(self.policy['key'].value, 'uploads/foo')
+
+    def test_that_getitem_raises_attribute_error_for_missing_condition(self):
+        with self.assertRaises(AttributeError):
+            self.policy['bucket']
+
+    def test_that_index_follows_replaced_conditions(self):
+        from drf_to_s3.models import PolicyCondition
+        self.policy.conditions = [PolicyCondition(element_name='bucket', value='my-bucket')]
+        self.assertEquals(self.policy['bucket'].value, 'my-bucket')
+        with self.assertRaises(AttributeError):
+            self.policy['acl']
+
+    def test_that_models_have_no_instance_dict(self):
+        with self.assertRaises(AttributeError):
+            self.policy.foo = 'bar'
+        with self.assertRaises(AttributeError):
+            self.policy['acl'].foo = 'bar'
+
+    def test_that_frozen_policy_is_immutable_and_hashable(self):
+        frozen = self.policy.freeze()
+        self.assertEquals(frozen['key'].value, 'uploads/foo')
+        self.assertEquals(frozen['content-length-range'].value_range, (1024, 10240))
+        with self.assertRaises(AttributeError):
+            frozen.expiration = None
+        with self.assertRaises(AttributeError):
+            frozen.conditions = []
+        with self.assertRaises(AttributeError):
+            frozen['acl'].value = 'public-read'
+        self.assertEquals(frozen, self.policy.freeze())
+        self.assertEquals(hash(frozen), hash(self.policy.freeze()))
+        self.assertIs(frozen.freeze(), frozen)
+
+    def test_that_frozen_policy_serializes_like_policy(self):
+        from drf_to_s3.naive_serializers import NaivePolicySerializer
+        self.assertEquals(
+            NaivePolicySerializer(self.policy).data,
+            NaivePolicySerializer(self.policy.freeze()).data
+        )
+
+    def test_that_models_pickle_with_every_protocol(self):
+        import datetime, pickle
+        from drf_to_s3.models import FrozenPolicy, FrozenPolicyCondition, Policy, PolicyCondition
+        self.policy.expiration = datetime.datetime(2014, 4, 1, 12, 0)
+        frozen = self.policy.freeze()
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            policy = pickle.loads(pickle.dumps(self.policy, protocol))
+            self.assertIs(type(policy), Policy)
+            self.assertIs(type(policy['acl']), PolicyCondition)
+            self.assertEquals(policy.expiration, self.policy.expiration)
+            self.assertEquals(policy['key'].value, 'uploads/foo')
+            self.assertEquals(policy.freeze(), frozen)
+
+            frozen_copy = pickle.loads(pickle.dumps(frozen, protocol))
+            self.assertIs(type(frozen_copy), FrozenPolicy)
+            self.assertIs(type(frozen_copy['acl']), FrozenPolicyCondition)
+            self.assertEquals(frozen_copy, frozen)
+            self.assertEquals(hash(frozen_copy), hash(frozen))
+            with self.assertRaises(AttributeError):
+                frozen_copy.expiration = None
+
+    def test_that_frozen_policy_round_trips_through_cache(self):
+        from django.core.cache import get_cache
+        cache = get_cache('django.core.cache.backends.locmem.LocMemCache')
+        frozen = self.policy.freeze()
+        cache.set('policy', frozen)
+        self.assertEquals(cache.get('policy'), frozen)
+        cache.set('policy', self.policy)
+        self.assertEquals(cache.get('policy')['key'].value, 'uploads/foo')
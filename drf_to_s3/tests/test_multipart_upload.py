@@ -0,0 +1,375 @@
+import datetime, json, mock, unittest
+from django.conf.urls import include, patterns, url
+from django.test.utils import override_settings
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.test import APITestCase
+
+
+class MultipartUploadS3Test(unittest.TestCase):
+
+    def setUp(self):
+        from drf_to_s3 import s3
+        self.connection = mock.MagicMock()
+        self.bucket = self.connection.get_bucket.return_value
+        self.pool = s3.S3ConnectionPool(connect=lambda: self.connection)
+
+    def test_that_initiate_returns_upload_id(self):
+        from drf_to_s3 import s3
+        self.bucket.initiate_multipart_upload.return_value.id = 'abcde'
+        upload_id = s3.initiate_multipart_upload('my-bucket', 'frodo/foo', connection_pool=self.pool)
+        self.assertEquals(upload_id, 'abcde')
+        self.bucket.initiate_multipart_upload.assert_called_once_with('frodo/foo', policy='private')
+
+    def test_that_complete_sends_sorted_escaped_parts(self):
+        from drf_to_s3 import s3
+        s3.complete_multipart_upload(
+            'my-bucket', 'frodo/foo', 'abcde', [(2, '"b<"'), (1, '"a"')],
+            connection_pool=self.pool
+        )
+        self.bucket.complete_multipart_upload.assert_called_once_with(
+            'frodo/foo',
+            'abcde',
+            '<CompleteMultipartUpload>'
+            '<Part><PartNumber>1</PartNumber><ETag>"a"</ETag></Part>'
+            '<Part><PartNumber>2</PartNumber><ETag>"b&lt;"</ETag></Part>'
+            '</CompleteMultipartUpload>'
+        )
+
+    def test_that_complete_maps_bad_parts_to_api_exception(self):
+        from boto.exception import S3ResponseError
+        from drf_to_s3 import s3
+        self.bucket.complete_multipart_upload.side_effect = S3ResponseError(400, 'Bad Request')
+        with self.assertRaises(s3.InvalidMultipartUploadException):
+            s3.complete_multipart_upload(
+                'my-bucket', 'frodo/foo', 'abcde', [(1, '"a"')],
+                connection_pool=self.pool
+            )
+
+    def test_that_abort_maps_missing_upload_to_api_exception(self):
+        from boto.exception import S3ResponseError
+        from drf_to_s3 import s3
+        self.bucket.cancel_multipart_upload.side_effect = S3ResponseError(404, 'Not Found')
+        with self.assertRaises(s3.InvalidMultipartUploadException):
+            s3.abort_multipart_upload('my-bucket', 'frodo/foo', 'abcde', connection_pool=self.pool)
+
+    def test_that_part_uri_signs_part_number_and_upload_id(self):
+        import urlparse
+        from drf_to_s3 import s3
+        now = datetime.datetime(2014, 1, 1)
+        uri = s3.build_signed_upload_part_uri(
+            bucket='my-bucket',
+            key='frodo/foo',
+            upload_id='abcde',
+            part_number=3,
+            access_key_id='12345',
+            secret_key='67890',
+            expire_after_seconds=300,
+            now=now
+        )
+        params = urlparse.parse_qs(urlparse.urlparse(uri).query)
+        self.assertEquals(params['partNumber'], ['3'])
+        self.assertEquals(params['uploadId'], ['abcde'])
+        expected = s3.sign_rest_request(
+            '67890',
+            method='PUT',
+            expires=params['Expires'][0],
+            canonicalized_resource='/my-bucket/frodo/foo?partNumber=3&uploadId=abcde'
+        )
+        self.assertEquals(params['Signature'], [expected.strip()])
+
+
+class MultipartUploadSerializerTest(unittest.TestCase):
+
+    def test_that_part_numbers_are_validated(self):
+        from drf_to_s3.naive_serializers import MultipartUploadPartsSerializer
+        for part_numbers in [[], [0], [10001], ['1'], [1, 1], 'foo']:
+            serializer = MultipartUploadPartsSerializer(data={
+                'key': 'frodo/foo',
+                'upload_id': 'abcde',
+                'part_numbers': part_numbers,
+            })
+            self.assertFalse(serializer.is_valid())
+            self.assertIn('part_numbers', serializer.errors)
+
+    def test_that_parts_restore_to_tuples(self):
+        from drf_to_s3.naive_serializers import MultipartUploadCompletionSerializer
+        serializer = MultipartUploadCompletionSerializer(data={
+            'key': 'frodo/foo',
+            'filename': 'foo.txt',
+            'upload_id': 'abcde',
+            'parts': [{'part_number': 1, 'etag': '"a"'}, {'part_number': 2, 'etag': '"b"'}],
+        })
+        self.assertTrue(serializer.is_valid())
+        self.assertEquals(serializer.object['parts'], [(1, '"a"'), (2, '"b"')])
+
+    def test_that_parts_without_etag_are_invalid(self):
+        from drf_to_s3.naive_serializers import MultipartUploadCompletionSerializer
+        serializer = MultipartUploadCompletionSerializer(data={
+            'key': 'frodo/foo',
+            'filename': 'foo.txt',
+            'upload_id': 'abcde',
+            'parts': [{'part_number': 1}],
+        })
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('parts', serializer.errors)
+
+
+@override_settings(
+    AWS_UPLOAD_SECRET_ACCESS_KEY='12345',
+    AWS_UPLOAD_ACCESS_KEY_ID='67890',
+    AWS_UPLOAD_BUCKET='my-upload-bucket',
+    AWS_STORAGE_BUCKET_NAME='my-storage-bucket',
+    APPEND_SLASH=False # Work around a Django bug: https://code.djangoproject.com/ticket/21766
+)
+class MultipartUploadViewTest(APITestCase):
+    from drf_to_s3.views.api_client_views import MultipartUploadCompletionView
+
+    urls = patterns('',
+        url(r'^', include('drf_to_s3.urls')),
+        url(r'^multipart_upload/complete$', MultipartUploadCompletionView.as_view()),
+    )
+
+    def setUp(self):
+        from .util import get_user_model
+        self.username = 'frodo'
+        self.password = 'shire1234'
+        get_user_model().objects.create_user(
+            username=self.username,
+            password=self.password
+        )
+        self.client.login(
+            username=self.username,
+            password=self.password
+        )
+
+    @mock.patch('drf_to_s3.s3.initiate_multipart_upload')
+    def test_that_initiate_returns_key_under_prefix(self, initiate_multipart_upload):
+        initiate_multipart_upload.return_value = 'abcde'
+        resp = self.client.post('/multipart_upload')
+        self.assertEquals(resp.status_code, status.HTTP_200_OK)
+        content = json.loads(resp.content)
+        self.assertEquals(content['upload_id'], 'abcde')
+        self.assertTrue(content['key'].startswith(self.username + '/'))
+        initiate_multipart_upload.assert_called_once_with('my-upload-bucket', content['key'])
+
+    def test_that_part_uris_are_returned_in_order(self):
+        import urlparse
+        resp = self.client.post('/multipart_upload/parts', {
+            'key': self.username + '/foo',
+            'upload_id': 'abcde',
+            'part_numbers': [3, 1, 2],
+        }, format='json')
+        self.assertEquals(resp.status_code, status.HTTP_200_OK)
+        parts = json.loads(resp.content)['parts']
+        self.assertEquals([part['part_number'] for part in parts], [3, 1, 2])
+        for part in parts:
+            params = urlparse.parse_qs(urlparse.urlparse(part['upload_uri']).query)
+            self.assertEquals(params['partNumber'], [str(part['part_number'])])
+            self.assertEquals(params['uploadId'], ['abcde'])
+
+    @override_settings(
+        AWS_UPLOAD_SIGNATURE_VERSION=4,
+        AWS_UPLOAD_REGION='eu-west-1',
+    )
+    def test_that_part_uris_sign_with_signature_version_4(self):
+        resp = self.client.post('/multipart_upload/parts', {
+            'key': self.username + '/foo',
+            'upload_id': 'abcde',
+            'part_numbers': [1],
+        }, format='json')
+        self.assertEquals(resp.status_code, status.HTTP_200_OK)
+        upload_uri = json.loads(resp.content)['parts'][0]['upload_uri']
+        self.assertTrue(upload_uri.startswith('https://my-upload-bucket.s3.eu-west-1.amazonaws.com/frodo/foo?'))
+        self.assertIn('X-Amz-Signature=', upload_uri)
+
+    def test_that_part_uris_resolve_endpoint_once_per_request(self):
+        from drf_to_s3.views.api_client_views import MultipartUploadPartURIView
+        with mock.patch.object(MultipartUploadPartURIView, 'get_endpoint', wraps=lambda: None) as get_endpoint:
+            resp = self.client.post('/multipart_upload/parts', {
+                'key': self.username + '/foo',
+                'upload_id': 'abcde',
+                'part_numbers': [1, 2, 3],
+            }, format='json')
+        self.assertEquals(resp.status_code, status.HTTP_200_OK)
+        self.assertEquals(len(json.loads(resp.content)['parts']), 3)
+        self.assertEquals(get_endpoint.call_count, 1)
+
+    def test_that_region_hint_ignores_body_which_is_not_an_object(self):
+        from drf_to_s3.views.api_client_views import MultipartUploadPartURIView
+        view = MultipartUploadPartURIView()
+        for data in [[{'region': 'ap-southeast-2'}], 'ap-southeast-2', 5]:
+            self.assertIsNone(view.get_region_hint(mock.Mock(DATA=data)))
+
+    def test_that_part_uris_for_other_users_keys_are_forbidden(self):
+        resp = self.client.post('/multipart_upload/parts', {
+            'key': 'samwise/foo',
+            'upload_id': 'abcde',
+            'part_numbers': [1],
+        }, format='json')
+        self.assertEquals(resp.status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(AWS_UPLOAD_MAX_URIS_PER_REQUEST=2)
+    def test_that_too_many_parts_is_an_error(self):
+        resp = self.client.post('/multipart_upload/parts', {
+            'key': self.username + '/foo',
+            'upload_id': 'abcde',
+            'part_numbers': [1, 2, 3],
+        }, format='json')
+        self.assertEquals(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @mock.patch('drf_to_s3.s3.abort_multipart_upload')
+    def test_that_abort_aborts_upload(self, abort_multipart_upload):
+        resp = self.client.post('/multipart_upload/abort', {
+            'key': self.username + '/foo',
+            'upload_id': 'abcde',
+        }, format='json')
+        self.assertEquals(resp.status_code, status.HTTP_200_OK)
+        abort_multipart_upload.assert_called_once_with('my-upload-bucket', self.username + '/foo', 'abcde')
+
+    @mock.patch('drf_to_s3.s3.abort_multipart_upload')
+    def test_that_abort_for_other_users_keys_is_forbidden(self, abort_multipart_upload):
+        resp = self.client.post('/multipart_upload/abort', {
+            'key': 'samwise/foo',
+            'upload_id': 'abcde',
+        }, format='json')
+        self.assertEquals(resp.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertFalse(abort_multipart_upload.called)
+
+    @mock.patch('uuid.uuid4')
+    @mock.patch('drf_to_s3.s3.copy')
+    @mock.patch('drf_to_s3.s3.complete_multipart_upload')
+    def test_that_completion_completes_upload_and_copies(self, complete_multipart_upload, copy, uuid4):
+        uuid4.return_value = 'e551ad1e-ae1c-4a4f-9d2b-1b7a7e5b7bb1'
+        resp = self.client.post('/multipart_upload/complete', {
+            'key': self.username + '/foo',
+            'filename': 'foo.txt',
+            'upload_id': 'abcde',
+            'parts': [{'part_number': 1, 'etag': '"a"'}],
+        }, format='json')
+        self.assertEquals(resp.status_code, status.HTTP_200_OK)
+        complete_multipart_upload.assert_called_once_with(
+            'my-upload-bucket', self.username + '/foo', 'abcde', [(1, '"a"')])
+        copy.assert_called_once_with(
+            src_bucket='my-upload-bucket',
+            src_key=self.username + '/foo',
+            dst_bucket='my-storage-bucket',
+            dst_key='e551ad1e-ae1c-4a4f-9d2b-1b7a7e5b7bb1.txt'
+        )
+
+    @mock.patch('drf_to_s3.s3.copy')
+    @mock.patch('drf_to_s3.s3.complete_multipart_upload')
+    def test_that_failed_completion_skips_copy(self, complete_multipart_upload, copy):
+        from drf_to_s3 import s3
+        complete_multipart_upload.side_effect = s3.InvalidMultipartUploadException
+        resp = self.client.post('/multipart_upload/complete', {
+            'key': self.username + '/foo',
+            'filename': 'foo.txt',
+            'upload_id': 'abcde',
+            'parts': [{'part_number': 1, 'etag': '"a"'}],
+        }, format='json')
+        self.assertEquals(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(copy.called)
+
+    @mock.patch('drf_to_s3.s3.copy_async')
+    @mock.patch('drf_to_s3.s3.complete_multipart_upload')
+    def test_that_batch_completion_reports_each_upload(self, complete_multipart_upload, copy_async):
+        from drf_to_s3 import s3
+        def complete(bucket, key, upload_id, parts):
+            if upload_id == 'bad':
+                raise s3.InvalidMultipartUploadException()
+        complete_multipart_upload.side_effect = complete
+        resp = self.client.post('/multipart_upload/complete', [
+            {
+                'key': self.username + '/foo',
+                'filename': 'foo.txt',
+                'upload_id': 'bad',
+                'parts': [{'part_number': 1, 'etag': '"a"'}],
+            },
+            {
+                'key': self.username + '/bar',
+                'filename': 'bar.txt',
+                'upload_id': 'good',
+                'parts': [{'part_number': 1, 'etag': '"b"'}],
+            },
+        ], format='json')
+        self.assertEquals(resp.status_code, status.HTTP_200_OK)
+        results = json.loads(resp.content)['results']
+        self.assertEquals(results[0], {'invalid': True, 'error': 'Invalid upload id or parts'})
+        self.assertEquals(results[1], {'success': True})
+        self.assertEquals(copy_async.call_count, 1)
+
+
+@override_settings(
+    AWS_UPLOAD_SECRET_ACCESS_KEY='12345',
+    AWS_UPLOAD_ACCESS_KEY_ID='67890',
+    AWS_UPLOAD_BUCKET='my-upload-bucket',
+    AWS_STORAGE_BUCKET_NAME='my-storage-bucket',
+    APPEND_SLASH=False # Work around a Django bug: https://code.djangoproject.com/ticket/21766
+)
+class MultipartUploadCompletionViewSubclassTest(APITestCase):
+    from drf_to_s3.views.api_client_views import MultipartUploadCompletionView
+
+    class CompletionView(MultipartUploadCompletionView):
+        def handle_upload(self, request, serializer, obj, bucket, key, filename):
+            from drf_to_s3.views.api_client_views import MultipartUploadCompletionView
+            MultipartUploadCompletionView.handle_upload(
+                self, request, serializer, obj, bucket, key, filename)
+            return Response({'filename': filename}, status=status.HTTP_200_OK)
+
+    urls = patterns('',
+        url(r'^multipart_upload/complete$', CompletionView.as_view()),
+    )
+
+    def setUp(self):
+        from .util import get_user_model
+        self.username = 'frodo'
+        self.password = 'shire1234'
+        get_user_model().objects.create_user(
+            username=self.username,
+            password=self.password
+        )
+        self.client.login(
+            username=self.username,
+            password=self.password
+        )
+
+    @mock.patch('drf_to_s3.s3.copy')
+    @mock.patch('drf_to_s3.s3.complete_multipart_upload')
+    def test_that_batch_completes_each_upload_once(self, complete_multipart_upload, copy):
+        resp = self.client.post('/multipart_upload/complete', [
+            {
+                'key': self.username + '/foo',
+                'filename': 'foo.txt',
+                'upload_id': 'abcde',
+                'parts': [{'part_number': 1, 'etag': '"a"'}],
+            },
+            {
+                'key': self.username + '/bar',
+                'filename': 'bar.txt',
+                'upload_id': 'fghij',
+                'parts': [{'part_number': 1, 'etag': '"b"'}],
+            },
+        ], format='json')
+        self.assertEquals(resp.status_code, status.HTTP_200_OK)
+        results = json.loads(resp.content)['results']
+        self.assertEquals(results, [
+            {'success': True, 'filename': 'foo.txt'},
+            {'success': True, 'filename': 'bar.txt'},
+        ])
+        self.assertEquals(sorted(call[0][2] for call in complete_multipart_upload.call_args_list),
+                          ['abcde', 'fghij'])
+        self.assertEquals(copy.call_count, 2)
+
+    @mock.patch('drf_to_s3.s3.copy')
+    @mock.patch('drf_to_s3.s3.complete_multipart_upload')
+    def test_that_single_upload_completes_once(self, complete_multipart_upload, copy):
+        resp = self.client.post('/multipart_upload/complete', {
+            'key': self.username + '/foo',
+            'filename': 'foo.txt',
+            'upload_id': 'abcde',
+            'parts': [{'part_number': 1, 'etag': '"a"'}],
+        }, format='json')
+        self.assertEquals(resp.status_code, status.HTTP_200_OK)
+        self.assertEquals(complete_multipart_upload.call_count, 1)
+        self.assertEquals(copy.call_count, 1)
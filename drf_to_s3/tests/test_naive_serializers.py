@@ -261,6 +261,24 @@ class NaivePolicySerializerTest(unittest.TestCase):
         self.assertTrue(serializer.validate_condition_bucket.called)
         self.assertTrue(serializer.validate_condition_foo.called)
 
+    def test_that_subclass_validator_for_unlisted_hyphenated_condition_is_invoked(self):
+        class CustomPolicySerializer(self.serializer_class):
+            def validate_condition_x_amz_meta_owner(self, condition):
+                if condition.value != 'frodo':
+                    raise ValidationError('Invalid owner')
+        data = {
+            'expiration': '2007-12-01T12:00:00.000Z',
+            'conditions': [
+                {'bucket': 'johnsmith'},
+                {'x-amz-meta-owner': 'samwise'},
+            ]
+        }
+        serializer = CustomPolicySerializer(data=data)
+        serializer.optional_conditions = ['x-amz-meta-owner']
+        self.assertNotIn('x-amz-meta-owner', CustomPolicySerializer.condition_validators)
+        self.assertFalse(serializer.is_valid())
+        self.assertEquals(serializer.errors['conditions.x-amz-meta-owner'], ['Invalid owner'])
+
     # FIXME Test that errors generated by condition validation methods
     # are returned
 
@@ -0,0 +1,154 @@
+import json, mock, unittest
+from django.conf.urls import patterns, url
+from django.test.utils import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+
+class BucketRingTest(unittest.TestCase):
+
+    def test_that_bucket_for_is_deterministic(self):
+        from drf_to_s3.routing import BucketRing
+        ring = BucketRing(['bucket-a', 'bucket-b', 'bucket-c'])
+        other_ring = BucketRing(['bucket-a', 'bucket-b', 'bucket-c'])
+        for i in range(100):
+            prefix = 'user-%d' % i
+            self.assertEquals(ring.bucket_for(prefix), other_ring.bucket_for(prefix))
+
+    def test_that_every_bucket_gets_users(self):
+        from collections import Counter
+        from drf_to_s3.routing import BucketRing
+        ring = BucketRing(['bucket-a', 'bucket-b', 'bucket-c'])
+        counts = Counter(ring.bucket_for('user-%d' % i) for i in range(3000))
+        self.assertEquals(set(counts), set(['bucket-a', 'bucket-b', 'bucket-c']))
+        for count in counts.values():
+            self.assertGreater(count, 600)
+
+    def test_that_adding_a_bucket_moves_a_fraction_of_users(self):
+        from drf_to_s3.routing import BucketRing
+        before = BucketRing(['bucket-a', 'bucket-b', 'bucket-c'])
+        after = BucketRing(['bucket-a', 'bucket-b', 'bucket-c', 'bucket-d'])
+        prefixes = ['user-%d' % i for i in range(3000)]
+        moved = [prefix for prefix in prefixes if before.bucket_for(prefix) != after.bucket_for(prefix)]
+        self.assertLess(len(moved), len(prefixes) * 0.4)
+        for prefix in moved:
+            self.assertEquals(after.bucket_for(prefix), 'bucket-d')
+
+    def test_that_unicode_prefixes_are_accepted(self):
+        from drf_to_s3.routing import BucketRing
+        ring = BucketRing(['bucket-a', 'bucket-b'])
+        self.assertEquals(ring.bucket_for(u'caf\xe9'), ring.bucket_for(u'caf\xe9'.encode('utf-8')))
+
+    def test_that_empty_ring_is_rejected(self):
+        from drf_to_s3.routing import BucketRing
+        with self.assertRaises(ValueError):
+            BucketRing([])
+
+
+class RoutingSettingsTest(unittest.TestCase):
+
+    @override_settings(AWS_UPLOAD_BUCKET='my-bucket', AWS_UPLOAD_BUCKETS=None)
+    def test_that_single_bucket_is_used_without_upload_buckets(self):
+        from drf_to_s3.routing import upload_bucket_for_prefix
+        self.assertEquals(upload_bucket_for_prefix('frodo'), 'my-bucket')
+
+    @override_settings(
+        AWS_UPLOAD_REGION='us-east-1',
+        AWS_UPLOAD_BUCKET_REGIONS={'bucket-eu': 'eu-west-1'},
+    )
+    def test_that_region_for_bucket_falls_back_to_upload_region(self):
+        from drf_to_s3.routing import region_for_bucket
+        self.assertEquals(region_for_bucket('bucket-eu'), 'eu-west-1')
+        self.assertEquals(region_for_bucket('bucket-us'), 'us-east-1')
+
+
+UPLOAD_BUCKETS = ['upload-a', 'upload-b', 'upload-c', 'upload-d']
+STORAGE_BUCKETS = ['storage-a', 'storage-b']
+
+
+@override_settings(
+    AWS_UPLOAD_SECRET_ACCESS_KEY='12345',
+    AWS_UPLOAD_ACCESS_KEY_ID='67890',
+    AWS_UPLOAD_BUCKET='upload-a',
+    AWS_UPLOAD_BUCKETS=UPLOAD_BUCKETS,
+    AWS_STORAGE_BUCKET_NAME='storage-a',
+    AWS_STORAGE_BUCKETS=STORAGE_BUCKETS,
+    APPEND_SLASH=False # Work around a Django bug: https://code.djangoproject.com/ticket/21766
+)
+class RoutedViewsTest(APITestCase):
+    from drf_to_s3.views import api_client_views, fine_uploader_views
+    urls = patterns('',
+        url(r'^sign$', fine_uploader_views.FineSignPolicyView.as_view()),
+        url(r'^upload_uri$', api_client_views.SignedPutURIView.as_view()),
+        url(r'^s3/api_uploaded$', api_client_views.APIUploadCompletionView.as_view()),
+    )
+
+    def setUp(self):
+        from .util import get_user_model
+        from drf_to_s3 import routing
+        self.username = 'frodo'
+        self.password = 'shire1234'
+        get_user_model().objects.create_user(
+            username=self.username,
+            password=self.password
+        )
+        self.client.login(
+            username=self.username,
+            password=self.password
+        )
+        self.upload_bucket = routing.get_ring(UPLOAD_BUCKETS).bucket_for(self.username)
+        self.other_bucket = [bucket for bucket in UPLOAD_BUCKETS if bucket != self.upload_bucket][0]
+        self.storage_bucket = routing.get_ring(STORAGE_BUCKETS).bucket_for(self.username)
+
+    def policy_document(self, bucket):
+        return {
+            "expiration": "2007-12-01T12:00:00.000Z",
+            "conditions": [
+                {"acl": "private"},
+                {"bucket": bucket},
+                {"Content-Type": "image/jpeg"},
+                {"success_action_status": 200},
+                {"success_action_redirect": "http://example.com/foo/bar"},
+                {"key": self.username + "/foo/bar/baz.jpg"},
+                {"x-amz-meta-qqfilename": "baz.jpg"},
+                ["content-length-range", 1024, 10240]
+            ]
+        }
+
+    def test_that_sign_accepts_routed_bucket(self):
+        resp = self.client.post('/sign', self.policy_document(self.upload_bucket), format='json')
+        self.assertEquals(resp.status_code, status.HTTP_200_OK)
+        self.assertNotIn('invalid', json.loads(resp.content))
+
+    def test_that_sign_rejects_other_bucket(self):
+        resp = self.client.post('/sign', self.policy_document(self.other_bucket), format='json')
+        self.assertEquals(resp.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_that_upload_uri_uses_routed_bucket(self):
+        resp = self.client.post('/upload_uri')
+        self.assertEquals(resp.status_code, status.HTTP_200_OK)
+        content = json.loads(resp.content)
+        self.assertTrue(content['upload_uri'].startswith('https://%s.s3.amazonaws.com/' % self.upload_bucket))
+
+    def test_that_upload_uri_signs_for_routed_bucket_region(self):
+        with self.settings(AWS_UPLOAD_SIGNATURE_VERSION=4, AWS_UPLOAD_BUCKET_REGIONS={self.upload_bucket: 'eu-west-1'}):
+            resp = self.client.post('/upload_uri')
+        self.assertEquals(resp.status_code, status.HTTP_200_OK)
+        content = json.loads(resp.content)
+        self.assertTrue(content['upload_uri'].startswith('https://%s.s3.eu-west-1.amazonaws.com/' % self.upload_bucket))
+        self.assertIn('%2Feu-west-1%2Fs3%2F', content['upload_uri'])
+
+    @mock.patch('drf_to_s3.s3.copy')
+    def test_that_completion_copies_between_routed_buckets(self, copy):
+        notification = {
+            'key': self.username + '/foo/bar/baz',
+            'filename': 'baz',
+        }
+        resp = self.client.post('/s3/api_uploaded', notification)
+        self.assertEquals(resp.status_code, status.HTTP_200_OK)
+        copy.assert_called_once_with(
+            src_bucket=self.upload_bucket,
+            src_key=self.username + '/foo/bar/baz',
+            dst_bucket=self.storage_bucket,
+            dst_key=mock.ANY
+        )
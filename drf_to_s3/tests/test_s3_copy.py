@@ -0,0 +1,312 @@
+import mock, unittest
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+
+
+class S3ConnectionPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        from drf_to_s3 import s3
+        self.connect = mock.MagicMock(side_effect=lambda: mock.MagicMock())
+        self.pool = s3.S3ConnectionPool(size=2, idle_timeout=60, connect=self.connect)
+
+    def test_that_released_connection_is_reused(self):
+        first = self.pool.acquire()
+        self.pool.release(first)
+        second = self.pool.acquire()
+        self.assertIs(first, second)
+        self.assertEquals(self.connect.call_count, 1)
+
+    def test_that_concurrent_checkouts_get_separate_connections(self):
+        first = self.pool.acquire()
+        second = self.pool.acquire()
+        self.assertIsNot(first.connection, second.connection)
+        self.assertEquals(self.connect.call_count, 2)
+
+    def test_that_connections_beyond_size_are_closed_on_release(self):
+        checked_out = [self.pool.acquire() for i in range(3)]
+        for pooled in checked_out:
+            self.pool.release(pooled)
+        self.assertTrue(checked_out[2].connection.close.called)
+        self.assertFalse(checked_out[0].connection.close.called)
+
+    @mock.patch('time.time')
+    def test_that_idle_connections_expire(self, time):
+        time.return_value = 1000
+        first = self.pool.acquire()
+        self.pool.release(first)
+        time.return_value = 1061
+        second = self.pool.acquire()
+        self.assertIsNot(first, second)
+        self.assertTrue(first.connection.close.called)
+
+    def test_that_bucket_handle_is_cached_without_validation(self):
+        with self.pool.bucket('my-bucket') as bucket:
+            pass
+        with self.pool.bucket('my-bucket') as bucket_again:
+            pass
+        self.assertIs(bucket, bucket_again)
+        self.assertEquals(self.connect.call_count, 1)
+
+    def test_that_connection_is_discarded_after_unexpected_error(self):
+        with self.assertRaises(ValueError):
+            with self.pool.bucket('my-bucket'):
+                raise ValueError()
+        self.pool.acquire()
+        self.assertEquals(self.connect.call_count, 2)
+
+    def test_that_connection_is_kept_after_s3_error(self):
+        from boto.exception import S3ResponseError
+        with self.assertRaises(S3ResponseError):
+            with self.pool.bucket('my-bucket'):
+                raise S3ResponseError(404, 'Not Found')
+        self.pool.acquire()
+        self.assertEquals(self.connect.call_count, 1)
+
+
+class CopyTest(unittest.TestCase):
+
+    def setUp(self):
+        from drf_to_s3 import s3
+        self.bucket = mock.MagicMock()
+        self.connection = mock.MagicMock()
+        self.connection.get_bucket.return_value = self.bucket
+        self.pool = s3.S3ConnectionPool(connect=lambda: self.connection)
+
+    def test_that_copy_uses_pooled_bucket(self):
+        from drf_to_s3 import s3
+        for i in range(2):
+            s3.copy(
+                src_bucket='my-upload-bucket',
+                src_key='uploads/foo',
+                dst_bucket='my-storage-bucket',
+                dst_key='bar',
+                connection_pool=self.pool
+            )
+        self.connection.get_bucket.assert_called_once_with('my-storage-bucket', validate=False)
+        self.assertEquals(self.bucket.copy_key.call_count, 2)
+
+    def test_that_copy_sends_etag_precondition(self):
+        from drf_to_s3 import s3
+        s3.copy(
+            src_bucket='my-upload-bucket',
+            src_key='uploads/foo',
+            dst_bucket='my-storage-bucket',
+            dst_key='bar',
+            src_etag='12345',
+            validate_src_etag=True,
+            connection_pool=self.pool
+        )
+        self.bucket.copy_key.assert_called_once_with(
+            new_key_name='bar',
+            src_bucket_name='my-upload-bucket',
+            src_key_name='uploads/foo',
+            headers={'x-amz-copy-source-if-match': '12345'}
+        )
+
+    def test_that_copy_maps_precondition_failure(self):
+        from boto.exception import S3ResponseError
+        from drf_to_s3 import s3
+        self.bucket.copy_key.side_effect = S3ResponseError(412, 'Precondition Failed')
+        with self.assertRaises(s3.ObjectNotFoundException):
+            s3.copy(
+                src_bucket='my-upload-bucket',
+                src_key='uploads/foo',
+                dst_bucket='my-storage-bucket',
+                dst_key='bar',
+                src_etag='12345',
+                validate_src_etag=True,
+                connection_pool=self.pool
+            )
+
+
+class CopyAsyncTest(unittest.TestCase):
+
+    @mock.patch('drf_to_s3.s3.copy')
+    def test_that_copy_async_runs_copy(self, copy):
+        from drf_to_s3 import s3
+        result = s3.copy_async(
+            src_bucket='my-upload-bucket',
+            src_key='uploads/foo',
+            dst_bucket='my-storage-bucket',
+            dst_key='bar',
+            src_etag='12345',
+            validate_src_etag=True
+        )
+        result.get()
+        copy.assert_called_once_with(
+            src_bucket='my-upload-bucket',
+            src_key='uploads/foo',
+            dst_bucket='my-storage-bucket',
+            dst_key='bar',
+            src_etag='12345',
+            validate_src_etag=True
+        )
+
+    @mock.patch('drf_to_s3.s3.copy')
+    def test_that_copy_async_raises_object_not_found_on_get(self, copy):
+        from drf_to_s3 import s3
+        copy.side_effect = s3.ObjectNotFoundException
+        result = s3.copy_async(
+            src_bucket='my-upload-bucket',
+            src_key='uploads/foo',
+            dst_bucket='my-storage-bucket',
+            dst_key='bar'
+        )
+        with self.assertRaises(s3.ObjectNotFoundException):
+            result.get()
+
+
+@override_settings(
+    AWS_S3_MULTIPART_COPY_THRESHOLD=100 * 1024 * 1024,
+    AWS_S3_MULTIPART_COPY_PART_SIZE=40 * 1024 * 1024,
+)
+class MultipartCopyTest(SimpleTestCase):
+
+    def setUp(self):
+        from drf_to_s3 import s3
+        self.src = mock.MagicMock()
+        self.src.bucket.name = 'my-upload-bucket'
+        self.src.name = 'uploads/foo'
+        self.src.content_type = 'model/ply'
+        self.src.cache_control = None
+        self.src.content_disposition = None
+        self.src.content_encoding = None
+        self.src.content_language = None
+        self.src.metadata = {'qqfilename': 'foo.ply'}
+        self.src_bucket = mock.MagicMock()
+        self.src_bucket.get_key.return_value = self.src
+        self.bucket = mock.MagicMock()
+        self.bucket.name = 'my-storage-bucket'
+        self.bucket.connection.get_bucket.return_value = self.src_bucket
+        self.upload = self.bucket.initiate_multipart_upload.return_value
+        self.upload.key_name = 'bar'
+        self.upload.id = 'abcde'
+        # Parts are copied from several threads, and mock doesn't
+        # record concurrent calls reliably
+        self.copied_parts = []
+        def copy_part_from_key(upload, *args, **kwargs):
+            self.assertEquals((upload.key_name, upload.id), ('bar', 'abcde'))
+            self.copied_parts.append(mock.call(*args, **kwargs))
+        patcher = mock.patch('boto.s3.multipart.MultiPartUpload.copy_part_from_key', copy_part_from_key)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        connection = mock.MagicMock()
+        connection.get_bucket.return_value = self.bucket
+        self.pool = s3.S3ConnectionPool(connect=lambda: connection)
+
+    def copy(self, **kwargs):
+        from drf_to_s3 import s3
+        s3.copy(
+            src_bucket='my-upload-bucket',
+            src_key='uploads/foo',
+            dst_bucket='my-storage-bucket',
+            dst_key='bar',
+            connection_pool=self.pool,
+            **kwargs
+        )
+
+    def test_that_small_object_uses_single_copy(self):
+        self.src.size = 1024
+        self.copy()
+        self.assertTrue(self.bucket.copy_key.called)
+        self.assertFalse(self.bucket.initiate_multipart_upload.called)
+
+    def test_that_large_object_is_copied_in_parts(self):
+        self.src.size = 100 * 1024 * 1024 + 1
+        self.copy(src_etag='12345', validate_src_etag=True)
+        self.assertFalse(self.bucket.copy_key.called)
+        self.bucket.initiate_multipart_upload.assert_called_once_with(
+            'bar',
+            headers={'Content-Type': 'model/ply'},
+            metadata={'qqfilename': 'foo.ply'}
+        )
+        part_size = 40 * 1024 * 1024
+        expected_calls = [
+            mock.call('my-upload-bucket', 'uploads/foo', 1, start=0, end=part_size - 1,
+                      headers={'x-amz-copy-source-if-match': '12345'}),
+            mock.call('my-upload-bucket', 'uploads/foo', 2, start=part_size, end=2 * part_size - 1,
+                      headers={'x-amz-copy-source-if-match': '12345'}),
+            mock.call('my-upload-bucket', 'uploads/foo', 3, start=2 * part_size, end=self.src.size - 1,
+                      headers={'x-amz-copy-source-if-match': '12345'}),
+        ]
+        actual_calls = sorted(self.copied_parts, key=lambda call: call[1][2])
+        self.assertEquals(actual_calls, expected_calls)
+        self.assertTrue(self.upload.complete_upload.called)
+
+    def test_that_large_object_keeps_headers_of_source(self):
+        self.src.size = 100 * 1024 * 1024 + 1
+        self.src.cache_control = 'max-age=3600'
+        self.src.content_disposition = 'attachment; filename="foo.ply"'
+        self.src.content_encoding = 'gzip'
+        self.src.content_language = 'en'
+        self.copy()
+        self.bucket.initiate_multipart_upload.assert_called_once_with(
+            'bar',
+            headers={
+                'Content-Type': 'model/ply',
+                'Cache-Control': 'max-age=3600',
+                'Content-Disposition': 'attachment; filename="foo.ply"',
+                'Content-Encoding': 'gzip',
+                'Content-Language': 'en',
+            },
+            metadata={'qqfilename': 'foo.ply'}
+        )
+
+    @override_settings(AWS_S3_MULTIPART_COPY_CONCURRENCY=3)
+    def test_that_each_part_checks_out_a_pooled_connection(self):
+        self.src.size = 100 * 1024 * 1024 + 1
+        with mock.patch.object(self.pool, 'acquire', wraps=self.pool.acquire) as acquire:
+            with mock.patch.object(self.pool, 'release', wraps=self.pool.release) as release:
+                self.copy()
+        self.assertEquals(len(self.copied_parts), 3)
+        # One for the copy, and one for each part
+        self.assertEquals(acquire.call_count, 4)
+        self.assertEquals(release.call_count, 4)
+
+    def test_that_failed_part_aborts_upload(self):
+        from boto.exception import S3ResponseError
+        from drf_to_s3 import s3
+        self.src.size = 200 * 1024 * 1024
+        def fail(*args, **kwargs):
+            raise S3ResponseError(412, 'Precondition Failed')
+        patcher = mock.patch('boto.s3.multipart.MultiPartUpload.copy_part_from_key', fail)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        with self.assertRaises(s3.ObjectNotFoundException):
+            self.copy(src_etag='12345', validate_src_etag=True)
+        self.assertTrue(self.upload.cancel_upload.called)
+        self.assertFalse(self.upload.complete_upload.called)
+
+    def test_that_missing_object_raises_object_not_found(self):
+        from drf_to_s3 import s3
+        self.src_bucket.get_key.return_value = None
+        with self.assertRaises(s3.ObjectNotFoundException):
+            self.copy()
+
+    def test_that_etag_is_checked_when_finding_size(self):
+        self.src.size = 1024
+        self.copy(src_etag='12345', validate_src_etag=True)
+        self.src_bucket.get_key.assert_called_once_with('uploads/foo', headers={'If-Match': '12345'})
+
+
+class ProcessWidePoolSettingsTest(SimpleTestCase):
+
+    def test_that_connection_pool_follows_settings(self):
+        from drf_to_s3 import s3
+        with override_settings(AWS_S3_CONNECTION_POOL_SIZE=3, AWS_S3_CONNECTION_POOL_IDLE_TIMEOUT=5):
+            pool = s3.get_connection_pool()
+            self.assertEquals((pool.size, pool.idle_timeout), (3, 5))
+            self.assertIs(s3.get_connection_pool(), pool)
+        self.assertIsNot(s3.get_connection_pool(), pool)
+        with override_settings(AWS_S3_CONNECTION_POOL_SIZE=7):
+            self.assertEquals(s3.get_connection_pool().size, 7)
+
+    def test_that_copy_executor_follows_settings(self):
+        from drf_to_s3 import s3
+        with override_settings(AWS_S3_COPY_CONCURRENCY=2):
+            executor = s3.get_copy_executor()
+            self.assertEquals(len(executor._pool), 2)
+            self.assertIs(s3.get_copy_executor(), executor)
+        with override_settings(AWS_S3_COPY_CONCURRENCY=3):
+            self.assertEquals(len(s3.get_copy_executor()._pool), 3)
@@ -262,3 +262,190 @@ class DefaultPolicySerializerTest(unittest.TestCase):
         self.assertFalse(serializer.is_valid())
         expected = ['Required condition is missing']
         self.assertEquals(serializer.errors['conditions.bucket'], expected)
+
+
+class DefaultRESTRequestSerializerTest(unittest.TestCase):
+
+    def setUp(self):
+        from drf_to_s3.serializers import DefaultRESTRequestSerializer
+        self.serializer_class = DefaultRESTRequestSerializer
+        self.date_header = 'x-amz-date:Sat, 01 Feb 2014 12:00:00 GMT'
+
+    def serialize(self, *lines):
+        return self.serializer_class(data={'headers': '\n'.join(lines)})
+
+    def test_that_initiate_request_is_valid(self):
+        serializer = self.serialize(
+            'POST', '', 'image/jpeg', '',
+            'x-amz-acl:private',
+            self.date_header,
+            'x-amz-meta-qqfilename:foo.jpg',
+            '/my-bucket/uploads/foo%7Ebar.jpg?uploads'
+        )
+        self.assertTrue(serializer.is_valid())
+        rest_request = serializer.object
+        self.assertEquals(rest_request.method, 'POST')
+        self.assertEquals(rest_request.bucket, 'my-bucket')
+        self.assertEquals(rest_request.key, 'uploads/foo~bar.jpg')
+        self.assertEquals(rest_request.get_amz_header('x-amz-acl'), 'private')
+        self.assertEquals(rest_request.subresources, [('uploads', None)])
+
+    def test_that_upload_part_request_is_valid(self):
+        serializer = self.serialize(
+            'PUT', '', '', '',
+            self.date_header,
+            '/my-bucket/uploads/foo.jpg?partNumber=3&uploadId=abcde'
+        )
+        self.assertTrue(serializer.is_valid())
+
+    def test_that_other_requests_fail(self):
+        for method, resource in [
+            ('GET', '/my-bucket/uploads/foo.jpg?uploadId=abcde'),
+            ('PUT', '/my-bucket/uploads/foo.jpg'),
+            ('POST', '/my-bucket/uploads/foo.jpg?uploads&acl'),
+            ('PUT', '/my-bucket/uploads/foo.jpg?partNumber=0&uploadId=abcde'),
+            ('DELETE', '/my-bucket/uploads/foo.jpg?uploadId='),
+        ]:
+            serializer = self.serialize(method, '', '', '', self.date_header, resource)
+            self.assertFalse(serializer.is_valid())
+            self.assertIn('headers', serializer.errors)
+
+    def test_that_disallowed_header_fails(self):
+        serializer = self.serialize(
+            'POST', '', '', '',
+            self.date_header,
+            'x-amz-website-redirect-location:http://example.com/',
+            '/my-bucket/uploads/foo.jpg?uploads'
+        )
+        self.assertFalse(serializer.is_valid())
+        self.assertEquals(serializer.errors['headers'], ['Header not allowed: x-amz-website-redirect-location'])
+
+    def test_that_missing_date_fails(self):
+        serializer = self.serialize('DELETE', '', '', '', 'x-amz-acl:private', '/my-bucket/uploads/foo.jpg?uploadId=abcde')
+        self.assertFalse(serializer.is_valid())
+        self.assertEquals(serializer.errors['headers'], ['x-amz-date is required'])
+
+    def test_that_malformed_string_to_sign_fails(self):
+        for lines in [
+            ['PUT', '/my-bucket/foo'],
+            ['PUT', '', '', '', 'Content-Length:5', '/my-bucket/foo?partNumber=1&uploadId=abcde'],
+            ['PUT', '', '', '', self.date_header, 'my-bucket/foo?partNumber=1&uploadId=abcde'],
+            ['PUT', '', '', '', self.date_header, '/my-bucket?partNumber=1&uploadId=abcde'],
+        ]:
+            serializer = self.serialize(*lines)
+            self.assertFalse(serializer.is_valid())
+            self.assertIn('headers', serializer.errors)
+
+
+class PolicySerializerMetaclassTest(unittest.TestCase):
+
+    def test_that_condition_validators_are_compiled_for_the_class(self):
+        from drf_to_s3.serializers import DefaultPolicySerializer
+        self.assertEquals(DefaultPolicySerializer.condition_validators['Content-Type'], 'validate_condition_Content_Type')
+        self.assertEquals(DefaultPolicySerializer.condition_validators['bucket'], 'validate_condition_bucket')
+        self.assertNotIn('acl', DefaultPolicySerializer.condition_validators)
+        self.assertIn('acl', DefaultPolicySerializer.required_condition_set)
+        self.assertIn('Content-Type', DefaultPolicySerializer.allowed_condition_set)
+
+    def test_that_subclass_validators_are_dispatched(self):
+        from drf_to_s3.serializers import DefaultPolicySerializer
+
+        class CustomPolicySerializer(DefaultPolicySerializer):
+            optional_conditions = DefaultPolicySerializer.optional_conditions + ['x-amz-meta-owner']
+
+            def validate_condition_x_amz_meta_owner(self, condition):
+                if condition.value != 'frodo':
+                    raise ValidationError('Invalid owner')
+
+        self.assertEquals(
+            CustomPolicySerializer.condition_validators['x-amz-meta-owner'],
+            'validate_condition_x_amz_meta_owner'
+        )
+        serializer = CustomPolicySerializer(data={
+            'conditions': [
+                {'acl': 'private'},
+                {'bucket': 'my-bucket'},
+                {'key': 'frodo/foo'},
+                {'x-amz-meta-owner': 'samwise'},
+            ]
+        })
+        self.assertFalse(serializer.is_valid())
+        self.assertEquals(serializer.errors, {'conditions.x-amz-meta-owner': ['Invalid owner']})
+
+
+class FastPolicySerializerTest(unittest.TestCase):
+    '''
+    FastPolicySerializer should be indistinguishable from
+    DefaultPolicySerializer.
+
+    '''
+    valid_conditions = [
+        {'acl': 'private'},
+        {'bucket': 'my-bucket'},
+        {'key': 'uploads/foo/bar.jpg'},
+    ]
+
+    samples = [
+        None,
+        'foo',
+        {},
+        {'conditions': []},
+        {'conditions': valid_conditions},
+        {'expiration': '2007-12-01T12:00:00.000Z', 'conditions': valid_conditions},
+        {'expiration': 'tomorrow', 'conditions': valid_conditions},
+        {'expiration': 'tomorrow', 'conditions': [5]},
+        {'conditions': 'ab'},
+        {'conditions': [[]]},
+        {'conditions': [['eq']]},
+        {'conditions': [['eq', 'key', 'foo']]},
+        {'conditions': [['content-length-range', 1, 2, 3]]},
+        {'conditions': [{'acl': 'private', 'bucket': 'my-bucket'}]},
+        {'conditions': [{}]},
+        {'conditions': [{'acl': ['private']}]},
+        {'conditions': valid_conditions + [['content-length-range', 1024, 10240]]},
+        {'conditions': valid_conditions + [['starts-with', '$key', 'uploads/']]},
+        {'conditions': valid_conditions + [['eq', '$Content-Type', 'image/jpeg']]},
+        {'conditions': valid_conditions + [{'Content-Type': 'image'}]},
+        {'conditions': valid_conditions + [{'foo': 'bar'}, {'foo': 'baz'}]},
+        {'conditions': valid_conditions + [{'bucket': 'my_bucket!'}]},
+        {'conditions': valid_conditions + [['starts-with', '$bucket', 'x']]},
+        {'conditions': valid_conditions + [{'x-amz-meta-qqfilename': 'caf%C3%A9.jpg'}]},
+        {'conditions': valid_conditions + [{'x-amz-credential': '12345/2014/us-east-1/s3/aws4_request'}]},
+        {'conditions': [{'key': 'uploads/foo bar.jpg'}, {'key': 'uploads/foo bar.jpg'}]},
+    ]
+
+    def serializers_for(self, data):
+        import copy
+        from drf_to_s3.serializers import DefaultPolicySerializer, FastPolicySerializer
+        return (
+            DefaultPolicySerializer(data=copy.deepcopy(data)),
+            FastPolicySerializer(data=copy.deepcopy(data)),
+        )
+
+    def test_that_errors_are_identical(self):
+        for data in self.samples:
+            default, fast = self.serializers_for(data)
+            self.assertEquals(default.errors, fast.errors, repr(data))
+
+    def test_that_documents_are_identical(self):
+        from drf_to_s3 import s3
+        from drf_to_s3.serializers import DefaultPolicySerializer, FastPolicySerializer
+        for data in self.samples:
+            default, fast = self.serializers_for(data)
+            if not default.is_valid():
+                continue
+            self.assertTrue(fast.is_valid())
+            fast.object.expiration = default.object.expiration = s3.utc_plus(300)
+            self.assertEquals(
+                dict(DefaultPolicySerializer(default.object).data),
+                FastPolicySerializer(fast.object).data,
+                repr(data)
+            )
+
+    def test_that_instance_overrides_are_honored(self):
+        from drf_to_s3.serializers import FastPolicySerializer
+        serializer = FastPolicySerializer(data={'conditions': [{'foo': 'bar'}]})
+        serializer.required_conditions = []
+        serializer.optional_conditions = ['foo']
+        self.assertTrue(serializer.is_valid())
+        self.assertEquals(serializer.object['foo'].value, 'bar')
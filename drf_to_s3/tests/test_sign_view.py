@@ -216,3 +216,218 @@ class FineUploaderSettingsTest(APITestCase):
         from drf_to_s3.views import fine_uploader_views
         view = fine_uploader_views.FineSignPolicyView()
         self.assertEquals(view.get_aws_secret_access_key(), '1451')
+
+
+@override_settings(
+    AWS_UPLOAD_SECRET_ACCESS_KEY='12345',
+    AWS_UPLOAD_BUCKET='my-bucket',
+    AWS_UPLOAD_PREFIX_FUNC=lambda x: 'uploads',
+    AWS_UPLOAD_SIGNATURE_VERSION=4,
+    AWS_UPLOAD_REGION='eu-west-1'
+)
+class FineSignPolicyViewSignatureVersion4Test(APITestCase):
+    urls = 'drf_to_s3.urls'
+
+    def policy_document(self, credential):
+        return {
+            "expiration": "2007-12-01T12:00:00.000Z",
+            "conditions": [
+                {"acl": "private"},
+                {"bucket": "my-bucket"},
+                {"key": "uploads/foo/bar/baz.jpg"},
+                {"x-amz-algorithm": "AWS4-HMAC-SHA256"},
+                {"x-amz-credential": credential},
+                {"x-amz-date": "20140401T000000Z"},
+            ]
+        }
+
+    def test_that_policy_is_signed_with_credential_scope(self):
+        import hashlib, hmac
+        from drf_to_s3 import s3
+        date_stamp = datetime.datetime.utcnow().strftime('%Y%m%d')
+        credential = '67890/%s/eu-west-1/s3/aws4_request' % date_stamp
+        resp = self.client.post('/sign', self.policy_document(credential), format='json')
+        self.assertEquals(resp.status_code, status.HTTP_200_OK)
+        content = json.loads(resp.content)
+        signing_key = s3.derive_signing_key_v4('12345', date_stamp, 'eu-west-1')
+        expected = hmac.new(signing_key, content['policy'], hashlib.sha256).hexdigest()
+        self.assertEquals(content['signature'], expected)
+
+    def test_that_credential_for_other_region_is_rejected(self):
+        date_stamp = datetime.datetime.utcnow().strftime('%Y%m%d')
+        credential = '67890/%s/us-east-1/s3/aws4_request' % date_stamp
+        resp = self.client.post('/sign', self.policy_document(credential), format='json')
+        self.assertEquals(resp.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEquals(json.loads(resp.content)['error'], "Region should be 'eu-west-1'")
+
+    def test_that_stale_credential_is_rejected(self):
+        credential = '67890/20070101/eu-west-1/s3/aws4_request'
+        resp = self.client.post('/sign', self.policy_document(credential), format='json')
+        self.assertEquals(resp.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_that_malformed_credential_is_rejected(self):
+        resp = self.client.post('/sign', self.policy_document('67890/eu-west-1'), format='json')
+        self.assertEquals(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        content = json.loads(resp.content)
+        self.assertEquals(content['errors'], {'conditions.x-amz-credential': ['Invalid credential']})
+
+
+@override_settings(
+    AWS_UPLOAD_SECRET_ACCESS_KEY='12345',
+    AWS_UPLOAD_BUCKET='my-bucket',
+    AWS_UPLOAD_PREFIX_FUNC=lambda request: request.META.get('HTTP_X_PREFIX', 'uploads'),
+    AWS_UPLOAD_SIGNATURE_CACHE_SECONDS=60
+)
+class FineSignPolicyViewSignatureCacheTest(APITestCase):
+    urls = 'drf_to_s3.urls'
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.policy_document = {
+            "expiration": "2007-12-01T12:00:00.000Z",
+            "conditions": [
+                {"acl": "private"},
+                {"bucket": "my-bucket"},
+                {"key": "uploads/foo/bar/baz.jpg"},
+            ]
+        }
+
+    @mock.patch('drf_to_s3.s3.sign_policy_document')
+    def test_that_repeated_policy_is_signed_once(self, sign_policy_document):
+        sign_policy_document.return_value = {'policy': 'abc', 'signature': 'def'}
+        first = self.client.post('/sign', self.policy_document, format='json')
+        self.policy_document['expiration'] = "2008-12-01T12:00:00.000Z"
+        second = self.client.post('/sign', self.policy_document, format='json')
+        self.assertEquals(second.status_code, status.HTTP_200_OK)
+        self.assertEquals(json.loads(first.content), json.loads(second.content))
+        self.assertEquals(sign_policy_document.call_count, 1)
+
+    @mock.patch('drf_to_s3.s3.sign_policy_document')
+    def test_that_different_policy_is_signed_again(self, sign_policy_document):
+        sign_policy_document.return_value = {'policy': 'abc', 'signature': 'def'}
+        self.client.post('/sign', self.policy_document, format='json')
+        self.policy_document['conditions'][2]['key'] = 'uploads/foo/bar/qux.jpg'
+        self.client.post('/sign', self.policy_document, format='json')
+        self.assertEquals(sign_policy_document.call_count, 2)
+
+    @mock.patch('drf_to_s3.s3.sign_policy_document')
+    def test_that_cache_is_per_upload_prefix(self, sign_policy_document):
+        from drf_to_s3.views.fine_uploader_views import FineSignPolicyView
+        from drf_to_s3.serializers import DefaultPolicySerializer
+        serializer = DefaultPolicySerializer(data=self.policy_document)
+        self.assertTrue(serializer.is_valid())
+        view = FineSignPolicyView()
+        request = mock.Mock(META={})
+        other_request = mock.Mock(META={'HTTP_X_PREFIX': 'other'})
+        self.assertNotEquals(
+            view.get_signature_cache_key(request, serializer.object),
+            view.get_signature_cache_key(other_request, serializer.object)
+        )
+
+    @override_settings(AWS_UPLOAD_SIGNATURE_CACHE_SECONDS=300)
+    def test_that_cache_lifetime_must_be_less_than_expiration(self):
+        resp = self.client.post('/sign', self.policy_document, format='json')
+        self.assertEquals(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(json.loads(resp.content)['invalid'])
+
+
+@override_settings(
+    AWS_UPLOAD_SECRET_ACCESS_KEY='12345',
+    AWS_UPLOAD_BUCKET='my-bucket',
+    AWS_UPLOAD_PREFIX_FUNC=lambda x: 'uploads'
+)
+class FineSignRESTRequestViewTest(APITestCase):
+    urls = 'drf_to_s3.urls'
+
+    def setUp(self):
+        self.string_to_sign = '\n'.join([
+            'POST',
+            '',
+            'image/jpeg',
+            '',
+            'x-amz-acl:private',
+            'x-amz-date:Sat, 01 Feb 2014 12:00:00 GMT',
+            '/my-bucket/uploads/foo.jpg?uploads',
+        ])
+
+    def test_that_string_to_sign_is_signed(self):
+        import base64, hashlib, hmac
+        resp = self.client.post('/sign', {'headers': self.string_to_sign}, format='json')
+        self.assertEquals(resp.status_code, status.HTTP_200_OK)
+        expected = base64.b64encode(hmac.new('12345', self.string_to_sign, hashlib.sha1).digest())
+        self.assertEquals(json.loads(resp.content), {'signature': expected})
+
+    def test_that_part_upload_for_other_prefix_is_rejected(self):
+        string_to_sign = '\n'.join([
+            'PUT', '', '', '',
+            'x-amz-date:Sat, 01 Feb 2014 12:00:00 GMT',
+            '/my-bucket/someone-else/foo.jpg?partNumber=1&uploadId=abcde',
+        ])
+        resp = self.client.post('/sign', {'headers': string_to_sign}, format='json')
+        self.assertEquals(resp.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEquals(json.loads(resp.content)['error'], "Key should start with 'uploads/'")
+
+    def test_that_other_bucket_is_rejected(self):
+        resp = self.client.post('/sign', {'headers': self.string_to_sign.replace('my-bucket', 'secret-bucket')}, format='json')
+        self.assertEquals(resp.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_that_public_acl_is_rejected(self):
+        resp = self.client.post('/sign', {'headers': self.string_to_sign.replace(':private', ':public-read')}, format='json')
+        self.assertEquals(resp.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEquals(json.loads(resp.content)['error'], "ACL should be 'private'")
+
+    def test_that_initiate_without_acl_is_rejected(self):
+        resp = self.client.post('/sign', {'headers': self.string_to_sign.replace('x-amz-acl:private\n', '')}, format='json')
+        self.assertEquals(resp.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_that_invalid_string_to_sign_returns_errors(self):
+        resp = self.client.post('/sign', {'headers': 'GET\n\n\n\n/my-bucket/uploads/foo.jpg'}, format='json')
+        self.assertEquals(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        content = json.loads(resp.content)
+        self.assertTrue(content['invalid'])
+        self.assertIn('headers', content['errors'])
+
+
+@override_settings(
+    AWS_UPLOAD_SECRET_ACCESS_KEY='12345',
+    AWS_UPLOAD_BUCKET='my-bucket',
+    AWS_UPLOAD_PREFIX_FUNC=lambda x: 'uploads',
+    APPEND_SLASH=False # Work around a Django bug: https://code.djangoproject.com/ticket/21766
+)
+class FineSignPolicyViewFastSerializerTest(APITestCase):
+    from drf_to_s3.views.fine_uploader_views import FineSignPolicyView
+
+    class FastSignPolicyView(FineSignPolicyView):
+        from drf_to_s3.serializers import FastPolicySerializer
+        serializer_class = FastPolicySerializer
+
+    urls = patterns('',
+        url(r'^sign$', FastSignPolicyView.as_view()),
+    )
+
+    def setUp(self):
+        self.policy_document = {
+            "expiration": "2007-12-01T12:00:00.000Z",
+            "conditions": [
+                {"acl": "private"},
+                {"bucket": "my-bucket"},
+                {"key": "uploads/foo/bar/baz.jpg"},
+                ["content-length-range", 1024, 10240]
+            ]
+        }
+
+    def test_that_policy_is_signed(self):
+        import base64
+        resp = self.client.post('/sign', self.policy_document, format='json')
+        self.assertEquals(resp.status_code, status.HTTP_200_OK)
+        content = json.loads(resp.content)
+        self.assertEquals(content['policy_decoded']['conditions'], self.policy_document['conditions'])
+        self.assertEquals(json.loads(base64.b64decode(content['policy'])), content['policy_decoded'])
+
+    def test_that_invalid_policy_returns_errors(self):
+        self.policy_document['conditions'][1]['bucket'] = 'my_bucket!'
+        resp = self.client.post('/sign', self.policy_document, format='json')
+        self.assertEquals(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        content = json.loads(resp.content)
+        self.assertEquals(content['errors'], {'conditions.bucket': ['Invalid bucket name']})
@@ -33,3 +33,142 @@ class FineSignedUrlViewTest(APITestCase):
 
         self.assertIn('upload_uri', content)
         self.assertIn('key', content)
+
+    @override_settings(
+        AWS_UPLOAD_SECRET_ACCESS_KEY='12345',
+        AWS_UPLOAD_ACCESS_KEY_ID='67890',
+        AWS_UPLOAD_BUCKET='test-bucket',
+        AWS_UPLOAD_SIGNATURE_VERSION=4,
+        AWS_UPLOAD_REGION='eu-west-1',
+    )
+    def test_that_view_signs_with_signature_version_4(self):
+        resp = self.client.post('/upload_uri')
+        self.assertEquals(resp.status_code, status.HTTP_200_OK)
+
+        content = json.loads(resp.content)
+
+        self.assertTrue(content['upload_uri'].startswith('https://test-bucket.s3.eu-west-1.amazonaws.com/'))
+        self.assertIn('X-Amz-Signature=', content['upload_uri'])
+
+    @override_settings(
+        AWS_UPLOAD_SECRET_ACCESS_KEY='12345',
+        AWS_UPLOAD_ACCESS_KEY_ID='67890',
+        AWS_UPLOAD_BUCKET='test-bucket',
+    )
+    def test_that_view_returns_requested_number_of_uris(self):
+        import urlparse
+        resp = self.client.post('/upload_uri', {'count': 3}, format='json')
+        self.assertEquals(resp.status_code, status.HTTP_200_OK)
+
+        uploads = json.loads(resp.content)['uploads']
+
+        self.assertEquals(len(uploads), 3)
+        self.assertEquals(len(set(item['key'] for item in uploads)), 3)
+        expirations = set()
+        for item in uploads:
+            self.assertTrue(item['key'].startswith(self.username + '/'))
+            query = urlparse.parse_qs(urlparse.urlparse(item['upload_uri']).query)
+            expirations.add(query['Expires'][0])
+        self.assertEquals(len(expirations), 1)
+
+    @override_settings(
+        AWS_UPLOAD_SECRET_ACCESS_KEY='12345',
+        AWS_UPLOAD_ACCESS_KEY_ID='67890',
+        AWS_UPLOAD_BUCKET='test-bucket',
+        AWS_UPLOAD_MAX_URIS_PER_REQUEST=10,
+    )
+    def test_that_view_rejects_excessive_count(self):
+        resp = self.client.post('/upload_uri', {'count': 11}, format='json')
+        self.assertEquals(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEquals(json.loads(resp.content)['detail'], 'count should be between 1 and 10')
+
+    @override_settings(
+        AWS_UPLOAD_SECRET_ACCESS_KEY='12345',
+        AWS_UPLOAD_ACCESS_KEY_ID='67890',
+        AWS_UPLOAD_BUCKET='test-bucket',
+    )
+    def test_that_view_rejects_invalid_count(self):
+        resp = self.client.post('/upload_uri', {'count': 'lots'}, format='json')
+        self.assertEquals(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(
+        AWS_UPLOAD_SECRET_ACCESS_KEY='12345',
+        AWS_UPLOAD_ACCESS_KEY_ID='67890',
+        AWS_UPLOAD_BUCKET='test-bucket',
+    )
+    def test_that_view_rejects_body_which_is_not_an_object(self):
+        for data in [[{'count': 2}], 3]:
+            resp = self.client.post('/upload_uri', data, format='json')
+            self.assertEquals(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(
+        AWS_UPLOAD_SECRET_ACCESS_KEY='12345',
+        AWS_UPLOAD_ACCESS_KEY_ID='67890',
+        AWS_UPLOAD_BUCKET='test-bucket',
+    )
+    def test_that_view_resolves_signing_params_once_per_request(self):
+        from drf_to_s3.views.api_client_views import SignedPutURIView
+        with mock.patch.object(SignedPutURIView, 'get_aws_upload_bucket', return_value='test-bucket') as get_bucket:
+            with mock.patch.object(SignedPutURIView, 'get_endpoint', wraps=lambda: None) as get_endpoint:
+                resp = self.client.post('/upload_uri', {'count': 5}, format='json')
+        self.assertEquals(resp.status_code, status.HTTP_200_OK)
+        self.assertEquals(len(json.loads(resp.content)['uploads']), 5)
+        self.assertEquals(get_bucket.call_count, 2) # once for the bucket, once for its region
+        self.assertEquals(get_endpoint.call_count, 1)
+
+    @override_settings(
+        AWS_UPLOAD_SECRET_ACCESS_KEY='12345',
+        AWS_UPLOAD_ACCESS_KEY_ID='67890',
+        AWS_UPLOAD_BUCKET='test-bucket',
+        AWS_UPLOAD_REGION='eu-west-1',
+    )
+    def test_that_view_uses_regional_endpoint(self):
+        resp = self.client.post('/upload_uri')
+        content = json.loads(resp.content)
+        self.assertTrue(content['upload_uri'].startswith('https://test-bucket.s3.eu-west-1.amazonaws.com/'))
+
+    @override_settings(
+        AWS_UPLOAD_SECRET_ACCESS_KEY='12345',
+        AWS_UPLOAD_ACCESS_KEY_ID='67890',
+        AWS_UPLOAD_BUCKET='test-bucket',
+        AWS_UPLOAD_ENDPOINT='dualstack',
+        AWS_UPLOAD_REGION_ENDPOINTS={'ap-southeast-2': 'accelerate'},
+    )
+    def test_that_region_hint_chooses_endpoint(self):
+        resp = self.client.post('/upload_uri', {'region': 'ap-southeast-2'}, format='json')
+        content = json.loads(resp.content)
+        self.assertTrue(content['upload_uri'].startswith('https://test-bucket.s3-accelerate.amazonaws.com/'))
+
+        for data in [{'region': 'us-west-2'}, {}]:
+            resp = self.client.post('/upload_uri', data, format='json')
+            content = json.loads(resp.content)
+            self.assertTrue(content['upload_uri'].startswith('https://test-bucket.s3.dualstack.us-east-1.amazonaws.com/'))
+
+
+@override_settings(
+    AWS_UPLOAD_SECRET_ACCESS_KEY='12345',
+    AWS_UPLOAD_ACCESS_KEY_ID='67890',
+    AWS_UPLOAD_BUCKET='test-bucket',
+    AWS_UPLOAD_ENDPOINT='accelerate',
+    APPEND_SLASH=False # Work around a Django bug: https://code.djangoproject.com/ticket/21766
+)
+class SignedPutURIViewEndpointTest(APITestCase):
+    from drf_to_s3.views import api_client_views
+
+    class LocalSignedPutURIView(api_client_views.SignedPutURIView):
+        endpoint = 'http://localhost:9000'
+
+    urls = patterns('',
+        url(r'^upload_uri$', LocalSignedPutURIView.as_view()),
+    )
+
+    def setUp(self):
+        from .util import get_user_model
+        get_user_model().objects.create_user(username='frodo', password='shire1234')
+        self.client.login(username='frodo', password='shire1234')
+
+    def test_that_view_endpoint_overrides_setting(self):
+        resp = self.client.post('/upload_uri')
+        self.assertEquals(resp.status_code, status.HTTP_200_OK)
+        content = json.loads(resp.content)
+        self.assertTrue(content['upload_uri'].startswith('http://localhost:9000/test-bucket/frodo/'))
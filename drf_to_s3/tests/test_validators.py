@@ -0,0 +1,69 @@
+import string, unittest
+
+
+def reference_contains_only(allowed_characters, string_value):
+    return all([char in allowed_characters for char in string_value])
+
+
+class ValidatorsTest(unittest.TestCase):
+    '''
+    Check the validators against the straightforward character
+    scans they replaced.
+
+    '''
+    samples = [
+        '',
+        'foo',
+        'uploads/frodo/foo bar.jpg',
+        "uploads/frodo/~foo-bar_baz.(1)+[2];'3'",
+        'image/jpeg',
+        'image/svg+xml',
+        'image/',
+        '/',
+        'image/jpeg/foo',
+        'image',
+        'my-bucket.example',
+        'ab',
+        'a' * 256,
+        'tab\tnewline\nnull\x00',
+        'caf\xc3\xa9',
+        u'caf\xe9',
+        u'uploads/frodo/foo',
+        u'foo\u202ebar',
+        u'line\n',
+    ]
+
+    def test_that_url_characters_match_reference(self):
+        from drf_to_s3.validators import contains_only_url_characters, URL_CHARACTERS
+        for sample in self.samples:
+            self.assertEquals(
+                contains_only_url_characters(sample),
+                reference_contains_only(URL_CHARACTERS, sample),
+                repr(sample)
+            )
+
+    def test_that_filename_characters_match_reference(self):
+        from drf_to_s3.validators import is_valid_filename
+        for sample in self.samples:
+            self.assertEquals(
+                is_valid_filename(sample),
+                reference_contains_only(' ' + string.printable, sample),
+                repr(sample)
+            )
+
+    def test_that_media_type_matches_reference(self):
+        from drf_to_s3.validators import is_valid_media_type, MEDIA_TYPE_CHARACTERS
+        for sample in self.samples:
+            try:
+                first, rest = sample.split('/', 1)
+            except ValueError:
+                expected = False
+            else:
+                expected = reference_contains_only(MEDIA_TYPE_CHARACTERS, first + rest)
+            self.assertEquals(is_valid_media_type(sample), expected, repr(sample))
+
+    def test_that_bucket_name_matches_reference(self):
+        from drf_to_s3.validators import is_valid_bucket_name, BUCKET_NAME_CHARACTERS
+        for sample in self.samples:
+            expected = 3 <= len(sample) <= 255 and reference_contains_only(BUCKET_NAME_CHARACTERS, sample)
+            self.assertEquals(is_valid_bucket_name(sample), expected, repr(sample))
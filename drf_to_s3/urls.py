@@ -1,8 +1,12 @@
 from django.conf.urls import patterns, url
-from drf_to_s3.views import api_client_views, fine_uploader_views
+from drf_to_s3.views import CopyJobStatusView, api_client_views, fine_uploader_views
 
 urlpatterns = patterns('',
     url(r'^upload_uri$', api_client_views.SignedPutURIView.as_view()),
+    url(r'^multipart_upload$', api_client_views.MultipartUploadView.as_view()),
+    url(r'^multipart_upload/parts$', api_client_views.MultipartUploadPartURIView.as_view()),
+    url(r'^multipart_upload/abort$', api_client_views.MultipartUploadAbortView.as_view()),
     url(r'^sign$', fine_uploader_views.FineSignPolicyView.as_view()),
     url(r'^empty_html$', fine_uploader_views.empty_html),
+    url(r'^copy_job/(?P<job_id>[0-9a-f]+)$', CopyJobStatusView.as_view()),
 )
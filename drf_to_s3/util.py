@@ -1,3 +1,7 @@
+from collections import Counter
+from drf_to_s3.validators import contains_only_url_characters, is_valid_filename, is_valid_media_type
+
+
 def duplicates_in(list_value):
     '''Given a list, return a list of values which appear in it
     more than once.
@@ -5,7 +9,6 @@ def duplicates_in(list_value):
     The order of items in the response is not guaranteed.
 
     '''
-    from collections import Counter
     name_counter = Counter(list_value)
     return [k for k, count in name_counter.items() if count > 1]
 
@@ -13,23 +16,14 @@ def string_contains_only_url_characters(string_value):
     '''
     Return False if string_value contains non-URL characters.
     '''
-    import string
-    allowed_characters = "-._~:/?#[]@!$&'()*+,;=" + string.ascii_letters + string.digits
-    return all([char in allowed_characters for char in string_value])
+    return contains_only_url_characters(string_value)
 
 def string_is_valid_media_type(string_value):
     '''
     Return False if string_value is not a valid Media Type
     according to the RFC.
     '''
-    import string
-    allowed_characters = "!#$&.+-^_" + string.ascii_letters + string.digits
-    try:
-        first, rest = string_value.split('/', 1)
-    except ValueError:
-        return False
-    allowed_characters = "!#$&.+-^_" + string.ascii_letters + string.digits
-    return all([char in allowed_characters for char in first + rest])
+    return is_valid_media_type(string_value)
 
 def string_is_valid_filename(string_value):
     '''
@@ -38,6 +32,4 @@ def string_is_valid_filename(string_value):
     - Filenames shouldn't contain unprintable characters
     - Filenames shouldn't contain non-ASCII characters
     '''
-    import string
-    allowed_characters = ' ' + string.printable
-    return all([char in allowed_characters for char in string_value])
+    return is_valid_filename(string_value)
@@ -0,0 +1,80 @@
+'''
+Character-class validators for keys, media types, filenames, and
+bucket names.
+
+The allowed characters are compiled once, at import. Byte strings
+are checked with str.translate, which deletes the allowed
+characters in a single pass in C, and unicode strings with a
+precompiled regular expression.
+
+'''
+import re, string
+
+
+class CharacterSetValidator(object):
+    '''
+    Callable which returns True if every character of a string is
+    in allowed_characters. The empty string is valid.
+
+    '''
+    def __init__(self, allowed_characters):
+        self.allowed_characters = frozenset(allowed_characters)
+        self._deletechars = ''.join(sorted(self.allowed_characters))
+        self._pattern = re.compile(r'\A%s*\Z' % self.pattern)
+
+    @property
+    def pattern(self):
+        '''
+        A regular expression character class matching one allowed
+        character.
+        '''
+        return '[%s]' % ''.join('\\x%02x' % ord(char) for char in sorted(self.allowed_characters))
+
+    def __call__(self, value):
+        if isinstance(value, str):
+            return not value.translate(None, self._deletechars)
+        elif isinstance(value, unicode):
+            return self._pattern.match(value) is not None
+        else:
+            return all(char in self.allowed_characters for char in value)
+
+
+URL_CHARACTERS = "-._~:/?#[]@!$&'()*+,;=" + string.ascii_letters + string.digits
+MEDIA_TYPE_CHARACTERS = "!#$&.+-^_" + string.ascii_letters + string.digits
+FILENAME_CHARACTERS = ' ' + string.printable
+BUCKET_NAME_CHARACTERS = "-._" + string.ascii_letters + string.digits
+
+contains_only_url_characters = CharacterSetValidator(URL_CHARACTERS)
+contains_only_filename_characters = CharacterSetValidator(FILENAME_CHARACTERS)
+contains_only_bucket_name_characters = CharacterSetValidator(BUCKET_NAME_CHARACTERS)
+
+_media_type_characters = CharacterSetValidator(MEDIA_TYPE_CHARACTERS)
+_media_type_pattern = re.compile(r'\A%s*/%s*\Z' % (
+    _media_type_characters.pattern,
+    _media_type_characters.pattern
+))
+
+
+def is_valid_media_type(value):
+    '''
+    Return True if value is a type and subtype separated by a
+    slash, using only the characters allowed by the RFC.
+
+    '''
+    return _media_type_pattern.match(value) is not None
+
+def is_valid_filename(value):
+    '''
+    Return True if value contains only printable ASCII characters
+    and spaces.
+
+    '''
+    return contains_only_filename_characters(value)
+
+def is_valid_bucket_name(value):
+    '''
+    Return True if value is a valid bucket name under the rules
+    for the US Standard region.
+
+    '''
+    return 3 <= len(value) <= 255 and contains_only_bucket_name_characters(value)
@@ -1,5 +1,45 @@
+import inspect
+from django.http import Http404
 from django.utils.translation import ugettext as _
+from rest_framework import status
+from rest_framework.exceptions import APIException, ParseError
+from rest_framework.response import Response
 from rest_framework.views import APIView
+from drf_to_s3 import instrumentation, s3
+from drf_to_s3.access_control import check_upload_permissions, storage_bucket_for_request
+from drf_to_s3.copy_jobs import get_copy_job_queue
+from drf_to_s3.key_layout import get_key_layout
+
+
+def _defining_class(cls, name):
+    for klass in inspect.getmro(cls):
+        if name in vars(klass):
+            return klass
+
+def _overrides(cls, name, companion):
+    '''
+    Return True if cls defines the method name in a subclass of the
+    class which defines companion, so companion doesn't know about
+    it.
+    '''
+    defined_in = _defining_class(cls, name)
+    companion_defined_in = _defining_class(cls, companion)
+    return defined_in is not companion_defined_in and issubclass(defined_in, companion_defined_in)
+
+
+class PendingCopy(object):
+    '''
+    The result of copy_upload_to_storage_async(): an AsyncResult
+    from s3.copy_async(), and the key it copies to.
+
+    '''
+    def __init__(self, async_result, new_key):
+        self.async_result = async_result
+        self.new_key = new_key
+
+    def get(self):
+        self.async_result.get()
+        return self.new_key
 
 
 class BaseUploadCompletionView(APIView):
@@ -11,26 +51,104 @@ class BaseUploadCompletionView(APIView):
     '''
     compatibility_for_iframe = False
 
+    # A client may post a list of upload notifications to
+    # complete them in one request. This bounds the size of the
+    # list.
+    max_batch_size = 500
+
+    # Set to True to queue the copy to storage and respond right
+    # away with a job id, which the client can pass to
+    # CopyJobStatusView. See drf_to_s3.copy_jobs.
+    defer_copy = False
+
     def get_aws_storage_bucket(self):
-        from django.conf import settings
-        return settings.AWS_STORAGE_BUCKET_NAME
+        return storage_bucket_for_request(self.request)
 
     def check_upload_permissions(self, request, bucket, key):
-        from drf_to_s3.access_control import check_upload_permissions
         check_upload_permissions(request, bucket, key)
 
-    # def copy_upload_to_storage(self, request, bucket, key, uuid, name, etag):
-    #     '''
-    #     '''
-    #     import uuid as _uuid
-    #     from drf_to_s3 import s3
-    #     s3.copy(
-    #         src_bucket=bucket,
-    #         src_key=key,
-    #         etag=etag,
-    #         dst_bucket=self.bucket,
-    #         dst_key=self.nonexisting_key
-    #     )
+    def get_upload_location(self, attrs):
+        '''
+        Given validated attributes from the serializer, return a
+        tuple of (bucket, key, filename).
+
+        '''
+        return attrs['bucket'], attrs['key'], attrs['name']
+
+    def new_storage_key(self, filename):
+        '''
+        Return a new, random key for an upload in the storage
+        bucket, preserving the extension of filename. See
+        drf_to_s3.key_layout.
+
+        '''
+        return get_key_layout().new_storage_key(filename)
+
+    def copy_upload_to_storage(self, request, bucket, key, filename):
+        '''
+        Copy the uploaded file to a new, randomly named key in the
+        storage bucket. Return the new key.
+
+        Batches are copied with copy_upload_to_storage_async(). A
+        subclass may override either method, and both single and
+        batch uploads use the override: when only
+        copy_upload_to_storage_async() is overridden, this waits on
+        it, and when only this is, batches call it for each upload.
+
+        '''
+        if _overrides(type(self), 'copy_upload_to_storage_async', 'copy_upload_to_storage'):
+            with instrumentation.timed('completion.copy'):
+                return self.copy_upload_to_storage_async(request, bucket, key, filename).get()
+
+        new_key = self.new_storage_key(filename)
+
+        with instrumentation.timed('completion.copy'):
+            s3.copy(
+                src_bucket=bucket,
+                src_key=key,
+                dst_bucket=self.get_aws_storage_bucket(),
+                dst_key=new_key
+            )
+        return new_key
+
+    def copy_upload_to_storage_async(self, request, bucket, key, filename):
+        '''
+        Start copying the uploaded file to a new, randomly named key
+        in the storage bucket, without waiting for it. Return an
+        object whose get() method waits for the copy and returns the
+        new key, or raises ObjectNotFoundException.
+
+        '''
+        new_key = self.new_storage_key(filename)
+        return PendingCopy(s3.copy_async(
+            src_bucket=bucket,
+            src_key=key,
+            dst_bucket=self.get_aws_storage_bucket(),
+            dst_key=new_key
+        ), new_key)
+
+    def enqueue_copy_upload_to_storage(self, request, bucket, key, filename):
+        '''
+        Queue a copy of the uploaded file to a new, randomly named
+        key in the storage bucket. Return the job id.
+
+        '''
+        return get_copy_job_queue().enqueue(
+            src_bucket=bucket,
+            src_key=key,
+            dst_bucket=self.get_aws_storage_bucket(),
+            dst_key=self.new_storage_key(filename)
+        )
+
+    def prepare_upload(self, request, bucket, key, attrs):
+        '''
+        Called once for each upload which passes the permission
+        check, before handle_upload() or, for a batch,
+        handle_batch_upload(). Raise an APIException to fail the
+        upload. Does nothing by default.
+
+        '''
+        pass
 
     def handle_upload(self, request, serializer, obj, bucket, key, filename):
         '''
@@ -76,32 +194,185 @@ class BaseUploadCompletionView(APIView):
         successful upload) in the completion handler.
 
         '''
-        import os, uuid
-        from rest_framework import status
-        from rest_framework.response import Response
-        from drf_to_s3 import s3
-        from django.conf import settings
+        if self.defer_copy:
+            job_id = self.enqueue_copy_upload_to_storage(request, bucket, key, filename)
+            return Response({'job_id': job_id}, status=status.HTTP_200_OK)
+
+        self.copy_upload_to_storage(request, bucket, key, filename)
 
-        basename, ext = os.path.splitext(filename)
-        new_key = str(uuid.uuid4()) + ext
-        
-        s3.copy(
-            src_bucket=bucket,
-            src_key=key,
-            dst_bucket=self.get_aws_storage_bucket(),
-            dst_key=new_key
-        )
-     
         return Response(status=status.HTTP_200_OK)
 
+    def handle_batch_upload(self, request, uploads):
+        '''
+        Handle a batch of uploads which have passed validation and
+        permission checks.
+
+        uploads: A list of dictionaries with `serializer`, `attrs`,
+          `bucket`, `key`, and `filename`.
+
+        Return a list of results, one per upload, in the same order.
+        The default implementation starts all the copies to storage
+        and then waits for them, so they run concurrently. With
+        defer_copy, it queues them instead.
+
+        When a subclass overrides handle_upload but not this method,
+        handle_upload is called for each upload instead, and its
+        responses become the results. Likewise, when a subclass
+        overrides copy_upload_to_storage but not
+        copy_upload_to_storage_async, it's called for each upload.
+
+        '''
+        if _overrides(type(self), 'handle_upload', 'handle_batch_upload'):
+            return [self.handle_upload_in_batch(request, upload) for upload in uploads]
+
+        if self.defer_copy:
+            return [
+                {'job_id': self.enqueue_copy_upload_to_storage(
+                    request, upload['bucket'], upload['key'], upload['filename'])}
+                for upload in uploads
+            ]
+
+        if _overrides(type(self), 'copy_upload_to_storage', 'copy_upload_to_storage_async'):
+            results = []
+            for upload in uploads:
+                try:
+                    self.copy_upload_to_storage(
+                        request, upload['bucket'], upload['key'], upload['filename'])
+                except APIException as exc:
+                    results.append(self.make_batch_error(error=exc.detail))
+                else:
+                    results.append({'success': True})
+            return results
+
+        results = []
+        with instrumentation.timed('completion.copy'):
+            pending = [
+                self.copy_upload_to_storage_async(
+                    request, upload['bucket'], upload['key'], upload['filename'])
+                for upload in uploads
+            ]
+            for copy_result in pending:
+                try:
+                    copy_result.get()
+                except APIException as exc:
+                    results.append(self.make_batch_error(error=exc.detail))
+                else:
+                    results.append({'success': True})
+        return results
+
+    def handle_upload_in_batch(self, request, upload):
+        '''
+        Call handle_upload for one upload in a batch, and return its
+        response as the upload's result.
+        '''
+        try:
+            response = self.handle_upload(
+                request, upload['serializer'], upload['serializer'].object,
+                upload['bucket'], upload['key'], upload['filename'])
+        except APIException as exc:
+            return self.make_batch_error(error=exc.detail)
+        data = response.data if isinstance(response.data, dict) else {}
+        if status.is_success(response.status_code) and 'error' not in data:
+            result = {'success': True}
+            result.update(data)
+            return result
+        result = self.make_batch_error(
+            error=data.get('error', data.get('detail', _('Unable to complete your request')))
+        )
+        for name, value in data.items():
+            result.setdefault(name, value)
+        return result
+
+    def make_batch_error(self, error, errors=None):
+        '''
+        Return the result for a batch item which failed.
+        '''
+        result = {
+            'invalid': True,
+            'error': error,
+        }
+        if errors is not None:
+            result['errors'] = errors
+        return result
+
+    def post_batch(self, request):
+        '''
+        Validate, check permissions on, and prepare each item in a
+        list of upload notifications, then pass the ones which
+        succeed to handle_batch_upload.
+
+        Responds with `results`, a list with one entry per item.
+        Items which fail have `invalid` and `error` keys set, as
+        in the single-upload case.
+
+        '''
+        items = request.DATA
+        if len(items) > self.max_batch_size:
+            raise ParseError(
+                _('Too many uploads in batch. The maximum is %d') % self.max_batch_size
+            )
+
+        results = [None] * len(items)
+        valid = []
+        with instrumentation.timed('completion.validate'):
+            for index, item in enumerate(items):
+                serializer = self.serializer_class(data=item)
+                if not serializer.is_valid():
+                    results[index] = self.make_batch_error(
+                        error=(_('Unable to complete your request. Errors with %s') %
+                               ', '.join(serializer.errors.keys())),
+                        errors=serializer.errors
+                    )
+                    continue
+                valid.append((index, serializer))
+
+        uploads = []
+        indices = []
+        with instrumentation.timed('completion.permissions'):
+            for index, serializer in valid:
+                attrs = serializer.object
+                bucket, key, filename = self.get_upload_location(attrs)
+                try:
+                    self.check_upload_permissions(request, bucket, key)
+                except APIException as exc:
+                    results[index] = self.make_batch_error(error=exc.detail)
+                    continue
+                uploads.append({
+                    'serializer': serializer,
+                    'attrs': attrs,
+                    'bucket': bucket,
+                    'key': key,
+                    'filename': filename,
+                })
+                indices.append(index)
+
+        with instrumentation.timed('completion.handle_upload'):
+            prepared = []
+            prepared_indices = []
+            for index, upload in zip(indices, uploads):
+                try:
+                    self.prepare_upload(request, upload['bucket'], upload['key'], upload['attrs'])
+                except APIException as exc:
+                    results[index] = self.make_batch_error(error=exc.detail)
+                    continue
+                prepared.append(upload)
+                prepared_indices.append(index)
+            batch_results = self.handle_batch_upload(request, prepared)
+        for index, result in zip(prepared_indices, batch_results):
+            results[index] = result
+
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
     def post(self, request, format=None):
-        from rest_framework import status
-        from rest_framework.response import Response
-        from rest_framework.exceptions import PermissionDenied
+        with instrumentation.timed('completion.parse'):
+            data = request.DATA
+        if isinstance(data, list):
+            return self.post_batch(request)
 
-        serializer = self.serializer_class(data=request.DATA)
-        if not serializer.is_valid():
-            return self.handle_validation_error(serializer)
+        with instrumentation.timed('completion.validate'):
+            serializer = self.serializer_class(data=data)
+            if not serializer.is_valid():
+                return self.handle_validation_error(serializer)
         # Allow extending the serializer to return a list of
         # objects. Return attrs as the first object and this
         # will continue to work.
@@ -109,12 +380,39 @@ class BaseUploadCompletionView(APIView):
             attrs = serializer.object[0]
         else:
             attrs = serializer.object
-        
-        bucket = attrs['bucket']
-        key = attrs['key']
-        filename = attrs['name']
-        
-        self.check_upload_permissions(request, bucket, key)
-
-        return self.handle_upload(request, serializer, serializer.object,
-                                  bucket, key, filename)
+
+        bucket, key, filename = self.get_upload_location(attrs)
+
+        with instrumentation.timed('completion.permissions'):
+            self.check_upload_permissions(request, bucket, key)
+
+        with instrumentation.timed('completion.handle_upload'):
+            self.prepare_upload(request, bucket, key, attrs)
+            return self.handle_upload(request, serializer, serializer.object,
+                                      bucket, key, filename)
+
+
+class CopyJobStatusView(APIView):
+    '''
+    Report the status of a copy queued by a completion view with
+    defer_copy set. Responds with `job_id`, `status`, and for
+    failed jobs, `error`.
+
+    Only the user who uploaded the file may see the job.
+
+    '''
+    def check_upload_permissions(self, request, bucket, key):
+        check_upload_permissions(request, bucket, key)
+
+    def get(self, request, job_id, format=None):
+        job = get_copy_job_queue().get_job(job_id)
+        if job is None:
+            raise Http404()
+        self.check_upload_permissions(request, job['src_bucket'], job['src_key'])
+        data = {
+            'job_id': job['id'],
+            'status': job['status'],
+        }
+        if job['error']:
+            data['error'] = job['error']
+        return Response(data)
@@ -1,49 +1,191 @@
+import datetime
 from django.utils.translation import ugettext as _
+from rest_framework import status
+from rest_framework.exceptions import ParseError
+from rest_framework.response import Response
 from rest_framework.views import APIView
+from drf_to_s3 import conf, instrumentation, routing, s3
+from drf_to_s3.access_control import (
+    check_upload_permissions,
+    upload_bucket_for_request,
+    upload_prefix_for_request,
+)
+from drf_to_s3.key_layout import get_key_layout
+from drf_to_s3.naive_serializers import (
+    APIUploadCompletionSerializer,
+    MultipartUploadCompletionSerializer,
+    MultipartUploadPartsSerializer,
+    MultipartUploadSerializer,
+)
 from drf_to_s3.views import BaseUploadCompletionView
 
 
-class SignedPutURIView(APIView):
+class BaseSignedURIView(APIView):
     '''
-    Generate a signed url for the user to upload a file to S3.
+    Settings shared by the views which sign URIs for API clients.
+
+    Set AWS_UPLOAD_SIGNATURE_VERSION to 4 to sign with Signature
+    Version 4 for the region in AWS_UPLOAD_REGION.
+
+    With AWS_UPLOAD_BUCKETS, each user gets the bucket
+    drf_to_s3.routing assigns them, signed for the region in
+    AWS_UPLOAD_BUCKET_REGIONS.
+
+    URIs point to the bucket's regional endpoint. Set
+    AWS_UPLOAD_ENDPOINT, or the view's endpoint attribute, to
+    'accelerate', 'dualstack', 'accelerate-dualstack', or the URL of
+    an S3-compatible service to choose another; see s3.Endpoint.
+    Clients may post the `region` they're in. If it's a key of
+    AWS_UPLOAD_REGION_ENDPOINTS, its endpoint is used instead, so
+    distant clients can use Transfer Acceleration while nearby
+    ones use the regional endpoint.
 
     '''
+    # An s3.Endpoint, or a value of AWS_UPLOAD_ENDPOINT, which
+    # overrides that setting for this view.
+    endpoint = None
+
+    @property
+    def max_count(self):
+        return conf.get_settings().upload_max_uris_per_request
+
     @property
     def expire_after_seconds(self):
-        from django.conf import settings
-        return getattr(settings, 'AWS_UPLOAD_EXPIRE_AFTER_SECONDS', 300)
+        return conf.get_settings().upload_expire_after_seconds
+
+    @property
+    def signature_version(self):
+        return conf.get_settings().upload_signature_version
+
+    def get_aws_region(self):
+        return routing.region_for_bucket(self.get_aws_upload_bucket())
 
     def get_aws_upload_bucket(self):
-        from django.conf import settings
-        return settings.AWS_UPLOAD_BUCKET
+        return upload_bucket_for_request(self.request)
+
+    def get_region_hint(self, request):
+        '''
+        Return the region the client posted as `region`, or None.
+        '''
+        if not isinstance(request.DATA, dict):
+            return None
+        hint = request.DATA.get('region')
+        if isinstance(hint, basestring):
+            return hint
+        return None
+
+    def get_endpoint(self):
+        '''
+        Return the s3.Endpoint for upload URIs.
+        '''
+        config = conf.get_settings()
+        hint = self.get_region_hint(self.request)
+        if hint is not None and hint in config.upload_region_endpoints:
+            return s3.get_endpoint(config.upload_region_endpoints[hint])
+        if self.endpoint is not None:
+            return s3.get_endpoint(self.endpoint)
+        return s3.get_endpoint(config.upload_endpoint)
 
     def get_aws_access_key_id(self):
-        from django.conf import settings
-        return settings.AWS_UPLOAD_ACCESS_KEY_ID
+        return conf.get_settings().upload_access_key_id
 
     def get_aws_secret_key(self):
-        from django.conf import settings
-        return settings.AWS_UPLOAD_SECRET_ACCESS_KEY
+        return conf.get_settings().upload_secret_access_key
 
-    def post(self, request):
-        import uuid
-        from rest_framework import status
-        from rest_framework.response import Response
-        from drf_to_s3 import s3
-        from drf_to_s3.access_control import upload_prefix_for_request
-
-        key = '%s/%s' % (upload_prefix_for_request(request), str(uuid.uuid4()))
-        upload_uri = s3.build_signed_upload_uri(
-            bucket=self.get_aws_upload_bucket(),
-            key=key,
-            access_key_id=self.get_aws_access_key_id(),
-            secret_key=self.get_aws_secret_key(),
-            expire_after_seconds=self.expire_after_seconds
-        )
-        data = {
-            'key': key,
-            'upload_uri': upload_uri,
+    def get_signing_params(self):
+        '''
+        Return the keyword arguments, other than the key, for the s3
+        functions which sign upload URIs. Views resolve these once
+        per request, rather than once per URI.
+        '''
+        return {
+            'bucket': self.get_aws_upload_bucket(),
+            'access_key_id': self.get_aws_access_key_id(),
+            'secret_key': self.get_aws_secret_key(),
+            'expire_after_seconds': self.expire_after_seconds,
+            'region': self.get_aws_region(),
+            'endpoint': self.get_endpoint(),
         }
+
+    def check_upload_permissions(self, request, bucket, key):
+        check_upload_permissions(request, bucket, key)
+
+    def new_upload_key(self, request):
+        '''
+        Return a new, random key under the user's upload prefix.
+        See drf_to_s3.key_layout.
+        '''
+        return get_key_layout().new_upload_key(upload_prefix_for_request(request))
+
+
+class SignedPutURIView(BaseSignedURIView):
+    '''
+    Generate a signed url for the user to upload a file to S3.
+
+    Set AWS_UPLOAD_SIGNATURE_VERSION to 4 to sign with Signature
+    Version 4 for the region in AWS_UPLOAD_REGION.
+
+    To get several URIs at once, post a `count`. The response then
+    contains `uploads`, a list of keys and upload URIs. The count
+    is limited by AWS_UPLOAD_MAX_URIS_PER_REQUEST, which defaults
+    to 100.
+
+    '''
+    def build_upload_uri(self, key, now, signing_params=None):
+        '''
+        Return a signed upload URI for key, signed at the
+        given time.
+
+        signing_params: The result of get_signing_params(), to
+          reuse for several URIs.
+
+        '''
+        if signing_params is None:
+            signing_params = self.get_signing_params()
+        if self.signature_version == 4:
+            return s3.build_signed_upload_uri_v4(key=key, now=now, **signing_params)
+        return s3.build_signed_upload_uri(key=key, now=now, **signing_params)
+
+    def get_count(self, request):
+        '''
+        Return the number of upload URIs requested, or None if the
+        client didn't ask for a specific number.
+        '''
+        if not isinstance(request.DATA, dict):
+            raise ParseError(_('Expected an object'))
+        count = request.DATA.get('count')
+        if count is None:
+            return None
+        try:
+            count = int(count)
+        except (TypeError, ValueError):
+            raise ParseError(_('count should be an integer'))
+        if count < 1 or count > self.max_count:
+            raise ParseError(_('count should be between 1 and %d') % self.max_count)
+        return count
+
+    def post(self, request):
+        with instrumentation.timed('upload_uri.parse'):
+            count = self.get_count(request)
+        with instrumentation.timed('upload_uri.prefix'):
+            upload_prefix_for_request(request)
+        now = datetime.datetime.utcnow()
+
+        uploads = []
+        with instrumentation.timed('upload_uri.sign'):
+            signing_params = self.get_signing_params()
+            for i in range(count or 1):
+                key = self.new_upload_key(request)
+                uploads.append({
+                    'key': key,
+                    'upload_uri': self.build_upload_uri(key, now, signing_params),
+                })
+        if count is None:
+            data = uploads[0]
+        else:
+            data = {
+                'uploads': uploads,
+            }
         return Response(data=data, status=status.HTTP_200_OK)
 
 
@@ -53,8 +195,6 @@ class APIErrorResponseMixin(object):
 
     '''
     def handle_validation_error(self, serializer):
-        from rest_framework import status
-        from rest_framework.response import Response
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
@@ -63,34 +203,135 @@ class APIUploadCompletionView(APIErrorResponseMixin, BaseUploadCompletionView):
     Handle the upload success callback from the API client. 
     Expected simpler serializer, client should extend this view and provide check_upload_permissions 
     '''
-    from drf_to_s3.naive_serializers import APIUploadCompletionSerializer
     serializer_class = APIUploadCompletionSerializer
 
     def get_aws_upload_bucket(self):
-        from django.conf import settings
-        return settings.AWS_UPLOAD_BUCKET
+        return upload_bucket_for_request(self.request)
+
+    def get_upload_location(self, attrs):
+        return self.get_aws_upload_bucket(), attrs['key'], attrs['filename']
+
+
+class MultipartUploadView(BaseSignedURIView):
+    '''
+    Start a multipart upload to a new key under the user's upload
+    prefix. Responds with the `key` and `upload_id`.
+
+    The client then requests URIs for its parts from
+    MultipartUploadPartURIView, uploads the parts, in parallel if
+    it likes, and finishes with MultipartUploadCompletionView, or
+    gives up with MultipartUploadAbortView. To resume after a
+    failure, request new URIs for the parts which didn't upload.
 
+    http://docs.aws.amazon.com/AmazonS3/latest/dev/mpuoverview.html
+
+    '''
     def post(self, request, format=None):
-        from rest_framework import status
-        from rest_framework.response import Response
-        from rest_framework.exceptions import PermissionDenied
+        bucket = self.get_aws_upload_bucket()
+        key = self.new_upload_key(request)
+        upload_id = s3.initiate_multipart_upload(bucket, key)
+        return Response({
+            'key': key,
+            'upload_id': upload_id,
+        }, status=status.HTTP_200_OK)
+
+
+class MultipartUploadPartURIView(APIErrorResponseMixin, BaseSignedURIView):
+    '''
+    Generate signed urls for uploading parts of a multipart upload.
+
+    Post the `key` and `upload_id` from MultipartUploadView, and
+    `part_numbers`, a list of part numbers between 1 and 10000.
+    Responds with `parts`, a list of part numbers and upload URIs
+    in the same order. The number of parts per request is limited
+    by AWS_UPLOAD_MAX_URIS_PER_REQUEST.
+
+    The client should keep the ETag S3 returns for each part, to
+    send to the completion view.
 
+    '''
+    serializer_class = MultipartUploadPartsSerializer
+
+    def build_upload_part_uri(self, key, upload_id, part_number, now, signing_params=None):
+        '''
+        Return a signed URI for uploading one part, signed at the
+        given time.
+
+        signing_params: The result of get_signing_params(), to
+          reuse for several parts.
+
+        '''
+        if signing_params is None:
+            signing_params = self.get_signing_params()
+        if self.signature_version == 4:
+            return s3.build_signed_upload_part_uri_v4(
+                key=key, upload_id=upload_id, part_number=part_number, now=now, **signing_params)
+        return s3.build_signed_upload_part_uri(
+            key=key, upload_id=upload_id, part_number=part_number, now=now, **signing_params)
+
+    def post(self, request, format=None):
         serializer = self.serializer_class(data=request.DATA)
         if not serializer.is_valid():
             return self.handle_validation_error(serializer)
-        # Allow extending the serializer to return a list of
-        # objects. Return attrs as the first object and this
-        # will continue to work.
-        if isinstance(serializer.object, list):
-            attrs = serializer.object[0]
-        else:
-            attrs = serializer.object
+        attrs = serializer.object
+        if len(attrs['part_numbers']) > self.max_count:
+            raise ParseError(_('Too many parts requested. The maximum is %d') % self.max_count)
+
+        self.check_upload_permissions(request, self.get_aws_upload_bucket(), attrs['key'])
+
+        now = datetime.datetime.utcnow()
+        signing_params = self.get_signing_params()
+        parts = [
+            {
+                'part_number': part_number,
+                'upload_uri': self.build_upload_part_uri(
+                    attrs['key'], attrs['upload_id'], part_number, now, signing_params),
+            }
+            for part_number in attrs['part_numbers']
+        ]
+        return Response({'parts': parts}, status=status.HTTP_200_OK)
 
+
+class MultipartUploadAbortView(APIErrorResponseMixin, BaseSignedURIView):
+    '''
+    Abort a multipart upload, so S3 discards its parts. Post the
+    `key` and `upload_id`.
+
+    '''
+    serializer_class = MultipartUploadSerializer
+
+    def post(self, request, format=None):
+        serializer = self.serializer_class(data=request.DATA)
+        if not serializer.is_valid():
+            return self.handle_validation_error(serializer)
+        attrs = serializer.object
         bucket = self.get_aws_upload_bucket()
-        key = attrs['key']
-        filename = attrs['filename']
 
-        self.check_upload_permissions(request, bucket, key)
-        
-        return self.handle_upload(request, serializer, serializer.object, 
-                                  bucket, key, filename)
+        self.check_upload_permissions(request, bucket, attrs['key'])
+
+        s3.abort_multipart_upload(bucket, attrs['key'], attrs['upload_id'])
+        return Response(status=status.HTTP_200_OK)
+
+
+class MultipartUploadCompletionView(APIUploadCompletionView):
+    '''
+    Complete a multipart upload, then handle it like any other
+    upload. Post the `key`, `upload_id`, `filename`, and `parts`,
+    a list of dictionaries with the `part_number` and `etag` of
+    each uploaded part.
+
+    Like APIUploadCompletionView, clients should extend this view
+    to handle the upload. The upload is completed in
+    prepare_upload(), once, before handle_upload() is called.
+
+    '''
+    serializer_class = MultipartUploadCompletionSerializer
+
+    def complete_multipart_upload(self, request, bucket, key, attrs):
+        s3.complete_multipart_upload(bucket, key, attrs['upload_id'], attrs['parts'])
+
+    def prepare_upload(self, request, bucket, key, attrs):
+        # Runs once per upload, before handle_upload() or the batch
+        # copy, so an overridden handle_upload() doesn't complete it
+        # a second time
+        self.complete_multipart_upload(request, bucket, key, attrs)
@@ -1,14 +1,23 @@
+import datetime, hashlib
+from django.core.cache import get_cache
+from django.core.exceptions import ImproperlyConfigured
 from django.utils.translation import ugettext as _
+from rest_framework import status
 from rest_framework.decorators import api_view, renderer_classes
-from rest_framework.renderers import StaticHTMLRenderer
+from rest_framework.exceptions import APIException, PermissionDenied
+from rest_framework.parsers import FormParser, JSONParser
+from rest_framework.renderers import JSONRenderer, StaticHTMLRenderer
+from rest_framework.response import Response
 from rest_framework.views import APIView
+from drf_to_s3 import access_control, conf, instrumentation, routing, s3
+from drf_to_s3.access_control import upload_prefix_for_request
+from drf_to_s3.naive_serializers import FineUploadCompletionSerializer
+from drf_to_s3.serializers import DefaultPolicySerializer, DefaultRESTRequestSerializer
 from drf_to_s3.views import BaseUploadCompletionView
 
 
 class FineUploaderErrorResponseMixin(object):
     def handle_validation_error(self, serializer):
-        from rest_framework import status
-        from rest_framework.response import Response
         response = {
             'invalid': True,
         }
@@ -28,9 +37,6 @@ class FineUploaderErrorResponseMixin(object):
         which expects `invalid: True`.
         FIXME this should provide a user-readable 'error' message.
         '''
-        from rest_framework import status
-        from rest_framework.exceptions import APIException
-        from rest_framework.response import Response
         response = {
             'invalid': True,
         }
@@ -58,25 +64,55 @@ class FineSignPolicyView(FineUploaderErrorResponseMixin, APIView):
       from settings.AWS_UPLOAD_SECRET_ACCESS_KEY.
     expire_after_seconds: Number of seconds before signed policy
       documents should expires. Used by pre_sign.
+    signature_version: 2, or 4 to sign with Signature Version 4.
+      Defaults to settings.AWS_UPLOAD_SIGNATURE_VERSION, or 2.
+      Version 4 policies must carry an x-amz-credential for the
+      region in settings.AWS_UPLOAD_REGION, dated today.
+    signature_cache_seconds: When set, identical policies from the
+      same user are signed once and the response is reused for this
+      many seconds, which absorbs retries. Defaults to
+      settings.AWS_UPLOAD_SIGNATURE_CACHE_SECONDS, or None to
+      disable caching. Must be less than expire_after_seconds, so
+      a cached policy is never handed out close to expiring. The
+      cache is settings.AWS_UPLOAD_SIGNATURE_CACHE, or 'default'.
+
+    When Fine Uploader uploads in chunks, it posts `headers`, the
+    string to sign for each multipart upload request, instead of a
+    policy. These are validated with rest_request_serializer_class,
+    checked like policies, and signed with Signature Version 2.
+    The response contains only the `signature`.
     '''
-    from rest_framework.parsers import JSONParser
-    from rest_framework.renderers import JSONRenderer
-    from drf_to_s3.serializers import DefaultPolicySerializer
 
     @property
     def expire_after_seconds(self):
-        from django.conf import settings
-        return getattr(settings, 'AWS_UPLOAD_EXPIRE_AFTER_SECONDS', 300)
+        return conf.get_settings().upload_expire_after_seconds
+
+    @property
+    def signature_version(self):
+        return conf.get_settings().upload_signature_version
+
+    @property
+    def signature_cache_seconds(self):
+        return conf.get_settings().upload_signature_cache_seconds
 
     serializer_class = DefaultPolicySerializer
+    rest_request_serializer_class = DefaultRESTRequestSerializer
     parser_classes = (JSONParser,)
     renderer_classes = (JSONRenderer,)
 
     compatibility_for_iframe = False
 
     def get_aws_secret_access_key(self):
-        from django.conf import settings
-        return settings.AWS_UPLOAD_SECRET_ACCESS_KEY
+        return conf.get_settings().upload_secret_access_key
+
+    def get_aws_region(self, bucket=None):
+        '''
+        Return the region to sign for. With AWS_UPLOAD_BUCKETS,
+        this is the region of the policy's bucket.
+        '''
+        if bucket is None:
+            return conf.get_settings().upload_region
+        return routing.region_for_bucket(bucket)
 
     def check_policy_permissions(self, request, upload_policy):
         '''
@@ -84,50 +120,156 @@ class FineSignPolicyView(FineUploaderErrorResponseMixin, APIView):
         has permission to upload to the given bucket,
         path, etc.
         '''
-        from drf_to_s3.access_control import check_policy_permissions
-        check_policy_permissions(request, upload_policy)
+        access_control.check_policy_permissions(request, upload_policy)
+
+    def check_rest_request_permissions(self, request, rest_request):
+        '''
+        Given a valid REST request, check that the user has
+        permission to upload to the given bucket and key.
+        '''
+        access_control.check_rest_request_permissions(request, rest_request)
 
     def pre_sign(self, upload_policy):
         '''
         Amend the policy before signing. This overrides the
         policy expiration time.
         '''
-        from drf_to_s3 import s3
         upload_policy.expiration = s3.utc_plus(self.expire_after_seconds)
 
-    def post(self, request, format=None):
-        from rest_framework import status
-        from rest_framework.exceptions import PermissionDenied
-        from rest_framework.response import Response
-        from drf_to_s3 import s3
-
-        request_serializer = self.serializer_class(data=request.DATA)
-        if not request_serializer.is_valid():
-            return self.handle_validation_error(request_serializer)
-        upload_policy = request_serializer.object
-
-        self.check_policy_permissions(request, upload_policy)
-        
-        self.pre_sign(upload_policy)
-
-        policy_document = self.serializer_class(upload_policy).data
-        signed_policy = s3.sign_policy_document(
+    def get_credential_scope(self, upload_policy):
+        '''
+        For Signature Version 4, return the date stamp and region
+        from the policy's x-amz-credential. Raises PermissionDenied
+        unless the credential is for our region and was issued
+        within a day of now.
+
+        '''
+        try:
+            credential = upload_policy['x-amz-credential'].value
+        except AttributeError:
+            raise PermissionDenied(_('x-amz-credential is required'))
+        access_key_id, date_stamp, region, service, terminator = credential.split('/')
+        try:
+            bucket = upload_policy['bucket'].value
+        except AttributeError:
+            bucket = None
+        expected_region = self.get_aws_region(bucket)
+        if region != expected_region:
+            raise PermissionDenied(_("Region should be '%s'") % expected_region)
+        today = datetime.datetime.utcnow().date()
+        one_day = datetime.timedelta(days=1)
+        if datetime.datetime.strptime(date_stamp, '%Y%m%d').date() not in [today - one_day, today, today + one_day]:
+            raise PermissionDenied(_('Credential date should be today'))
+        return date_stamp, region
+
+    def get_signature_cache(self):
+        return get_cache(conf.get_settings().upload_signature_cache)
+
+    def get_signature_cache_key(self, request, upload_policy):
+        '''
+        Return a cache key for the signed response to this policy:
+        a hash of its conditions in order, the user's upload
+        prefix, and the signature version. The requested expiration
+        is left out, since pre_sign replaces it.
+
+        '''
+        canonical = repr((
+            self.signature_version,
+            upload_prefix_for_request(request),
+            [(item.operator, item.element_name, item.value, item.value_range)
+             for item in upload_policy.conditions],
+        ))
+        return 'drf_to_s3.signature.' + hashlib.sha1(canonical).hexdigest()
+
+    def sign_policy(self, upload_policy, policy_document):
+        '''
+        Sign the policy document, returning a dictionary with the
+        policy and the signature.
+        '''
+        if self.signature_version == 4:
+            date_stamp, region = self.get_credential_scope(upload_policy)
+            return s3.sign_policy_document_v4(
+                policy_document=policy_document,
+                secret_key=self.get_aws_secret_access_key(),
+                date_stamp=date_stamp,
+                region=region
+            )
+        return s3.sign_policy_document(
             policy_document=policy_document,
             secret_key=self.get_aws_secret_access_key()
         )
+
+    def post_rest_request(self, request):
+        '''
+        Validate, check, and sign the string to sign for a REST
+        request, which Fine Uploader sends as `headers`.
+        '''
+        with instrumentation.timed('sign_rest_request.validate'):
+            request_serializer = self.rest_request_serializer_class(data=request.DATA)
+            if not request_serializer.is_valid():
+                return self.handle_validation_error(request_serializer)
+            rest_request = request_serializer.object
+
+        with instrumentation.timed('sign_rest_request.permissions'):
+            self.check_rest_request_permissions(request, rest_request)
+
+        with instrumentation.timed('sign_rest_request.sign'):
+            signature = s3.sign_rest_request(
+                secret_key=self.get_aws_secret_access_key(),
+                method=rest_request.method,
+                content_md5=rest_request.content_md5,
+                content_type=rest_request.content_type,
+                expires=rest_request.date,
+                canonicalized_headers=rest_request.canonicalized_headers,
+                canonicalized_resource=rest_request.resource
+            )
+        return Response({'signature': signature})
+
+    def post(self, request, format=None):
+        with instrumentation.timed('sign.parse'):
+            data = request.DATA
+        if isinstance(data, dict) and 'headers' in data:
+            return self.post_rest_request(request)
+
+        with instrumentation.timed('sign.validate'):
+            request_serializer = self.serializer_class(data=data)
+            if not request_serializer.is_valid():
+                return self.handle_validation_error(request_serializer)
+            upload_policy = request_serializer.object
+
+        with instrumentation.timed('sign.permissions'):
+            self.check_policy_permissions(request, upload_policy)
+
+        cache_seconds = self.signature_cache_seconds
+        if cache_seconds:
+            if cache_seconds >= self.expire_after_seconds:
+                raise ImproperlyConfigured(
+                    'AWS_UPLOAD_SIGNATURE_CACHE_SECONDS should be less than AWS_UPLOAD_EXPIRE_AFTER_SECONDS'
+                )
+            cache = self.get_signature_cache()
+            cache_key = self.get_signature_cache_key(request, upload_policy)
+            response = cache.get(cache_key)
+            if response is not None:
+                return Response(response)
+
+        with instrumentation.timed('sign.sign'):
+            self.pre_sign(upload_policy)
+            policy_document = self.serializer_class(upload_policy).data
+            signed_policy = self.sign_policy(upload_policy, policy_document)
         response = {
             'policy': signed_policy['policy'],
             'signature': signed_policy['signature'],
             'policy_decoded': policy_document,
             # Provide this to assist with debugging and testing
         }
+        if cache_seconds:
+            cache.set(cache_key, response, cache_seconds)
         return Response(response)
 
 
 @api_view(('GET',))
 @renderer_classes((StaticHTMLRenderer,))
 def empty_html(request):
-    from rest_framework.response import Response
     return Response('')
 
 # def empty_html(request):
@@ -156,11 +298,8 @@ class FineUploadCompletionView(FineUploaderErrorResponseMixin, BaseUploadComplet
     dictionaries, and allow your serializers to 
 
     '''
-    from rest_framework.parsers import FormParser
-    from rest_framework.renderers import JSONRenderer
-    from drf_to_s3.naive_serializers import FineUploadCompletionSerializer
-
-    parser_classes = (FormParser,)
+    # JSONParser accepts a list of notifications for batch completion
+    parser_classes = (FormParser, JSONParser)
     renderer_classes = (JSONRenderer,)
     serializer_class = FineUploadCompletionSerializer
 
@@ -27,6 +27,8 @@ setup(
     packages = [
         'drf_to_s3',
         'drf_to_s3/views',
+        'drf_to_s3/management',
+        'drf_to_s3/management/commands',
     ],
     install_requires=install_requires,
     classifiers = [